@@ -0,0 +1,105 @@
+"""CPU latency of framework backends against their ONNX Runtime exports
+
+Trains small models, exports each with the same conversion MLEngine uses
+at load time, and times single-row and batched predict_batch calls on the
+original backend and on ONNX Runtime. PyTorch is skipped if it is not
+installed. Run from the ml-service directory:
+
+    python -m benchmarks.backend_benchmark --batch-size 256
+"""
+import argparse
+import os
+import tempfile
+import timeit
+from typing import Any, Dict, List, Tuple
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression, Ridge
+
+from src.backends import get_backend
+from src.backends.onnx_export import convert_to_onnx
+
+
+def build_models(n_features: int, tmp_dir: str) -> List[Tuple[str, str, Any, Dict[str, Any], str]]:
+    """Train the benchmark models; returns (name, framework, model, metadata, artifact path)"""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, n_features)).astype(np.float32)
+    y_class = (X[:, 0] + X[:, 1] > 0).astype(int)
+    y_value = X @ rng.normal(size=n_features)
+    metadata = {'feature_names': [f"f{i}" for i in range(n_features)]}
+
+    models = [
+        ('logistic_regression', 'sklearn', LogisticRegression(max_iter=500).fit(X, y_class),
+         {**metadata, 'framework': 'sklearn', 'task': 'classification'}),
+        ('ridge', 'sklearn', Ridge().fit(X, y_value),
+         {**metadata, 'framework': 'sklearn', 'task': 'regression'}),
+        ('random_forest', 'sklearn', RandomForestClassifier(n_estimators=50, max_depth=8, random_state=0).fit(X, y_class),
+         {**metadata, 'framework': 'sklearn', 'task': 'classification'}),
+    ]
+
+    try:
+        import torch
+        mlp = torch.nn.Sequential(
+            torch.nn.Linear(n_features, 64), torch.nn.ReLU(), torch.nn.Linear(64, 2)
+        )
+        models.append(('mlp', 'pytorch', mlp, {**metadata, 'framework': 'pytorch', 'task': 'classification'}))
+    except ImportError:
+        print("PyTorch not installed, skipping the MLP")
+
+    built = []
+    for name, framework, model, model_metadata in models:
+        path = os.path.join(tmp_dir, f"{name}.{'pt' if framework == 'pytorch' else 'joblib'}")
+        if framework == 'pytorch':
+            import torch
+            torch.save(model, path)
+        else:
+            joblib.dump(model, path)
+        built.append((name, framework, model, model_metadata, path))
+    return built
+
+
+def time_call(fn, repeat: int, number: int) -> float:
+    """Best-of-``repeat`` mean seconds per call"""
+    return min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--features', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--number', type=int, default=200, help='Calls per timing run')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    row = rng.normal(size=(1, args.features)).astype(np.float32)
+    batch = rng.normal(size=(args.batch_size, args.features)).astype(np.float32)
+    onnx_backend = get_backend('onnx')
+
+    print(f"{'model':<20} {'backend':<10} {'row us':>10} {f'batch{args.batch_size} us/row':>18}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, framework, model, metadata, path in build_models(args.features, tmp_dir):
+            onnx_path = convert_to_onnx(model, framework, metadata, path)
+            candidates = [(framework, get_backend(framework), model, metadata)]
+            if onnx_path:
+                candidates.append(('onnx', onnx_backend, onnx_backend.load(onnx_path), {**metadata, 'framework': 'onnx'}))
+            else:
+                print(f"{name}: ONNX export failed validation")
+
+            for label, backend, loaded, model_metadata in candidates:
+                row_seconds = time_call(
+                    lambda: backend.predict_batch(loaded, model_metadata, row), args.repeat, args.number
+                )
+                batch_seconds = time_call(
+                    lambda: backend.predict_batch(loaded, model_metadata, batch), args.repeat, max(1, args.number // 10)
+                )
+                print(
+                    f"{name:<20} {label:<10} {row_seconds * 1e6:>10.1f} "
+                    f"{batch_seconds / args.batch_size * 1e6:>18.2f}"
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Compare Redis memory and read latency of the feature store layouts
+
+Needs a disposable Redis instance (the database is flushed between runs).
+Run from the ml-service directory:
+
+    python -m benchmarks.feature_layout_benchmark --redis-url redis://localhost:6379/15
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, Any, List
+import numpy as np
+import redis.asyncio as redis
+
+from src.feature_store import FeatureStore
+
+
+async def _used_memory(redis_client: redis.Redis) -> int:
+    info = await redis_client.info('memory')
+    return int(info['used_memory'])
+
+
+async def run_layout(
+    redis_client: redis.Redis,
+    layout: str,
+    n_entities: int,
+    feature_names: List[str],
+    n_reads: int
+) -> Dict[str, Any]:
+    await redis_client.flushdb()
+    baseline = await _used_memory(redis_client)
+
+    store = FeatureStore(redis_client, None, layout=layout)
+    chunk = 1000
+    for start in range(0, n_entities, chunk):
+        await store.store_features_bulk({
+            f"user-{i}": {name: random.random() for name in feature_names}
+            for i in range(start, min(start + chunk, n_entities))
+        })
+
+    used = await _used_memory(redis_client) - baseline
+
+    latencies = []
+    for _ in range(n_reads):
+        entity_id = f"user-{random.randrange(n_entities)}"
+        start_time = time.perf_counter()
+        await store.get_features(feature_names, entity_id)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+
+    return {
+        'layout': layout,
+        'memory_bytes_per_million_entities': int(used / n_entities * 1_000_000),
+        'read_p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'read_p99_ms': round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--redis-url', default='redis://localhost:6379/15')
+    parser.add_argument('--entities', type=int, default=100_000)
+    parser.add_argument('--features', type=int, default=40)
+    parser.add_argument('--reads', type=int, default=5000)
+    args = parser.parse_args()
+
+    redis_client = redis.from_url(args.redis_url, decode_responses=True)
+    feature_names = [f"feature_{i}" for i in range(args.features)]
+    try:
+        for layout in ('string', 'hash'):
+            result = await run_layout(redis_client, layout, args.entities, feature_names, args.reads)
+            print(json.dumps(result))
+        await redis_client.flushdb()
+    finally:
+        await redis_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""Microbenchmark of feature-vector preparation
+
+Compares the previous per-call preparation (re-reading the model metadata
+for every feature) with a compiled FeaturePlan, for single rows and for
+batch matrices. Run from the ml-service directory:
+
+    python -m benchmarks.feature_plan_benchmark
+"""
+import argparse
+import json
+import random
+import timeit
+from typing import Dict, Any
+import numpy as np
+
+from src.feature_plan import FeaturePlan
+
+
+def legacy_prepare_features(features: Dict[str, Any], metadata: Dict) -> np.ndarray:
+    """The per-call implementation FeaturePlan replaced"""
+    feature_names = metadata.get('feature_names', sorted(features.keys()))
+    feature_vector = []
+
+    for name in feature_names:
+        if name not in features:
+            default = metadata.get('feature_defaults', {}).get(name)
+            if default is None:
+                raise ValueError(f"Missing required feature: {name}")
+            value = default
+        else:
+            value = features[name]
+
+        if name in metadata.get('categorical_features', []):
+            encoder = metadata.get('encoders', {}).get(name)
+            if encoder:
+                value = encoder[value]
+
+        feature_vector.append(value)
+
+    return np.array([feature_vector])
+
+
+def make_metadata(n_features: int, n_categorical: int) -> Dict[str, Any]:
+    names = [f"f{i}" for i in range(n_features)]
+    categorical = names[:n_categorical]
+    return {
+        'feature_names': names,
+        'feature_defaults': {name: 0.0 for name in names[n_categorical::2]},
+        'categorical_features': categorical,
+        'encoders': {name: {f"c{k}": k for k in range(20)} for name in categorical},
+    }
+
+
+def make_row(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    categorical = set(metadata['categorical_features'])
+    return {
+        name: f"c{random.randrange(20)}" if name in categorical else random.random()
+        for name in metadata['feature_names']
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--features', type=int, default=40)
+    parser.add_argument('--categorical', type=int, default=5)
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    metadata = make_metadata(args.features, args.categorical)
+    plan = FeaturePlan(metadata)
+    row = make_row(metadata)
+    rows = [make_row(metadata) for _ in range(args.batch)]
+
+    # The legacy path only produced a batch by preparing every row
+    def legacy_batch():
+        return np.vstack([legacy_prepare_features(r, metadata)[0] for r in rows])
+
+    results = {
+        'legacy_row_us': timeit.timeit(lambda: legacy_prepare_features(row, metadata), number=args.repeat),
+        'plan_row_us': timeit.timeit(lambda: plan.build_row(row), number=args.repeat),
+        'legacy_batch_us_per_row': timeit.timeit(legacy_batch, number=10) / args.batch,
+        'plan_batch_us_per_row': timeit.timeit(lambda: plan.build_matrix(rows), number=10) / args.batch,
+    }
+    results['legacy_row_us'] /= args.repeat
+    results['plan_row_us'] /= args.repeat
+    results['legacy_batch_us_per_row'] /= 10
+    results['plan_batch_us_per_row'] /= 10
+
+    print(json.dumps({name: round(seconds * 1e6, 2) for name, seconds in results.items()}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Check that memory-mapped models are shared across worker processes
+
+Saves a brute-force k-NN model whose fitted data dominates its size,
+then starts N worker processes that each load it, touch every page with a
+prediction, and report how much their PSS grew. PSS splits shared pages
+between the processes mapping them, so the sum over workers is their real
+combined footprint: about N x the model size for private copies and about
+1 x when the weights are mapped. Exits non-zero if the mapped load uses
+more than --max-ratio x the model size. Linux only (reads smaps_rollup).
+Run from the ml-service directory:
+
+    python -m benchmarks.mmap_sharing_benchmark --workers 4 --rows 500000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+import joblib
+import numpy as np
+from sklearn.neighbors import KNeighborsClassifier
+
+from src.backends import get_backend, load_model_artifact
+from src.worker_memory import read_worker_memory
+
+
+def worker(model_path: str, mmap: bool, n_features: int, barrier, results) -> None:
+    # Import the backend first so only the weights count
+    get_backend('sklearn')
+
+    before = read_worker_memory()['pss']
+    model = load_model_artifact(model_path, 'sklearn', mmap=mmap)
+    # Brute-force neighbours scan all fitted rows, faulting every page in
+    model.predict(np.zeros((1, n_features), dtype=np.float32))
+
+    # Measure while every worker holds the model
+    barrier.wait()
+    results.put(read_worker_memory()['pss'] - before)
+    barrier.wait()
+
+
+def measure(model_path: str, mmap: bool, workers: int, n_features: int) -> int:
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(model_path, mmap, n_features, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    growth = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return growth
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--features', type=int, default=64)
+    parser.add_argument('--max-ratio', type=float, default=1.5)
+    args = parser.parse_args()
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        sys.exit("smaps_rollup is not available; this check needs Linux")
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(args.rows, args.features)).astype(np.float32)
+    model = KNeighborsClassifier(n_neighbors=1, algorithm='brute').fit(X, rng.integers(0, 2, args.rows))
+    model_bytes = X.nbytes
+    del X
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = os.path.join(tmp_dir, 'knn.joblib')
+        joblib.dump(model, model_path)
+        del model
+        # Write the mappable copy up front, as the first load on a node would
+        load_model_artifact(model_path, 'sklearn', mmap=True)
+
+        print(f"model weights: {model_bytes / 1024 ** 2:.0f} MB, {args.workers} workers")
+        ratios = {}
+        for mmap in (False, True):
+            growth = measure(model_path, mmap, args.workers, args.features)
+            ratios[mmap] = growth / model_bytes
+            label = 'mmap' if mmap else 'private'
+            print(f"{label:<8} combined PSS growth {growth / 1024 ** 2:8.0f} MB = {ratios[mmap]:.2f}x model")
+
+    if ratios[True] > args.max_ratio:
+        sys.exit(f"FAIL: mapped model uses {ratios[True]:.2f}x its size across workers (max {args.max_ratio}x)")
+    print("OK: workers share the mapped model")
+
+
+if __name__ == '__main__':
+    main()
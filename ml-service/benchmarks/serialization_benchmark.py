@@ -0,0 +1,155 @@
+"""Per-request serialization cost of the prediction endpoints by wire format
+
+Times decoding plus validating a request body and encoding the response,
+without inference or I/O:
+
+- fastapi: the default path, i.e. json.loads and model validation for the
+  body, then the response model round trip (dump, re-validate, serialize)
+  and json.dumps
+- orjson: JSON through wire_formats with response validation off
+- msgpack: MessagePack request and response bodies
+- arrow: Arrow IPC request and response streams (batch only)
+
+Run from the ml-service directory:
+
+    python -m benchmarks.serialization_benchmark --features 20 --batch-size 256
+"""
+import argparse
+import io
+import json
+import timeit
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+import msgpack
+import pyarrow as pa
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from src.schemas import PredictionRequest, PredictionResponse
+from src.streaming import ArrowEncoder
+from src.wire_formats import JSON, MSGPACK, decode_body, encode, read_arrow_requests
+
+
+def make_request(i: int, n_features: int) -> Dict[str, Any]:
+    return {
+        'model_id': 'model-1',
+        'request_id': f"req-{i}",
+        'features': {f"f{j}": float(j) / n_features for j in range(n_features)}
+    }
+
+
+def make_response(request: PredictionRequest) -> PredictionResponse:
+    return PredictionResponse(
+        prediction_id=str(uuid.uuid4()),
+        model_id=request.model_id,
+        prediction={'class': 1, 'value': None, 'probabilities': [0.2, 0.8], 'confidence': 0.8},
+        confidence=0.8,
+        latency_ms=1.25,
+        timestamp=datetime.utcnow()
+    )
+
+
+def fastapi_json(content: Any) -> bytes:
+    """JSONResponse.render as FastAPI calls it"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+
+def single_cases(n_features: int) -> List[Tuple[str, Callable[[], Any]]]:
+    request = make_request(0, n_features)
+    response = make_response(PredictionRequest.model_validate(request))
+    request_adapter = TypeAdapter(PredictionRequest)
+    response_adapter = TypeAdapter(PredictionResponse)
+    json_body = json.dumps(request).encode()
+    msgpack_body = msgpack.packb(request)
+
+    def fastapi_path() -> bytes:
+        request_adapter.validate_python(json.loads(json_body))
+        revalidated = response_adapter.validate_python(response.model_dump())
+        return fastapi_json(response_adapter.dump_python(revalidated, mode='json'))
+
+    def orjson_path() -> bytes:
+        decode_body(json_body, JSON, PredictionRequest)
+        return encode(response, JSON)
+
+    def msgpack_path() -> bytes:
+        decode_body(msgpack_body, MSGPACK, PredictionRequest)
+        return encode(response, MSGPACK)
+
+    return [('fastapi', fastapi_path), ('orjson', orjson_path), ('msgpack', msgpack_path)]
+
+
+def batch_cases(n_features: int, batch_size: int) -> List[Tuple[str, Callable[[], Any]]]:
+    rows = [make_request(i, n_features) for i in range(batch_size)]
+    requests = [PredictionRequest.model_validate(row) for row in rows]
+    results = [make_response(request) for request in requests]
+    content = {'predictions': results, 'total': batch_size}
+    batch_adapter = TypeAdapter(List[PredictionRequest])
+    json_body = json.dumps(rows).encode()
+    msgpack_body = msgpack.packb(rows)
+
+    table = pa.Table.from_pylist([
+        {'model_id': row['model_id'], 'request_id': row['request_id'], **row['features']} for row in rows
+    ])
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    arrow_body = sink.getvalue()
+
+    def fastapi_path() -> bytes:
+        batch_adapter.validate_python(json.loads(json_body))
+        return fastapi_json(jsonable_encoder(content))
+
+    def orjson_path() -> bytes:
+        decode_body(json_body, JSON, List[PredictionRequest])
+        return encode(content, JSON)
+
+    def msgpack_path() -> bytes:
+        decode_body(msgpack_body, MSGPACK, List[PredictionRequest])
+        return encode(content, MSGPACK)
+
+    def arrow_path() -> bytes:
+        decoded = read_arrow_requests(arrow_body)
+        encoder = ArrowEncoder()
+        return encoder.encode(decoded, results) + encoder.close()
+
+    return [
+        ('fastapi', fastapi_path), ('orjson', orjson_path),
+        ('msgpack', msgpack_path), ('arrow', arrow_path)
+    ]
+
+
+def time_call(fn: Callable[[], Any], repeat: int, number: int) -> float:
+    """Best-of-``repeat`` mean seconds per call"""
+    return min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--features', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--number', type=int, default=2000, help='Calls per timing run')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"/predict, {args.features} features")
+    print(f"{'format':<10} {'us/request':>12} {'bytes out':>10} {'speedup':>8}")
+    baseline = None
+    for name, fn in single_cases(args.features):
+        seconds = time_call(fn, args.repeat, args.number)
+        baseline = baseline or seconds
+        print(f"{name:<10} {seconds * 1e6:>12.1f} {len(fn()):>10} {baseline / seconds:>7.1f}x")
+
+    print(f"\n/batch-predict, {args.batch_size} rows of {args.features} features")
+    print(f"{'format':<10} {'us/row':>12} {'bytes out':>10} {'speedup':>8}")
+    baseline = None
+    number = max(1, args.number // args.batch_size)
+    for name, fn in batch_cases(args.features, args.batch_size):
+        seconds = time_call(fn, args.repeat, number)
+        baseline = baseline or seconds
+        print(f"{name:<10} {seconds / args.batch_size * 1e6:>12.2f} {len(fn()):>10} {baseline / seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Startup time and baseline memory of the ML engine
+
+Each scenario runs in a fresh interpreter and reports the wall-clock time
+of its imports and the process's peak RSS afterwards:
+
+- eager: the framework imports ml_engine used to do at module level
+  (pandas, TensorFlow, PyTorch, joblib, scikit-learn) plus the engine
+- lazy: importing the engine alone, as the service now starts
+- lazy+<framework>: the engine plus the first load of one backend
+
+Frameworks that are not installed are skipped. Run from the ml-service
+directory:
+
+    python -m benchmarks.startup_benchmark --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, Any, List, Optional
+
+EAGER_IMPORTS = ['pandas', 'tensorflow', 'torch', 'joblib', 'sklearn.base']
+
+SCENARIO_SCRIPT = '''
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+try:
+    for name in {modules!r}:
+        importlib.import_module(name)
+    import src.ml_engine
+    for framework in {backends!r}:
+        from src.backends import get_backend
+        get_backend(framework)
+except ImportError as e:
+    print(json.dumps({{"skipped": str(e)}}))
+    sys.exit(0)
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules)
+}}))
+'''
+
+
+def run_scenario(modules: List[str], backends: List[str], runs: int) -> Optional[Dict[str, Any]]:
+    samples = []
+    for _ in range(runs):
+        script = SCENARIO_SCRIPT.format(modules=modules, backends=backends)
+        output = subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        if 'skipped' in result:
+            return result
+        samples.append(result)
+
+    return {
+        'seconds': statistics.median(sample['seconds'] for sample in samples),
+        'rss_mb': statistics.median(sample['rss_mb'] for sample in samples),
+        'modules': samples[-1]['modules']
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per scenario')
+    parser.add_argument(
+        '--backends', nargs='*', default=['sklearn', 'tensorflow', 'pytorch'],
+        help='Backends to measure a first load for'
+    )
+    args = parser.parse_args()
+
+    scenarios = [('eager', EAGER_IMPORTS, []), ('lazy', [], [])]
+    scenarios += [(f'lazy+{framework}', [], [framework]) for framework in args.backends]
+
+    print(f"{'scenario':<20} {'import s':>10} {'peak RSS MB':>12} {'modules':>8}")
+    for name, modules, backends in scenarios:
+        result = run_scenario(modules, backends, args.runs)
+        if 'skipped' in result:
+            print(f"{name:<20} skipped: {result['skipped']}")
+            continue
+        print(f"{name:<20} {result['seconds']:>10.3f} {result['rss_mb']:>12.1f} {result['modules']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""Content-addressed local cache for model artifacts stored in MinIO"""
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Dict, Optional, List, Set, Tuple
+from minio import Minio
+from prometheus_client import Counter, Gauge, Histogram
+import logging
+
+logger = logging.getLogger(__name__)
+
+artifact_cache_hits = Counter('ml_artifact_cache_hits_total', 'Model artifacts served from the local cache')
+artifact_cache_misses = Counter('ml_artifact_cache_misses_total', 'Model artifacts downloaded from object storage')
+artifact_cache_evictions = Counter('ml_artifact_cache_evictions_total', 'Model artifacts evicted from the local cache')
+artifact_cache_bytes = Gauge('ml_artifact_cache_bytes', 'Size of the local model artifact cache')
+artifact_download_bytes = Counter('ml_artifact_download_bytes_total', 'Bytes downloaded from object storage')
+artifact_download_duration = Histogram(
+    'ml_artifact_download_duration_seconds',
+    'Model artifact download time',
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+
+
+class ArtifactCache:
+    """On-disk artifact cache keyed by object ETag with an LRU size budget
+
+    Artifacts live at ``{root_dir}/{etag}/{basename}``, so two objects with
+    the same file name never overwrite each other and an unchanged object is
+    not downloaded again after a restart. Downloads run in worker threads;
+    objects larger than ``part_size`` are fetched as parallel ranged GETs.
+    Downloads are written to a temporary file and renamed into place, so
+    several processes can share one cache directory.
+    """
+
+    def __init__(
+        self,
+        minio_client: Minio,
+        root_dir: str = '/tmp/ml-artifacts',
+        max_bytes: int = 10 * 1024 ** 3,
+        part_size: int = 16 * 1024 ** 2,
+        max_parallel_parts: int = 8
+    ):
+        self.minio_client = minio_client
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.part_size = part_size
+        self.max_parallel_parts = max_parallel_parts
+        self._pinned: Set[str] = set()
+        self._downloads: Dict[str, asyncio.Future] = {}
+        os.makedirs(root_dir, exist_ok=True)
+
+    async def fetch(self, model_path: str) -> str:
+        """Return a local path for ``bucket/object``, downloading it if needed"""
+        bucket, object_name = model_path.split('/', 1)
+        stat = await asyncio.to_thread(self.minio_client.stat_object, bucket, object_name)
+        etag = stat.etag.strip('"')
+
+        local_path = os.path.join(
+            self.root_dir,
+            re.sub(r'[^A-Za-z0-9_-]', '_', etag),
+            os.path.basename(object_name)
+        )
+
+        if os.path.exists(local_path):
+            artifact_cache_hits.inc()
+            os.utime(local_path)
+            return local_path
+
+        # Concurrent fetches of the same artifact share one download
+        pending = self._downloads.get(local_path)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._downloads[local_path] = future
+        try:
+            artifact_cache_misses.inc()
+            await self._download(bucket, object_name, stat.size, etag, local_path)
+            future.set_result(local_path)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._downloads[local_path]
+            # Nobody else may be waiting; don't leave an unretrieved exception behind
+            if future.done() and not future.cancelled():
+                future.exception()
+
+        await asyncio.to_thread(self._evict)
+        return local_path
+
+    def pin(self, local_path: str) -> None:
+        """Protect an artifact that is in use from eviction"""
+        self._pinned.add(os.path.dirname(local_path))
+
+    def unpin(self, local_path: str) -> None:
+        self._pinned.discard(os.path.dirname(local_path))
+
+    async def _download(self, bucket: str, object_name: str, size: int, etag: str, local_path: str) -> None:
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = f"{local_path}.part-{os.getpid()}-{uuid.uuid4().hex}"
+        start_time = time.perf_counter()
+
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.truncate(size)
+
+            ranges = [
+                (offset, min(self.part_size, size - offset))
+                for offset in range(0, size, self.part_size)
+            ] or [(0, 0)]
+            limit = asyncio.Semaphore(self.max_parallel_parts)
+
+            async def fetch_range(offset: int, length: int) -> None:
+                async with limit:
+                    await asyncio.to_thread(self._fetch_range, bucket, object_name, offset, length, tmp_path)
+
+            await asyncio.gather(*[fetch_range(offset, length) for offset, length in ranges])
+            await asyncio.to_thread(self._verify, tmp_path, size, etag)
+            os.replace(tmp_path, local_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        artifact_download_duration.observe(time.perf_counter() - start_time)
+        artifact_download_bytes.inc(size)
+        logger.info(f"Downloaded artifact {bucket}/{object_name} ({size} bytes) to {local_path}")
+
+    def _fetch_range(self, bucket: str, object_name: str, offset: int, length: int, tmp_path: str) -> None:
+        if length == 0:
+            return
+
+        response = self.minio_client.get_object(bucket, object_name, offset=offset, length=length)
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY)
+            try:
+                position = offset
+                for chunk in response.stream(1024 * 1024):
+                    os.pwrite(fd, chunk, position)
+                    position += len(chunk)
+            finally:
+                os.close(fd)
+        finally:
+            response.close()
+            response.release_conn()
+
+        if position != offset + length:
+            raise IOError(f"Short read for {bucket}/{object_name} at offset {offset}")
+
+    def _verify(self, path: str, size: int, etag: str) -> None:
+        """Check the downloaded file against the object's size and ETag
+
+        Single-part uploads have the content MD5 as their ETag; multipart
+        ETags (``<hash>-<parts>``) depend on the upload's part size, so only
+        the size can be checked for those.
+        """
+        if os.path.getsize(path) != size:
+            raise IOError(f"Artifact size mismatch for {path}")
+
+        if '-' in etag or len(etag) != 32:
+            return
+
+        digest = hashlib.md5()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        if digest.hexdigest() != etag:
+            raise IOError(f"Artifact checksum mismatch for {path}")
+
+    def _evict(self) -> None:
+        """Remove least-recently-used artifacts until the cache fits its budget"""
+        entries: List[Tuple[float, int, str]] = []
+        total = 0
+        for name in os.listdir(self.root_dir):
+            entry_dir = os.path.join(self.root_dir, name)
+            if not os.path.isdir(entry_dir):
+                continue
+            file_names = os.listdir(entry_dir)
+            if any('.part-' in file_name for file_name in file_names):
+                # Another process is downloading into this entry
+                continue
+            size = 0
+            last_used = 0.0
+            for file_name in file_names:
+                file_stat = os.stat(os.path.join(entry_dir, file_name))
+                size += file_stat.st_size
+                last_used = max(last_used, file_stat.st_mtime)
+            entries.append((last_used, size, entry_dir))
+            total += size
+
+        for last_used, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if entry_dir in self._pinned:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            artifact_cache_evictions.inc()
+            total -= size
+
+        artifact_cache_bytes.set(total)
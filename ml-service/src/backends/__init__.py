@@ -0,0 +1,72 @@
+"""Framework backends, imported on first use
+
+Each framework lives in its own module that is only imported when a model
+of that framework is first loaded, so a pod serving sklearn models never
+imports TensorFlow or PyTorch. Additional backends can be registered with
+``register_backend`` using any importable module that exposes a
+``backend`` object implementing ``ModelBackend``.
+"""
+import importlib
+import threading
+from typing import Dict, Any, List
+import numpy as np
+import logging
+
+from .base import ModelBackend, format_results
+
+logger = logging.getLogger(__name__)
+
+# Framework name -> module providing ``backend``; relative names are
+# resolved against this package
+BACKEND_MODULES: Dict[str, str] = {
+    'sklearn': '.sklearn_backend',
+    'tensorflow': '.tensorflow_backend',
+    'pytorch': '.pytorch_backend',
+    'pickle': '.pickle_backend',
+    'onnx': '.onnx_backend',
+}
+
+# Frameworks without a backend are unpickled and called like sklearn models
+FALLBACK_FRAMEWORK = 'pickle'
+
+_backends: Dict[str, ModelBackend] = {}
+_import_lock = threading.RLock()
+
+
+def register_backend(framework: str, module: str) -> None:
+    """Register (or replace) the module that implements a framework"""
+    BACKEND_MODULES[framework] = module
+    _backends.pop(framework, None)
+
+
+def get_backend(framework: str) -> ModelBackend:
+    """Return the backend for a framework, importing its module on first use"""
+    backend = _backends.get(framework)
+    if backend is not None:
+        return backend
+
+    # Loads run in worker threads; import each backend only once
+    with _import_lock:
+        backend = _backends.get(framework)
+        if backend is None:
+            module = BACKEND_MODULES.get(framework)
+            if module is None:
+                backend = get_backend(FALLBACK_FRAMEWORK) if framework != FALLBACK_FRAMEWORK else None
+                if backend is None:
+                    raise ValueError(f"No backend registered for framework {framework}")
+            else:
+                backend = importlib.import_module(module, __name__).backend
+                logger.info(f"Imported {framework} backend")
+            _backends[framework] = backend
+    return backend
+
+
+def load_model_artifact(model_path: str, framework: str, mmap: bool = False) -> Any:
+    """Deserialize a model artifact from local disk, optionally memory-mapping its weights"""
+    backend = get_backend(framework)
+    return backend.load_mapped(model_path) if mmap else backend.load(model_path)
+
+
+def infer_batch(model: Any, metadata: Dict, feature_matrix: np.ndarray) -> List[Dict[str, Any]]:
+    """Make predictions for every row of a feature matrix"""
+    return get_backend(metadata.get('framework', 'sklearn')).predict_batch(model, metadata, feature_matrix)
@@ -0,0 +1,59 @@
+"""Common interface for framework backends"""
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional
+import numpy as np
+
+
+def format_results(
+    n_rows: int,
+    predicted_class: Optional[List[Optional[int]]] = None,
+    prediction_value: Optional[List[Optional[float]]] = None,
+    probabilities: Optional[List[Optional[List[float]]]] = None,
+    confidence: Optional[List[Optional[float]]] = None
+) -> List[Dict[str, Any]]:
+    """Build one result dict per row from per-column lists"""
+    empty = [None] * n_rows
+    predicted_class = predicted_class or empty
+    prediction_value = prediction_value or empty
+    probabilities = probabilities or empty
+    confidence = confidence or empty
+    return [
+        {
+            'class': predicted_class[i],
+            'value': prediction_value[i],
+            'probabilities': probabilities[i],
+            'confidence': confidence[i]
+        }
+        for i in range(n_rows)
+    ]
+
+
+class ModelBackend(ABC):
+    """Loads and runs models of one framework
+
+    Backends are stateless; the loaded model object is passed back in on
+    every call so one backend serves any number of models.
+    """
+
+    name = ''
+
+    @abstractmethod
+    def load(self, model_path: str) -> Any:
+        """Deserialize a model artifact from local disk"""
+
+    def load_mapped(self, model_path: str) -> Any:
+        """Load a model with its weights memory-mapped read-only from disk
+
+        Mapped weights live in the page cache, so every worker process that
+        maps the same file shares one physical copy. Backends that can't
+        map their artifacts load a private copy.
+        """
+        return self.load(model_path)
+
+    @abstractmethod
+    def predict_batch(self, model: Any, metadata: Dict[str, Any], feature_matrix: np.ndarray) -> List[Dict[str, Any]]:
+        """Make predictions for every row of a feature matrix"""
+
+    def predict(self, model: Any, metadata: Dict[str, Any], feature_vector: np.ndarray) -> Dict[str, Any]:
+        """Make a prediction for a single feature row"""
+        return self.predict_batch(model, metadata, np.asarray(feature_vector).reshape(1, -1))[0]
@@ -0,0 +1,72 @@
+"""Backend for ONNX models served with ONNX Runtime"""
+from typing import Dict, Any, List
+import numpy as np
+import onnxruntime as ort
+
+from .base import ModelBackend, format_results
+
+
+class OnnxModel:
+    """An inference session with its input and output names resolved once"""
+
+    def __init__(self, session: ort.InferenceSession):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.output_names = [output.name for output in session.get_outputs()]
+
+    def run(self, feature_matrix: np.ndarray) -> List[np.ndarray]:
+        return self.session.run(None, {self.input_name: feature_matrix.astype(np.float32, copy=False)})
+
+
+class OnnxBackend(ModelBackend):
+    """ONNX graphs on the CPU execution provider
+
+    Classifiers exported by skl2onnx (without ZipMap) have two outputs,
+    labels and probabilities. A single output is a regression value, or
+    for ``task='classification'`` logits that are softmaxed, as for
+    exported PyTorch models; set ``onnx_output='probabilities'`` in the
+    metadata if the graph already applies the softmax.
+    """
+
+    name = 'onnx'
+
+    def __init__(self, intra_op_threads: int = 1):
+        # One thread per session: the service parallelizes across requests
+        self.intra_op_threads = intra_op_threads
+
+    def load(self, model_path: str) -> Any:
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return OnnxModel(ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider']))
+
+    def predict_batch(self, model: Any, metadata: Dict[str, Any], feature_matrix: np.ndarray) -> List[Dict[str, Any]]:
+        n_rows = len(feature_matrix)
+        outputs = model.run(feature_matrix)
+
+        if len(outputs) >= 2:
+            labels, proba = outputs[0], np.asarray(outputs[1])
+            return format_results(
+                n_rows,
+                predicted_class=[int(label) for label in labels],
+                probabilities=proba.tolist(),
+                confidence=np.max(proba, axis=1).tolist()
+            )
+
+        output = np.asarray(outputs[0])
+        if metadata.get('task') == 'classification':
+            if metadata.get('onnx_output') == 'probabilities':
+                proba = output
+            else:
+                shifted = np.exp(output - output.max(axis=1, keepdims=True))
+                proba = shifted / shifted.sum(axis=1, keepdims=True)
+            return format_results(
+                n_rows,
+                predicted_class=np.argmax(proba, axis=1).tolist(),
+                probabilities=proba.tolist(),
+                confidence=np.max(proba, axis=1).tolist()
+            )
+        return format_results(n_rows, prediction_value=output.reshape(n_rows, -1)[:, 0].astype(float).tolist())
+
+
+backend = OnnxBackend()
@@ -0,0 +1,125 @@
+"""Conversion of sklearn and PyTorch models to ONNX with output validation"""
+import os
+import uuid
+from typing import Dict, Any, Optional
+import numpy as np
+import logging
+
+from . import get_backend
+
+logger = logging.getLogger(__name__)
+
+EXPORTABLE_FRAMEWORKS = ('sklearn', 'pytorch')
+
+
+def _n_features(model: Any, metadata: Dict[str, Any]) -> int:
+    if metadata.get('feature_names'):
+        return len(metadata['feature_names'])
+    n_features = getattr(model, 'n_features_in_', None)
+    if n_features is None:
+        raise ValueError("Cannot export to ONNX without feature_names in the model metadata")
+    return int(n_features)
+
+
+def export_model(model: Any, framework: str, n_features: int, onnx_path: str) -> None:
+    """Write an ONNX graph for a sklearn or PyTorch model with a float32 batch input"""
+    if framework == 'sklearn':
+        from skl2onnx import to_onnx
+        onnx_model = to_onnx(
+            model,
+            np.zeros((1, n_features), dtype=np.float32),
+            # Plain probability arrays instead of a list of dicts per row
+            options={'zipmap': False} if hasattr(model, 'predict_proba') else None
+        )
+        with open(onnx_path, 'wb') as f:
+            f.write(onnx_model.SerializeToString())
+    elif framework == 'pytorch':
+        import torch
+        model.eval()
+        torch.onnx.export(
+            model,
+            torch.zeros((1, n_features), dtype=torch.float32),
+            onnx_path,
+            input_names=['input'],
+            output_names=['output'],
+            dynamic_axes={'input': {0: 'batch'}, 'output': {0: 'batch'}}
+        )
+    else:
+        raise ValueError(f"Cannot export {framework} models to ONNX")
+
+
+def outputs_match(expected: list, actual: list, tolerance: float) -> bool:
+    """Compare two predict_batch results: classes exactly, scores within tolerance"""
+    for want, got in zip(expected, actual):
+        if want['class'] != got['class']:
+            return False
+        for field in ('value', 'confidence', 'probabilities'):
+            if want[field] is None and got[field] is None:
+                continue
+            if want[field] is None or got[field] is None:
+                return False
+            if not np.allclose(want[field], got[field], rtol=tolerance, atol=tolerance):
+                return False
+    return len(expected) == len(actual)
+
+
+def convert_to_onnx(
+    model: Any,
+    framework: str,
+    metadata: Dict[str, Any],
+    model_path: str,
+    sample: Optional[np.ndarray] = None
+) -> Optional[str]:
+    """Export a loaded model next to its artifact and check it against the original
+
+    Returns the path of the validated ``.onnx`` file, or None if the model
+    can't be exported or its ONNX outputs differ by more than
+    ``onnx_tolerance`` (default 1e-4) on the sample rows. An export left by
+    an earlier load of the same artifact is reused.
+    """
+    if framework not in EXPORTABLE_FRAMEWORKS:
+        return None
+
+    onnx_path = f"{model_path}.onnx"
+    tolerance = float(metadata.get('onnx_tolerance', 1e-4))
+    onnx_metadata = {**metadata, 'framework': 'onnx'}
+
+    try:
+        n_features = _n_features(model, metadata)
+        if sample is None:
+            sample = np.random.default_rng(0).normal(size=(64, n_features))
+        sample = np.asarray(sample, dtype=np.float32)
+        expected = get_backend(framework).predict_batch(model, metadata, sample)
+        onnx_backend = get_backend('onnx')
+
+        # Reuse an earlier export if it still matches, otherwise export afresh
+        if os.path.exists(onnx_path):
+            try:
+                actual = onnx_backend.predict_batch(onnx_backend.load(onnx_path), onnx_metadata, sample)
+                if outputs_match(expected, actual, tolerance):
+                    return onnx_path
+            except Exception as e:
+                logger.info(f"Discarding unusable ONNX export {onnx_path}: {e}")
+
+        _export_atomically(model, framework, n_features, onnx_path)
+        actual = onnx_backend.predict_batch(onnx_backend.load(onnx_path), onnx_metadata, sample)
+        if outputs_match(expected, actual, tolerance):
+            return onnx_path
+    except Exception as e:
+        logger.warning(f"ONNX export of {model_path} failed, serving with {framework}: {e}")
+        return None
+
+    logger.warning(f"ONNX outputs of {model_path} differ beyond {tolerance}, serving with {framework}")
+    os.remove(onnx_path)
+    return None
+
+
+def _export_atomically(model: Any, framework: str, n_features: int, onnx_path: str) -> None:
+    """Export to a temporary file and rename it, so readers never see a partial graph"""
+    tmp_path = f"{onnx_path}.part-{os.getpid()}-{uuid.uuid4().hex}"
+    try:
+        export_model(model, framework, n_features, tmp_path)
+        os.replace(tmp_path, onnx_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
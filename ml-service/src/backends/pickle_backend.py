@@ -0,0 +1,55 @@
+"""Backend for pickled estimators with a scikit-learn style interface"""
+import os
+import pickle
+import uuid
+from typing import Dict, Any, List
+import numpy as np
+
+from .base import ModelBackend, format_results
+
+
+class PickleBackend(ModelBackend):
+    """Models loaded with pickle exposing ``predict`` and optionally ``predict_proba``"""
+
+    name = 'pickle'
+
+    def load(self, model_path: str) -> Any:
+        with open(model_path, 'rb') as f:
+            return pickle.load(f)
+
+    def load_mapped(self, model_path: str) -> Any:
+        """Re-dump the model once in joblib's uncompressed layout and map its arrays"""
+        import joblib
+
+        mapped_path = f"{model_path}.mmap"
+        if not os.path.exists(mapped_path):
+            tmp_path = f"{mapped_path}.part-{os.getpid()}-{uuid.uuid4().hex}"
+            try:
+                joblib.dump(self.load(model_path), tmp_path)
+                # link() fails if another worker got there first; everyone then
+                # maps the same inode instead of a private replacement
+                try:
+                    os.link(tmp_path, mapped_path)
+                except FileExistsError:
+                    pass
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        return joblib.load(mapped_path, mmap_mode='r')
+
+    def predict_batch(self, model: Any, metadata: Dict[str, Any], feature_matrix: np.ndarray) -> List[Dict[str, Any]]:
+        n_rows = len(feature_matrix)
+        prediction = model.predict(feature_matrix)
+        if hasattr(model, 'predict_proba'):
+            proba = model.predict_proba(feature_matrix)
+            return format_results(
+                n_rows,
+                predicted_class=[int(p) for p in prediction],
+                probabilities=proba.tolist(),
+                confidence=np.max(proba, axis=1).tolist()
+            )
+        return format_results(n_rows, prediction_value=np.asarray(prediction, dtype=float).tolist())
+
+
+backend = PickleBackend()
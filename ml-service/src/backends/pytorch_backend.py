@@ -0,0 +1,38 @@
+"""Backend for PyTorch models"""
+from typing import Dict, Any, List
+import numpy as np
+import torch
+
+from .base import ModelBackend, format_results
+
+
+class PyTorchBackend(ModelBackend):
+    """Whole ``nn.Module`` objects saved with ``torch.save``"""
+
+    name = 'pytorch'
+
+    def load(self, model_path: str) -> Any:
+        return torch.load(model_path)
+
+    def load_mapped(self, model_path: str) -> Any:
+        # Tensors of zipfile-format checkpoints are mapped instead of read
+        return torch.load(model_path, mmap=True)
+
+    def predict_batch(self, model: Any, metadata: Dict[str, Any], feature_matrix: np.ndarray) -> List[Dict[str, Any]]:
+        n_rows = len(feature_matrix)
+        model.eval()
+        with torch.no_grad():
+            input_tensor = torch.FloatTensor(feature_matrix)
+            output = model(input_tensor)
+            if metadata.get('task') == 'classification':
+                softmax = torch.softmax(output, dim=1)
+                return format_results(
+                    n_rows,
+                    predicted_class=torch.argmax(output, dim=1).tolist(),
+                    probabilities=softmax.tolist(),
+                    confidence=torch.max(softmax, dim=1).values.tolist()
+                )
+            return format_results(n_rows, prediction_value=output.reshape(n_rows, -1)[:, 0].tolist())
+
+
+backend = PyTorchBackend()
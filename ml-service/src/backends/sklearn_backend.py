@@ -0,0 +1,17 @@
+"""Backend for scikit-learn models saved with joblib"""
+from typing import Any
+import joblib
+
+from .pickle_backend import PickleBackend
+
+
+class SklearnBackend(PickleBackend):
+    """scikit-learn estimators and pipelines; inference is shared with the pickle backend"""
+
+    name = 'sklearn'
+
+    def load(self, model_path: str) -> Any:
+        return joblib.load(model_path)
+
+
+backend = SklearnBackend()
@@ -0,0 +1,30 @@
+"""Backend for TensorFlow/Keras models"""
+from typing import Dict, Any, List
+import numpy as np
+import tensorflow as tf
+
+from .base import ModelBackend, format_results
+
+
+class TensorFlowBackend(ModelBackend):
+    """Keras models saved as SavedModel directories or .keras/.h5 files"""
+
+    name = 'tensorflow'
+
+    def load(self, model_path: str) -> Any:
+        return tf.keras.models.load_model(model_path)
+
+    def predict_batch(self, model: Any, metadata: Dict[str, Any], feature_matrix: np.ndarray) -> List[Dict[str, Any]]:
+        n_rows = len(feature_matrix)
+        prediction = model.predict(feature_matrix)
+        if metadata.get('task') == 'classification':
+            return format_results(
+                n_rows,
+                predicted_class=np.argmax(prediction, axis=1).tolist(),
+                probabilities=prediction.tolist(),
+                confidence=np.max(prediction, axis=1).tolist()
+            )
+        return format_results(n_rows, prediction_value=prediction[:, 0].astype(float).tolist())
+
+
+backend = TensorFlowBackend()
@@ -0,0 +1,147 @@
+"""Dynamic micro-batching for single-row inference requests"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from prometheus_client import Histogram
+import logging
+
+logger = logging.getLogger(__name__)
+
+microbatch_size = Histogram(
+    'ml_microbatch_size',
+    'Rows per micro-batched inference call',
+    ['model_name'],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+)
+microbatch_wait = Histogram(
+    'ml_microbatch_wait_seconds',
+    'Time a request waited in the micro-batch queue',
+    ['model_name'],
+    buckets=(0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+
+
+class MicroBatcher:
+    """Collects concurrent single-row requests for one model into batched calls
+
+    Requests are queued until either ``max_batch_size`` rows are waiting or
+    ``max_wait_ms`` has elapsed since the first row of the batch arrived. The
+    rows are stacked into one matrix, ``run_batch`` is awaited once, and the
+    per-row results are scattered back to the waiting callers.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run_batch: Callable[[np.ndarray], Awaitable[List[Any]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0
+    ):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+    async def submit(self, row: np.ndarray) -> Any:
+        """Queue a single feature row and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, future, time.perf_counter()))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return await future
+
+    async def close(self) -> None:
+        """Stop the worker and fail any requests still waiting"""
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        # Let batches already handed to the model finish
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(ValueError(f"Model {self.name} unloaded"))
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future, float]]:
+        """Wait for the first request, then fill the batch until full or timed out"""
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self) -> None:
+        """Batching loop; exits once the queue has been drained"""
+        while not self._queue.empty():
+            batch = await self._collect()
+            dispatched_at = time.perf_counter()
+
+            # Drop requests whose callers have gone away
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            for _, _, enqueued_at in batch:
+                microbatch_wait.labels(model_name=self.name).observe(dispatched_at - enqueued_at)
+            microbatch_size.labels(model_name=self.name).observe(len(batch))
+
+            # Keep collecting while this batch runs; concurrency is capped downstream
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[np.ndarray, asyncio.Future, float]]) -> None:
+        """Run one batch and scatter the per-row results to the waiting callers
+
+        Models without ``feature_names`` take rows as wide as each request's
+        features, so rows are stacked by width; a row of an odd width runs
+        (and fails) on its own instead of taking the whole batch with it.
+        """
+        groups: Dict[int, List[Tuple[np.ndarray, asyncio.Future, float]]] = {}
+        for item in batch:
+            groups.setdefault(np.size(item[0]), []).append(item)
+        for group in groups.values():
+            await self._run_group(group)
+
+    async def _run_group(self, batch: List[Tuple[np.ndarray, asyncio.Future, float]]) -> None:
+        try:
+            matrix = np.vstack([row for row, _, _ in batch])
+            results = await self.run_batch(matrix)
+        except Exception as e:
+            logger.error(f"Batched inference failed for model {self.name}: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for i, (_, future, _) in enumerate(batch):
+            if future.done():
+                continue
+            if i < len(results):
+                future.set_result(results[i])
+            else:
+                future.set_exception(ValueError(
+                    f"Batched inference for model {self.name} returned {len(results)} results for {len(batch)} rows"
+                ))
@@ -0,0 +1,323 @@
+"""Offline bulk scoring of Parquet and CSV datasets"""
+import asyncio
+import multiprocessing
+import os
+import shutil
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+import redis.asyncio as redis
+from minio import Minio
+from prometheus_client import Counter
+import logging
+
+from .datasets import DATASET_FORMATS, detect_format, is_local_path, iter_csv_chunks, local_path, stage_dataset
+from .schemas import ScoringJobRequest
+
+logger = logging.getLogger(__name__)
+
+# Job status hashes are kept for a week
+JOB_TTL_SECONDS = 7 * 24 * 3600
+
+scoring_rows = Counter(
+    'ml_scoring_rows_total',
+    'Rows processed by bulk scoring jobs by result (scored, failed)',
+    ['model_name', 'result']
+)
+
+# Model and feature plan of a scoring worker process, loaded once by _init_worker
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(model_path: str, metadata: Dict[str, Any]) -> None:
+    """Load the model once per worker process"""
+    from .backends import load_model_artifact
+    from .feature_plan import FeaturePlan
+
+    _worker_state['model'] = load_model_artifact(
+        model_path, metadata.get('framework', 'sklearn'), mmap=metadata.get('mmap', False)
+    )
+    _worker_state['metadata'] = metadata
+    _worker_state['plan'] = FeaturePlan(metadata)
+
+
+def _write_scores(
+    table: Any,
+    basename: str,
+    passthrough: List[str],
+    output_dir: str,
+    partition_by: List[str]
+) -> Tuple[int, int, List[str]]:
+    """Score one chunk and write it as Parquet; returns (rows, failed rows, files)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from .backends import infer_batch
+
+    model = _worker_state['model']
+    metadata = _worker_state['metadata']
+    plan = _worker_state['plan']
+    n_rows = table.num_rows
+
+    # Models without feature_names score every column that isn't passed through
+    names = plan.feature_names or [name for name in table.column_names if name not in passthrough]
+    columns = {name: table.column(name).to_pylist() for name in names if name in table.column_names}
+    matrix, errors = plan.build_matrix_from_columns(columns, n_rows)
+
+    results: List[Dict[str, Any]] = [{} for _ in range(n_rows)]
+    valid_rows = [i for i, error in enumerate(errors) if error is None]
+    if valid_rows:
+        if len(valid_rows) < n_rows:
+            matrix = matrix[valid_rows]
+        for i, prediction in zip(valid_rows, infer_batch(model, metadata, matrix)):
+            results[i] = prediction
+
+    output = table.select([name for name in passthrough if name in table.column_names])
+    for name, dtype in (
+        ('class', pa.int64()),
+        ('value', pa.float64()),
+        ('confidence', pa.float64()),
+        ('probabilities', pa.list_(pa.float64()))
+    ):
+        output = output.append_column(name, pa.array([result.get(name) for result in results], type=dtype))
+    output = output.append_column('error', pa.array(errors, type=pa.string()))
+
+    files: List[str] = []
+    if partition_by:
+        pq.write_to_dataset(
+            output, output_dir,
+            partition_cols=partition_by,
+            basename_template=f"{basename}-{{i}}.parquet",
+            file_visitor=lambda written: files.append(written.path)
+        )
+    else:
+        path = os.path.join(output_dir, f"{basename}.parquet")
+        pq.write_table(output, path)
+        files.append(path)
+    return n_rows, n_rows - len(valid_rows), files
+
+
+def score_row_group(
+    input_path: str,
+    row_group: int,
+    chunk_rows: int,
+    passthrough: List[str],
+    output_dir: str,
+    partition_by: List[str]
+) -> Tuple[int, int, List[str]]:
+    """Score one Parquet row group, reading at most ``chunk_rows`` rows at a time"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows = failed = 0
+    files: List[str] = []
+    parquet_file = pq.ParquetFile(input_path)
+    for k, batch in enumerate(parquet_file.iter_batches(batch_size=chunk_rows, row_groups=[row_group])):
+        chunk = _write_scores(
+            pa.Table.from_batches([batch]), f"part-{row_group:05d}-{k:04d}",
+            passthrough, output_dir, partition_by
+        )
+        rows += chunk[0]
+        failed += chunk[1]
+        files += chunk[2]
+    return rows, failed, files
+
+
+def score_table(
+    table: Any,
+    chunk_index: int,
+    passthrough: List[str],
+    output_dir: str,
+    partition_by: List[str]
+) -> Tuple[int, int, List[str]]:
+    """Score a chunk read by the parent, e.g. from a CSV file"""
+    return _write_scores(table, f"part-{chunk_index:05d}", passthrough, output_dir, partition_by)
+
+
+class BulkScoringService:
+    """Scores whole datasets with a registered model, outside the request path
+
+    A job reads a Parquet or CSV dataset from MinIO or local disk and fans
+    it out to a pool of worker processes, each of which loads the model
+    once. Parquet inputs are split by row group and read by the workers
+    themselves; CSV inputs are read in chunks by the job and sent to the
+    workers. At most ``2 x workers`` chunks are in flight, so memory stays
+    bounded by the chunk size rather than the dataset size.
+
+    Each chunk is written as its own Parquet file, optionally Hive
+    partitioned by ``partition_by``, and uploaded as soon as it is done.
+    Status and progress live in a Redis hash so any replica can report
+    them. Jobs beyond ``max_jobs`` wait for a free slot.
+    """
+
+    def __init__(
+        self,
+        ml_engine: Any,
+        redis_client: redis.Redis,
+        minio_client: Minio,
+        workers: int = 2,
+        chunk_rows: int = 50000,
+        work_dir: str = '/tmp/ml-scoring',
+        max_jobs: int = 1
+    ):
+        self.ml_engine = ml_engine
+        self.redis = redis_client
+        self.minio_client = minio_client
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+        self.work_dir = work_dir
+        self._slots = asyncio.Semaphore(max(1, max_jobs))
+        self._pools: Set[ProcessPoolExecutor] = set()
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"scoring:job:{job_id}"
+
+    async def create_job(self, request: ScoringJobRequest) -> str:
+        """Validate a request and record it as queued"""
+        input_format = request.input_format or detect_format(request.input_path)
+        if input_format not in DATASET_FORMATS:
+            raise ValueError(f"Unsupported input format: {input_format}")
+        if request.chunk_rows is not None and request.chunk_rows <= 0:
+            raise ValueError("chunk_rows must be positive")
+
+        job_id = str(uuid.uuid4())
+        await self._update(
+            job_id,
+            status='queued',
+            model_id=request.model_id,
+            input_path=request.input_path,
+            output_path=request.output_path,
+            created_at=datetime.utcnow().isoformat()
+        )
+        return job_id
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get job status and progress"""
+        job: Dict[str, Any] = await self.redis.hgetall(self._key(job_id))  # type: ignore
+        if not job:
+            return None
+
+        job['job_id'] = job_id
+        for field in ('rows_done', 'rows_failed', 'chunks_done', 'chunks_total'):
+            if field in job:
+                job[field] = int(job[field])
+        if job['status'] == 'completed':
+            job['progress'] = 100.0
+        elif job.get('chunks_total'):
+            job['progress'] = round(100.0 * job.get('chunks_done', 0) / job['chunks_total'], 1)
+        else:
+            job['progress'] = None
+        return job
+
+    async def run_job(self, job_id: str, request: ScoringJobRequest, model_path: str) -> None:
+        """Run a job created by ``create_job``; failures are recorded in its status"""
+        job_dir = os.path.join(self.work_dir, job_id)
+        async with self._slots:
+            try:
+                await self._update(job_id, status='running', started_at=datetime.utcnow().isoformat())
+                await self._run(job_id, request, model_path, job_dir)
+                await self._update(job_id, status='completed', finished_at=datetime.utcnow().isoformat())
+                logger.info(f"Scoring job {job_id} completed")
+            except Exception as e:
+                logger.error(f"Scoring job {job_id} failed: {e}")
+                await self._update(job_id, status='failed', error=str(e), finished_at=datetime.utcnow().isoformat())
+            finally:
+                await asyncio.to_thread(shutil.rmtree, job_dir, True)
+
+    async def _run(self, job_id: str, request: ScoringJobRequest, model_path: str, job_dir: str) -> None:
+        model_id = request.model_id
+        artifact_path, metadata = await self.ml_engine.serving_artifact(model_id, model_path)
+        input_format = request.input_format or detect_format(request.input_path)
+        chunk_rows = request.chunk_rows or self.chunk_rows
+        passthrough = list(dict.fromkeys((request.id_columns or []) + (request.partition_by or [])))
+        partition_by = request.partition_by or []
+
+        os.makedirs(job_dir, exist_ok=True)
+        input_path = await stage_dataset(self.minio_client, request.input_path, os.path.join(job_dir, 'input'))
+        if is_local_path(request.output_path):
+            output_dir = local_path(request.output_path)
+        else:
+            output_dir = os.path.join(job_dir, 'output')
+        os.makedirs(output_dir, exist_ok=True)
+
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            # Spawn rather than fork: the parent runs an event loop and thread pools
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(artifact_path, metadata)
+        )
+        self._pools.add(pool)
+        loop = asyncio.get_running_loop()
+        pending: Set[asyncio.Future] = set()
+
+        async def collect(return_when: str) -> None:
+            nonlocal pending
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=return_when)
+            for future in done:
+                rows, failed, files = future.result()
+                await self._publish(request.output_path, output_dir, files)
+                scoring_rows.labels(model_name=model_id, result='scored').inc(rows - failed)
+                scoring_rows.labels(model_name=model_id, result='failed').inc(failed)
+                await self.redis.hincrby(self._key(job_id), 'rows_done', rows)  # type: ignore
+                await self.redis.hincrby(self._key(job_id), 'rows_failed', failed)  # type: ignore
+                await self.redis.hincrby(self._key(job_id), 'chunks_done', 1)  # type: ignore
+
+        try:
+            if input_format == 'parquet':
+                import pyarrow.parquet as pq
+
+                row_groups = pq.ParquetFile(input_path).num_row_groups
+                await self._update(job_id, chunks_total=row_groups)
+                for row_group in range(row_groups):
+                    if len(pending) >= 2 * self.workers:
+                        await collect(asyncio.FIRST_COMPLETED)
+                    pending.add(loop.run_in_executor(
+                        pool, score_row_group,
+                        input_path, row_group, chunk_rows, passthrough, output_dir, partition_by
+                    ))
+            else:
+                chunks = iter_csv_chunks(input_path, chunk_rows)
+                chunk_index = 0
+                while True:
+                    # Parsing runs in a thread; the next chunk is read while workers score
+                    table = await asyncio.to_thread(next, chunks, None)
+                    if table is None:
+                        break
+                    if len(pending) >= 2 * self.workers:
+                        await collect(asyncio.FIRST_COMPLETED)
+                    pending.add(loop.run_in_executor(
+                        pool, score_table, table, chunk_index, passthrough, output_dir, partition_by
+                    ))
+                    chunk_index += 1
+                # The chunk count is only known once the whole file has been read
+                await self._update(job_id, chunks_total=chunk_index)
+
+            await collect(asyncio.ALL_COMPLETED)
+        finally:
+            self._pools.discard(pool)
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _publish(self, output_path: str, output_dir: str, files: List[str]) -> None:
+        """Upload finished output files to MinIO; local outputs are already in place"""
+        if is_local_path(output_path):
+            return
+        bucket, prefix = (output_path.rstrip('/') + '/').split('/', 1)
+        for path in files:
+            object_name = prefix + os.path.relpath(path, output_dir).replace(os.sep, '/')
+            await asyncio.to_thread(self.minio_client.fput_object, bucket, object_name, path)
+            os.remove(path)
+
+    async def _update(self, job_id: str, **fields: Any) -> None:
+        key = self._key(job_id)
+        await self.redis.hset(key, mapping={name: str(value) for name, value in fields.items()})  # type: ignore
+        await self.redis.expire(key, JOB_TTL_SECONDS)
+
+    def close(self) -> None:
+        """Stop the worker pools of running jobs"""
+        for pool in list(self._pools):
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pools.clear()
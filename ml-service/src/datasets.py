@@ -0,0 +1,102 @@
+"""Chunked access to Parquet and CSV datasets in MinIO or on local disk"""
+import asyncio
+import os
+from typing import Any, Iterator, List, Optional, Tuple
+from minio import Minio
+
+DATASET_FORMATS = ('parquet', 'csv')
+
+
+def is_local_path(path: str) -> bool:
+    """Local paths start with ``/`` or ``file://``; anything else is ``bucket/object``"""
+    return path.startswith('/') or path.startswith('file://')
+
+
+def local_path(path: str) -> str:
+    return path[len('file://'):] if path.startswith('file://') else path
+
+
+# File suffix -> Arrow compression codec
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bz2', '.zst': 'zstd'}
+
+
+def detect_format(path: str) -> str:
+    name = path.lower()
+    for suffix in COMPRESSION_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    if name.endswith('.parquet') or name.endswith('.pq'):
+        return 'parquet'
+    if name.endswith('.csv'):
+        return 'csv'
+    raise ValueError(f"Cannot infer the format of {path}; set input_format")
+
+
+async def stage_dataset(minio_client: Minio, path: str, directory: str) -> str:
+    """Local path of a dataset, downloading it from MinIO into ``directory`` if needed"""
+    if is_local_path(path):
+        return local_path(path)
+    bucket, object_name = path.split('/', 1)
+    staged_path = os.path.join(directory, os.path.basename(object_name))
+    await asyncio.to_thread(minio_client.fget_object, bucket, object_name, staged_path)
+    return staged_path
+
+
+def iter_csv_chunks(input_path: str, chunk_rows: int, columns: Optional[List[str]] = None) -> Iterator[Any]:
+    """Read a CSV file as tables of ``chunk_rows`` rows"""
+    for table, _ in iter_dataset(input_path, 'csv', chunk_rows, columns):
+        yield table
+
+
+def iter_dataset(
+    path: str,
+    dataset_format: str,
+    chunk_rows: int,
+    columns: Optional[List[str]] = None
+) -> Iterator[Tuple[Any, float]]:
+    """Read a local dataset as Arrow tables of ``chunk_rows`` rows
+
+    Yields each table with the fraction of the dataset read so far: by
+    rows for Parquet, by bytes for CSV, whose row count isn't known up
+    front. ``columns`` limits which columns are read.
+    """
+    import pyarrow as pa
+
+    if dataset_format == 'parquet':
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        total_rows = max(1, parquet_file.metadata.num_rows)
+        rows_read = 0
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+            rows_read += batch.num_rows
+            yield pa.Table.from_batches([batch]), rows_read / total_rows
+        return
+
+    if dataset_format != 'csv':
+        raise ValueError(f"Unsupported dataset format: {dataset_format}")
+
+    import pyarrow.csv as pa_csv
+
+    # Progress is measured on the file itself, before any decompression
+    total_bytes = max(1, os.path.getsize(path))
+    codec = next((codec for suffix, codec in COMPRESSION_SUFFIXES.items() if path.lower().endswith(suffix)), None)
+    with pa.OSFile(path) as source:
+        stream = pa.CompressedInputStream(source, codec) if codec else source
+        reader = pa_csv.open_csv(
+            stream, convert_options=pa_csv.ConvertOptions(include_columns=columns) if columns else None
+        )
+        batches = []
+        n_rows = 0
+        for batch in reader:
+            # Reader batches are sized in bytes; re-slice them to whole chunks
+            while batch.num_rows:
+                piece = batch.slice(0, chunk_rows - n_rows)
+                batch = batch.slice(piece.num_rows)
+                batches.append(piece)
+                n_rows += piece.num_rows
+                if n_rows == chunk_rows:
+                    yield pa.Table.from_batches(batches), min(1.0, source.tell() / total_bytes)
+                    batches, n_rows = [], 0
+        if batches:
+            yield pa.Table.from_batches(batches), 1.0
@@ -0,0 +1,196 @@
+"""In-process L1 cache for feature store reads"""
+import asyncio
+import json
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
+import redis.asyncio as redis
+from prometheus_client import Counter, Gauge
+import logging
+
+logger = logging.getLogger(__name__)
+
+feature_cache_hits = Counter('feature_cache_hits_total', 'L1 feature cache hits', ['group'])
+feature_cache_misses = Counter('feature_cache_misses_total', 'L1 feature cache misses', ['group'])
+feature_cache_evictions = Counter('feature_cache_evictions_total', 'L1 feature cache LRU evictions')
+feature_cache_bytes = Gauge('feature_cache_bytes', 'Estimated size of the L1 feature cache')
+
+INVALIDATION_CHANNEL = "feature:invalidate"
+
+# Rough per-entry overhead of the key tuple, entry tuple and OrderedDict node
+ENTRY_OVERHEAD_BYTES = 200
+
+
+class FeatureCache:
+    """Bounded LRU cache of feature values with per-feature-group TTLs
+
+    Caching is opt-in per feature group: only features belonging to a group
+    listed in ``group_ttls`` are cached, so freshness-critical features keep
+    going straight to Redis. Entries are evicted least-recently-used first
+    once the estimated size exceeds ``max_bytes``.
+
+    Writes and deletes on any worker are broadcast over a Redis pub/sub
+    channel so every worker drops the affected entries.
+    """
+
+    def __init__(
+        self,
+        group_ttls: Dict[str, float],
+        feature_groups: Dict[str, List[str]],
+        max_bytes: int = 64 * 1024 * 1024
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_of = {
+            feature_name: group_ttls[group]
+            for group, feature_names in feature_groups.items()
+            if group in group_ttls
+            for feature_name in feature_names
+        }
+        self.group_of = {
+            feature_name: group
+            for group, feature_names in feature_groups.items()
+            for feature_name in feature_names
+        }
+        self.instance_id = uuid.uuid4().hex
+        self.generation = 0
+        self.size_bytes = 0
+        self._entries: "OrderedDict[Tuple[Optional[str], str], Tuple[Any, float, int]]" = OrderedDict()
+        self._by_entity: Dict[Optional[str], set] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.ttl_of)
+
+    def is_cacheable(self, feature_name: str) -> bool:
+        return feature_name in self.ttl_of
+
+    def get(self, entity_id: Optional[str], feature_names: List[str]) -> Tuple[Dict[str, Any], List[str]]:
+        """Split requested features into cached values and names still to fetch"""
+        hits: Dict[str, Any] = {}
+        misses: List[str] = []
+        now = time.monotonic()
+
+        for feature_name in feature_names:
+            if feature_name not in self.ttl_of:
+                misses.append(feature_name)
+                continue
+
+            key = (entity_id, feature_name)
+            entry = self._entries.get(key)
+            group = self.group_of[feature_name]
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    self._remove(key)
+                feature_cache_misses.labels(group=group).inc()
+                misses.append(feature_name)
+                continue
+
+            self._entries.move_to_end(key)
+            feature_cache_hits.labels(group=group).inc()
+            hits[feature_name] = entry[0]
+
+        return hits, misses
+
+    def put(self, entity_id: Optional[str], features: Dict[str, Any], generation: Optional[int] = None) -> None:
+        """Cache the cacheable features of an entity
+
+        Pass the ``generation`` read before fetching from Redis: if an
+        invalidation arrived in the meantime the values may be stale and are
+        not cached.
+        """
+        if generation is not None and generation != self.generation:
+            return
+
+        now = time.monotonic()
+        for feature_name, value in features.items():
+            ttl = self.ttl_of.get(feature_name)
+            if ttl is None:
+                continue
+
+            key = (entity_id, feature_name)
+            if key in self._entries:
+                self._remove(key)
+
+            size = sys.getsizeof(value) + len(feature_name) + len(entity_id or '') + ENTRY_OVERHEAD_BYTES
+            self._entries[key] = (value, now + ttl, size)
+            self._by_entity.setdefault(entity_id, set()).add(feature_name)
+            self.size_bytes += size
+
+        while self.size_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            feature_cache_evictions.inc()
+
+        feature_cache_bytes.set(self.size_bytes)
+
+    def invalidate(self, entity_id: Optional[str], feature_names: Optional[List[str]] = None) -> None:
+        """Drop cached features of an entity (all of them when no names are given)"""
+        self.generation += 1
+        names = feature_names if feature_names is not None else list(self._by_entity.get(entity_id, ()))
+        for feature_name in names:
+            self._remove((entity_id, feature_name))
+        feature_cache_bytes.set(self.size_bytes)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self._by_entity.clear()
+        self.size_bytes = 0
+        feature_cache_bytes.set(0)
+
+    def _remove(self, key: Tuple[Optional[str], str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size_bytes -= entry[2]
+        entity_features = self._by_entity.get(key[0])
+        if entity_features is not None:
+            entity_features.discard(key[1])
+            if not entity_features:
+                del self._by_entity[key[0]]
+
+    def invalidation_message(self, entities: Dict[str, Optional[List[str]]]) -> str:
+        """Build the pub/sub payload announcing changed features"""
+        return json.dumps({'origin': self.instance_id, 'entities': entities})
+
+    def handle_message(self, data: str) -> None:
+        """Apply an invalidation published by another worker"""
+        message = json.loads(data)
+        if message.get('origin') == self.instance_id:
+            return
+        for entity_id, feature_names in message.get('entities', {}).items():
+            self.invalidate(entity_id, feature_names)
+
+    async def start_listener(self, redis_client: redis.Redis, channel: str = INVALIDATION_CHANNEL) -> None:
+        """Subscribe to invalidations from other workers"""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen(redis_client, channel))
+
+    async def stop_listener(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self, redis_client: redis.Redis, channel: str) -> None:
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self.handle_message(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Invalidations may have been missed while disconnected
+                logger.warning(f"Feature cache invalidation listener failed: {e}")
+                self.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
@@ -0,0 +1,442 @@
+"""Offline feature history and point-in-time joins for training sets"""
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from minio import Minio
+from prometheus_client import Counter, Histogram
+import logging
+
+from .datasets import is_local_path, iter_dataset, local_path
+
+logger = logging.getLogger(__name__)
+
+# Hive-style partition directories, one per hour of event time
+PARTITION_FORMAT = 'date=%Y-%m-%d/hour=%H'
+
+# Parallel downloads when reading history from MinIO
+DOWNLOAD_WORKERS = 8
+
+feature_history_rows = Counter('feature_history_rows_total', 'Feature values appended to the offline history')
+feature_history_dropped = Counter(
+    'feature_history_dropped_total',
+    'Feature values not recorded because the history buffer was full'
+)
+feature_history_flush_duration = Histogram(
+    'feature_history_flush_duration_seconds',
+    'Feature history flush time',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+feature_history_join_duration = Histogram(
+    'feature_history_join_duration_seconds',
+    'Point-in-time feature join time',
+    ['operation'],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+
+
+def history_schema() -> Any:
+    import pyarrow as pa
+
+    return pa.schema([
+        ('entity_id', pa.string()),
+        ('feature_name', pa.string()),
+        ('value', pa.float64()),
+        ('event_timestamp', pa.timestamp('us'))
+    ])
+
+
+def _utc(timestamps: Any) -> Any:
+    """Timestamps as naive UTC nanoseconds; naive input is taken to be UTC already"""
+    import pandas as pd
+
+    return pd.to_datetime(timestamps, utc=True).dt.tz_localize(None).astype('datetime64[ns]')
+
+
+def _partition_time(relative_path: str) -> Optional[datetime]:
+    """Hour of a ``date=.../hour=.../file`` path, or None for anything else"""
+    parts = relative_path.split('/')
+    if len(parts) < 3:
+        return None
+    try:
+        return datetime.strptime(f"{parts[0]}/{parts[1]}", PARTITION_FORMAT)
+    except ValueError:
+        return None
+
+
+class FeatureHistory:
+    """Append-only history of feature values as hourly-partitioned Parquet
+
+    Every value written to the online store is also recorded here as an
+    ``(entity_id, feature_name, value, event_timestamp)`` row, so training
+    sets can use features as they were when each label was observed rather
+    than their latest value. Rows are buffered and written every
+    ``flush_interval`` seconds or ``flush_rows`` rows, as one file per hour
+    partition under ``{path}/date=YYYY-MM-DD/hour=HH/``. ``path`` is
+    ``bucket/prefix`` in MinIO, or a local directory when it starts with
+    ``/`` or ``file://``. Only numeric values are kept; ``None`` is kept
+    as NaN so a feature that became empty stops reporting its old value.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        minio_client: Optional[Minio] = None,
+        flush_rows: int = 100000,
+        flush_interval: float = 60.0,
+        max_buffer_rows: int = 1000000
+    ):
+        self.local = is_local_path(path)
+        if self.local:
+            self.directory = local_path(path).rstrip('/')
+        else:
+            if minio_client is None:
+                raise ValueError("A MinIO client is needed for a feature history in object storage")
+            self.bucket, _, prefix = path.partition('/')
+            self.prefix = prefix.strip('/')
+        self.minio_client = minio_client
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = max(0.0, flush_interval)
+        self.max_buffer_rows = max(self.flush_rows, max_buffer_rows)
+        self._entity_ids: List[str] = []
+        self._feature_names: List[str] = []
+        self._values: List[Optional[float]] = []
+        self._timestamps: List[datetime] = []
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if not self.local:
+            if not await asyncio.to_thread(self.minio_client.bucket_exists, self.bucket):
+                await asyncio.to_thread(self.minio_client.make_bucket, self.bucket)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the flusher and write every buffered row"""
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    def record(self, entity_features: Dict[str, Dict[str, Any]], timestamp: Optional[datetime] = None) -> None:
+        """Queue feature values observed at ``timestamp`` (now by default)"""
+        timestamp = timestamp or datetime.utcnow()
+        for entity_id, features in entity_features.items():
+            for feature_name, value in features.items():
+                if value is not None and not isinstance(value, (bool, int, float)):
+                    continue
+                if len(self._values) >= self.max_buffer_rows:
+                    feature_history_dropped.inc()
+                    self._flush_requested.set()
+                    continue
+                self._entity_ids.append(str(entity_id))
+                self._feature_names.append(feature_name)
+                self._values.append(None if value is None else float(value))
+                self._timestamps.append(timestamp)
+
+        if len(self._values) >= self.flush_rows:
+            self._flush_requested.set()
+
+    async def _run(self) -> None:
+        """Flush loop; wakes on a full batch or after the flush interval"""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write all buffered rows"""
+        async with self._flush_lock:
+            if not self._values:
+                return
+            columns = (self._entity_ids, self._feature_names, self._values, self._timestamps)
+            self._entity_ids, self._feature_names, self._values, self._timestamps = [], [], [], []
+
+            start_time = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write, *columns)
+            except Exception as e:
+                logger.error(f"Failed to write {len(columns[2])} feature history rows: {e}")
+                self._requeue(columns)
+                return
+            feature_history_flush_duration.observe(time.perf_counter() - start_time)
+            feature_history_rows.inc(len(columns[2]))
+
+    def _requeue(self, columns: Tuple[List[Any], ...]) -> None:
+        """Put rows from a failed flush back, keeping the buffer within its cap"""
+        room = max(0, self.max_buffer_rows - len(self._values))
+        if len(columns[2]) > room:
+            feature_history_dropped.inc(len(columns[2]) - room)
+        for buffered, failed in zip(
+            (self._entity_ids, self._feature_names, self._values, self._timestamps), columns
+        ):
+            buffered[:0] = failed[:room]
+
+    def _write(
+        self,
+        entity_ids: List[str],
+        feature_names: List[str],
+        values: List[Optional[float]],
+        timestamps: List[datetime]
+    ) -> None:
+        """Write one Parquet file per hour partition, sorted for row group pruning"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = history_schema()
+        table = pa.Table.from_arrays(
+            [pa.array(column, field.type) for column, field in zip((entity_ids, feature_names, values, timestamps), schema)],
+            schema=schema
+        )
+        hours = np.array(timestamps, dtype='datetime64[h]')
+        for hour in np.unique(hours):
+            part = table.filter(pa.array(hours == hour)).sort_by(
+                [('feature_name', 'ascending'), ('event_timestamp', 'ascending')]
+            )
+            partition = hour.item().strftime(PARTITION_FORMAT)
+            file_name = f"{uuid.uuid4().hex}.parquet"
+            if self.local:
+                directory = os.path.join(self.directory, partition)
+                os.makedirs(directory, exist_ok=True)
+                # Readers list the directory, so only complete files may appear in it
+                staging_path = os.path.join(directory, f".{file_name}.tmp")
+                pq.write_table(part, staging_path)
+                os.replace(staging_path, os.path.join(directory, file_name))
+                continue
+            with tempfile.TemporaryDirectory(prefix='feature-history-') as staging:
+                staging_path = os.path.join(staging, file_name)
+                pq.write_table(part, staging_path)
+                object_name = '/'.join(p for p in (self.prefix, partition, file_name) if p)
+                self.minio_client.fput_object(self.bucket, object_name, staging_path)
+
+    def _partition_files(self, start: Optional[datetime], end: datetime, staging: str) -> List[str]:
+        """Local paths of the history files for hours overlapping ``[start, end]``
+
+        Files in MinIO are downloaded into ``staging``.
+        """
+        first_hour = start.replace(minute=0, second=0, microsecond=0) if start else None
+
+        def wanted(relative_path: str) -> bool:
+            hour = _partition_time(relative_path)
+            return (
+                relative_path.endswith('.parquet') and hour is not None
+                and (first_hour is None or hour >= first_hour) and hour <= end
+            )
+
+        if self.local:
+            if not os.path.isdir(self.directory):
+                return []
+            paths = []
+            for root, _, files in os.walk(self.directory):
+                for file_name in files:
+                    path = os.path.join(root, file_name)
+                    if wanted(os.path.relpath(path, self.directory).replace(os.sep, '/')):
+                        paths.append(path)
+            return sorted(paths)
+
+        base = f"{self.prefix}/" if self.prefix else ''
+        if start:
+            days = (end.date() - start.date()).days + 1
+            prefixes = [
+                f"{base}{(start + timedelta(days=i)):date=%Y-%m-%d}/" for i in range(max(days, 0))
+            ]
+        else:
+            prefixes = [base]
+        objects = [
+            obj.object_name
+            for prefix in prefixes
+            for obj in self.minio_client.list_objects(self.bucket, prefix=prefix, recursive=True)
+            if wanted(obj.object_name[len(base):])
+        ]
+
+        def download(object_name: str) -> str:
+            path = os.path.join(staging, object_name.replace('/', '_'))
+            self.minio_client.fget_object(self.bucket, object_name, path)
+            return path
+
+        with ThreadPoolExecutor(DOWNLOAD_WORKERS) as pool:
+            return list(pool.map(download, sorted(objects)))
+
+    def read(
+        self,
+        feature_names: List[str],
+        entity_ids: Optional[Iterable[str]],
+        start: Optional[datetime],
+        end: datetime
+    ) -> Any:
+        """History rows of some features and entities between ``start`` and ``end`` as a DataFrame"""
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        schema = history_schema()
+        with tempfile.TemporaryDirectory(prefix='feature-history-') as staging:
+            files = self._partition_files(start, end, staging)
+            if not files:
+                return schema.empty_table().to_pandas()
+            condition = ds.field('feature_name').isin(feature_names) & (ds.field('event_timestamp') <= end)
+            if start:
+                condition &= ds.field('event_timestamp') >= start
+            if entity_ids is not None:
+                condition &= ds.field('entity_id').isin(pa.array(list(entity_ids), pa.string()))
+            table = ds.dataset(files, schema=schema, format='parquet').to_table(filter=condition)
+        return table.to_pandas()
+
+    def _load(
+        self,
+        feature_names: List[str],
+        entity_ids: Set[str],
+        first: Any,
+        last: Any,
+        max_age: Optional[float]
+    ) -> Dict[str, Any]:
+        """History per feature, sorted by time, covering label times ``first`` to ``last``"""
+        import pandas as pd
+
+        if not entity_ids or first is None or pd.isna(first):
+            return {}
+        # History is stored in microseconds; round outwards so no boundary value is lost
+        start = (first - timedelta(seconds=max_age)).floor('us').to_pydatetime() if max_age else None
+        history = self.read(feature_names, entity_ids, start, last.ceil('us').to_pydatetime())
+        history['event_timestamp'] = history['event_timestamp'].astype('datetime64[ns]')
+        history = history.sort_values('event_timestamp', kind='stable')
+        return {
+            name: group[['entity_id', 'event_timestamp', 'value']]
+            for name, group in history.groupby('feature_name', sort=False)
+        }
+
+    @staticmethod
+    def _join(
+        entity_ids: Any,
+        timestamps: Any,
+        history: Dict[str, Any],
+        feature_names: List[str],
+        max_age: Optional[float]
+    ) -> Dict[str, np.ndarray]:
+        """Each feature's latest value at or before each row's timestamp
+
+        One sorted merge (``merge_asof``) per feature rather than a lookup
+        per row. Rows without a timestamp or without an earlier value get NaN.
+        """
+        import pandas as pd
+
+        n = len(timestamps)
+        left = pd.DataFrame({
+            'entity_id': np.asarray(entity_ids, dtype=object),
+            'label_timestamp': timestamps.to_numpy(),
+            'row': np.arange(n)
+        })
+        left = left[left['label_timestamp'].notna()].sort_values('label_timestamp', kind='stable')
+        tolerance = pd.Timedelta(seconds=max_age) if max_age else None
+
+        columns = {}
+        for name in feature_names:
+            values = np.full(n, np.nan)
+            right = history.get(name)
+            if right is not None and len(left):
+                merged = pd.merge_asof(
+                    left, right,
+                    left_on='label_timestamp', right_on='event_timestamp',
+                    by='entity_id', direction='backward', tolerance=tolerance
+                )
+                values[merged['row'].to_numpy()] = merged['value'].to_numpy()
+            columns[name] = values
+        return columns
+
+    def get_historical_features(
+        self,
+        entity_df: Any,
+        feature_names: List[str],
+        entity_column: str = 'entity_id',
+        timestamp_column: str = 'event_timestamp',
+        max_age: Optional[float] = None
+    ) -> Any:
+        """``entity_df`` with each feature's value as of the row's timestamp
+
+        ``max_age`` (seconds) ignores values older than that at label time.
+        """
+        for column in (entity_column, timestamp_column):
+            if column not in entity_df.columns:
+                raise ValueError(f"entity_df has no {column} column")
+        clashing = set(feature_names) & set(entity_df.columns)
+        if clashing:
+            raise ValueError(f"entity_df already has columns named like features: {', '.join(sorted(clashing))}")
+
+        start_time = time.perf_counter()
+        timestamps = _utc(entity_df[timestamp_column])
+        entity_ids = entity_df[entity_column].astype(str).to_numpy()
+        history = self._load(feature_names, set(entity_ids), timestamps.min(), timestamps.max(), max_age)
+        result = entity_df.assign(**self._join(entity_ids, timestamps, history, feature_names, max_age))
+        feature_history_join_duration.labels(operation='dataframe').observe(time.perf_counter() - start_time)
+        return result
+
+    def build_training_set(
+        self,
+        input_path: str,
+        input_format: str,
+        output_path: str,
+        feature_names: List[str],
+        entity_column: str,
+        timestamp_column: str,
+        max_age: Optional[float] = None,
+        chunk_rows: int = 50000
+    ) -> int:
+        """Write a labeled dataset with point-in-time features joined on as Parquet
+
+        The first pass reads only the entity and timestamp columns to
+        bound the history that is loaded; the second joins chunk by chunk,
+        so memory holds the relevant history plus one chunk of labels.
+        Returns the number of rows written.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        start_time = time.perf_counter()
+        entity_ids: Set[str] = set()
+        first = last = None
+        for table, _ in iter_dataset(input_path, input_format, chunk_rows, [entity_column, timestamp_column]):
+            entity_ids.update(table.column(entity_column).to_pandas().astype(str).unique())
+            timestamps = _utc(table.column(timestamp_column).to_pandas())
+            if timestamps.notna().any():
+                first = timestamps.min() if first is None else min(first, timestamps.min())
+                last = timestamps.max() if last is None else max(last, timestamps.max())
+        history = self._load(feature_names, entity_ids, first, last, max_age)
+
+        rows = 0
+        writer = None
+        try:
+            for table, _ in iter_dataset(input_path, input_format, chunk_rows):
+                clashing = set(feature_names) & set(table.column_names)
+                if clashing:
+                    raise ValueError(f"Dataset already has columns named like features: {', '.join(sorted(clashing))}")
+                columns = self._join(
+                    table.column(entity_column).to_pandas().astype(str).to_numpy(),
+                    _utc(table.column(timestamp_column).to_pandas()),
+                    history, feature_names, max_age
+                )
+                for name in feature_names:
+                    table = table.append_column(name, pa.array(columns[name], pa.float64()))
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+                rows += table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        if not rows:
+            raise ValueError("Training dataset is empty")
+        feature_history_join_duration.labels(operation='training_set').observe(time.perf_counter() - start_time)
+        return rows
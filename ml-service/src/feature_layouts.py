@@ -0,0 +1,142 @@
+"""Redis key layouts for the feature store"""
+import json
+from typing import Dict, Any, Optional, List, Sequence, Tuple
+import redis.asyncio as redis
+
+Lookup = Tuple[Optional[str], Optional[List[str]]]
+
+
+class StringFeatureLayout:
+    """One Redis string per feature: ``feature:{entity_id}:{feature_name}``"""
+
+    name = 'string'
+
+    def key(self, entity_id: Optional[str], feature_name: str) -> str:
+        return f"feature:{entity_id}:{feature_name}"
+
+    async def read(self, redis_client: redis.Redis, lookups: Sequence[Lookup]) -> List[Dict[str, Any]]:
+        """Read all requested features with a single MGET"""
+        results: List[Dict[str, Any]] = [{} for _ in lookups]
+
+        keys = []
+        owners = []
+        for i, (entity_id, feature_names) in enumerate(lookups):
+            for feature_name in feature_names or []:
+                keys.append(self.key(entity_id, feature_name))
+                owners.append((i, feature_name))
+
+        if not keys:
+            return results
+
+        values = await redis_client.mget(keys)
+        for (i, feature_name), value in zip(owners, values):
+            if value is not None:
+                results[i][feature_name] = json.loads(value)
+
+        return results
+
+    def write(self, pipe: Any, entity_id: str, features: Dict[str, Any], ttl: int) -> None:
+        """Queue the writes for one entity on a pipeline"""
+        for feature_name, value in features.items():
+            pipe.set(self.key(entity_id, feature_name), json.dumps(value), ex=ttl)
+
+    async def delete(
+        self,
+        redis_client: redis.Redis,
+        entity_id: str,
+        feature_names: Optional[List[str]] = None
+    ) -> None:
+        if feature_names:
+            keys = [self.key(entity_id, name) for name in feature_names]
+        else:
+            keys = [key async for key in redis_client.scan_iter(match=f"feature:{entity_id}:*")]
+
+        if keys:
+            await redis_client.delete(*keys)
+
+
+class HashFeatureLayout:
+    """One Redis hash per entity (and feature group) with an entity-level TTL
+
+    Features are stored as fields of ``features:{entity_id}``, or of
+    ``features:{entity_id}:{group}`` when the feature belongs to a configured
+    feature group. Every write refreshes the TTL of the whole hash, so an
+    entity's features expire together rather than one key at a time.
+    """
+
+    name = 'hash'
+
+    def __init__(self, feature_groups: Optional[Dict[str, List[str]]] = None):
+        self.feature_groups = feature_groups or {}
+        self.group_of = {
+            feature_name: group
+            for group, feature_names in self.feature_groups.items()
+            for feature_name in feature_names
+        }
+
+    def key(self, entity_id: Optional[str], group: Optional[str] = None) -> str:
+        if group is None:
+            return f"features:{entity_id}"
+        return f"features:{entity_id}:{group}"
+
+    def split_by_key(self, entity_id: Optional[str], feature_names: Sequence[str]) -> Dict[str, List[str]]:
+        """Feature names grouped by the hash that holds them"""
+        by_key: Dict[str, List[str]] = {}
+        for feature_name in feature_names:
+            by_key.setdefault(self.key(entity_id, self.group_of.get(feature_name)), []).append(feature_name)
+        return by_key
+
+    async def read(self, redis_client: redis.Redis, lookups: Sequence[Lookup]) -> List[Dict[str, Any]]:
+        """Read all requested features with one pipelined HMGET per hash"""
+        results: List[Dict[str, Any]] = [{} for _ in lookups]
+
+        owners = []
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for i, (entity_id, feature_names) in enumerate(lookups):
+                for key, fields in self.split_by_key(entity_id, feature_names or []).items():
+                    pipe.hmget(key, fields)
+                    owners.append((i, fields))
+
+            if not owners:
+                return results
+
+            replies = await pipe.execute()
+
+        for (i, fields), values in zip(owners, replies):
+            for feature_name, value in zip(fields, values):
+                if value is not None:
+                    results[i][feature_name] = json.loads(value)
+
+        return results
+
+    def write(self, pipe: Any, entity_id: str, features: Dict[str, Any], ttl: int) -> None:
+        """Queue one HSET and one EXPIRE per hash on a pipeline"""
+        for key, feature_names in self.split_by_key(entity_id, list(features)).items():
+            pipe.hset(key, mapping={name: json.dumps(features[name]) for name in feature_names})
+            pipe.expire(key, ttl)
+
+    async def delete(
+        self,
+        redis_client: redis.Redis,
+        entity_id: str,
+        feature_names: Optional[List[str]] = None
+    ) -> None:
+        if feature_names:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key, fields in self.split_by_key(entity_id, feature_names).items():
+                    pipe.hdel(key, *fields)
+                await pipe.execute()
+            return
+
+        keys = [self.key(entity_id)]
+        keys.extend([key async for key in redis_client.scan_iter(match=f"features:{entity_id}:*")])
+        await redis_client.delete(*keys)
+
+
+def make_layout(name: str, feature_groups: Optional[Dict[str, List[str]]] = None) -> Any:
+    """Build a feature layout by its config name"""
+    if name == 'string':
+        return StringFeatureLayout()
+    if name == 'hash':
+        return HashFeatureLayout(feature_groups)
+    raise ValueError(f"Unknown feature store layout: {name}")
@@ -0,0 +1,384 @@
+"""Set-based materialization of aggregate features from the transaction tables"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+import redis.asyncio as redis
+from sqlalchemy import and_, column, distinct, func, or_, select, table
+from sqlalchemy.ext.asyncio import AsyncEngine
+from prometheus_client import Counter, Histogram
+import logging
+
+logger = logging.getLogger(__name__)
+
+AGGREGATIONS = ('sum', 'count', 'avg', 'min', 'max', 'count_distinct')
+
+# Aggregations that are 0 rather than missing for an entity without rows
+ZERO_DEFAULT = ('sum', 'count', 'count_distinct')
+
+WINDOW_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+
+# Incremental runs also look at rows updated shortly before the watermark,
+# which transactions still open during the last run may have committed late
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Fields a definition doesn't have to set; columns are Prisma's camelCase names
+DEFINITION_DEFAULTS: Dict[str, Any] = {
+    'table': 'Transaction',
+    'entity_column': 'userId',
+    'timestamp_column': 'createdAt',
+    'updated_column': 'updatedAt',
+    'where': {'status': 'COMPLETED'},
+    'column': None,
+    'window': None
+}
+
+DEFAULT_FEATURE_DEFINITIONS: List[Dict[str, Any]] = [
+    {'name': 'spend_7d', 'aggregation': 'sum', 'column': 'amount', 'window': '7d'},
+    {'name': 'spend_30d', 'aggregation': 'sum', 'column': 'amount', 'window': '30d'},
+    {'name': 'avg_ticket_30d', 'aggregation': 'avg', 'column': 'amount', 'window': '30d'},
+    {'name': 'transactions_7d', 'aggregation': 'count', 'window': '7d'},
+    {'name': 'transactions_30d', 'aggregation': 'count', 'window': '30d'},
+    {'name': 'venues_visited_30d', 'aggregation': 'count_distinct', 'column': 'venueId', 'window': '30d'},
+    {'name': 'venue_visits_7d', 'entity_column': 'venueId', 'aggregation': 'count', 'window': '7d'},
+    {'name': 'venue_visits_30d', 'entity_column': 'venueId', 'aggregation': 'count', 'window': '30d'},
+    {'name': 'venue_visitors_30d', 'entity_column': 'venueId', 'aggregation': 'count_distinct', 'column': 'userId', 'window': '30d'},
+    {'name': 'venue_revenue_30d', 'entity_column': 'venueId', 'aggregation': 'sum', 'column': 'amount', 'window': '30d'},
+]
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+materialized_entities = Counter(
+    'feature_materialization_entities_total',
+    'Entities whose features were materialized, by run mode (full, incremental, entities)',
+    ['mode']
+)
+materialization_duration = Histogram(
+    'feature_materialization_duration_seconds',
+    'Feature materialization run time',
+    ['mode'],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+)
+
+
+def parse_window(window: Optional[str]) -> Optional[timedelta]:
+    """``7d``, ``12h`` or ``30m`` as a timedelta; None means all history"""
+    if window is None:
+        return None
+    match = re.match(r'^(\d+)([mhd])$', window)
+    if not match:
+        raise ValueError(f"Invalid window {window}; expected e.g. 30m, 12h or 7d")
+    return timedelta(**{WINDOW_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def parse_definitions(definitions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fill in defaults and check feature definitions"""
+    parsed = []
+    names = set()
+    for definition in definitions:
+        definition = {**DEFINITION_DEFAULTS, **definition}
+        name = definition.get('name')
+        if not name or name in names:
+            raise ValueError(f"Feature definitions need unique names, got {name!r}")
+        names.add(name)
+        if definition.get('aggregation') not in AGGREGATIONS:
+            raise ValueError(f"Feature {name}: aggregation must be one of {', '.join(AGGREGATIONS)}")
+        if definition['aggregation'] != 'count' and not definition['column']:
+            raise ValueError(f"Feature {name}: {definition['aggregation']} needs a column")
+
+        # Identifiers end up in SQL; values in `where` are bound parameters
+        identifiers = [definition[field] for field in ('table', 'entity_column', 'timestamp_column', 'updated_column', 'column')]
+        for identifier in identifiers + list(definition['where']):
+            if identifier is not None and not _IDENTIFIER.match(identifier):
+                raise ValueError(f"Feature {name}: invalid identifier {identifier!r}")
+        definition['window_delta'] = parse_window(definition['window'])
+        parsed.append(definition)
+    return parsed
+
+
+class _DefinitionGroup:
+    """Definitions over the same table, entity, timestamps and filter, computed by one query"""
+
+    def __init__(self, definitions: List[Dict[str, Any]]):
+        first = definitions[0]
+        self.definitions = definitions
+        self.feature_names = [definition['name'] for definition in definitions]
+        self.table_name = first['table']
+        self.where: Dict[str, Any] = first['where']
+        columns = {first['entity_column'], first['timestamp_column'], first['updated_column'], *self.where}
+        columns.update(definition['column'] for definition in definitions if definition['column'])
+        self.table = table(self.table_name, *[column(name) for name in sorted(columns)])
+        self.entity = self.table.c[first['entity_column']]
+        self.timestamp = self.table.c[first['timestamp_column']]
+        self.updated = self.table.c[first['updated_column']]
+        self.windows = sorted({definition['window_delta'] for definition in definitions if definition['window_delta']})
+        # Rows older than every window can't contribute to any feature
+        self.all_windowed = all(definition['window_delta'] for definition in definitions)
+
+        # Watermarks belong to the exact set of definitions, so changing them forces a full run
+        digest = hashlib.sha1(json.dumps(
+            [{key: value for key, value in definition.items() if key != 'window_delta'} for definition in definitions],
+            sort_keys=True, default=str
+        ).encode()).hexdigest()[:16]
+        self.watermark_key = f"features:watermark:{self.table_name}:{first['entity_column']}:{digest}"
+
+    @staticmethod
+    def key_of(definition: Dict[str, Any]) -> Tuple:
+        return (
+            definition['table'], definition['entity_column'], definition['timestamp_column'],
+            definition['updated_column'], json.dumps(definition['where'], sort_keys=True)
+        )
+
+    def entity_query(
+        self,
+        after: Optional[str],
+        limit: int,
+        now: datetime,
+        watermark: Optional[datetime] = None,
+        entity_ids: Optional[List[str]] = None,
+        stale_for: Optional[timedelta] = None
+    ) -> Any:
+        """The next chunk of entity ids to compute, in id order (keyset pagination)
+
+        Incremental runs pick entities with rows updated since the
+        watermark, and entities whose rows slid out of a window since
+        then. Full runs pick every entity with rows in the largest window,
+        or that left it less than ``stale_for`` (the feature TTL) ago and
+        may still have stale values stored; without ``stale_for``, every
+        entity. The group's filter is not applied here: a row that stopped
+        matching it (e.g. a refund) still changes the entity's features.
+        """
+        conditions = [self.entity.isnot(None)]
+        if after is not None:
+            conditions.append(self.entity > after)
+        if entity_ids is not None:
+            conditions.append(self.entity.in_(entity_ids))
+        elif watermark is not None:
+            since = watermark - WATERMARK_OVERLAP
+            touched = [self.updated > since]
+            for window in self.windows:
+                touched.append(and_(self.timestamp >= since - window, self.timestamp < now - window))
+            conditions.append(or_(*touched))
+        elif self.all_windowed and stale_for is not None:
+            conditions.append(self.timestamp >= now - self.windows[-1] - stale_for)
+        return (
+            select(self.entity)
+            .distinct()
+            .where(*conditions)
+            .order_by(self.entity)
+            .limit(limit)
+        )
+
+    def aggregate_query(self, entity_ids: List[str], now: datetime) -> Any:
+        """Every feature of the group for a chunk of entities, in one GROUP BY"""
+        columns = [self.entity]
+        for definition in self.definitions:
+            aggregation = definition['aggregation']
+            if aggregation == 'count':
+                expression = func.count()
+            elif aggregation == 'count_distinct':
+                expression = func.count(distinct(self.table.c[definition['column']]))
+            else:
+                expression = getattr(func, aggregation)(self.table.c[definition['column']])
+            if definition['window_delta']:
+                expression = expression.filter(self.timestamp >= now - definition['window_delta'])
+            columns.append(expression.label(definition['name']))
+
+        conditions = [self.entity.in_(entity_ids)]
+        for name, value in self.where.items():
+            if isinstance(value, list):
+                conditions.append(self.table.c[name].in_(value))
+            else:
+                conditions.append(self.table.c[name] == value)
+        if self.all_windowed:
+            conditions.append(self.timestamp >= now - self.windows[-1])
+        return select(*columns).where(*conditions).group_by(self.entity)
+
+    def features(self, row: Optional[Any]) -> Dict[str, Any]:
+        """Feature values of one aggregated row; None for an entity without matching rows"""
+        features: Dict[str, Any] = {}
+        for definition in self.definitions:
+            value = getattr(row, definition['name']) if row is not None else None
+            if value is None and definition['aggregation'] in ZERO_DEFAULT:
+                value = 0
+            features[definition['name']] = float(value) if value is not None else None
+        return features
+
+
+class FeatureMaterializer:
+    """Computes aggregate features for all entities with set-based SQL
+
+    Definitions that share a table, entity column and filter are computed
+    together, ``chunk_size`` entities per query: one keyset-paginated query
+    picks the entity ids, one GROUP BY with a ``FILTER`` per window
+    aggregates them. Each chunk is written with a single pipelined
+    ``store_features_bulk``.
+
+    Incremental runs only recompute entities touched since the watermark
+    of the last complete run. Runs are serialized across replicas with a
+    Redis lock.
+    """
+
+    LOCK_KEY = 'features:materialization:lock'
+
+    def __init__(
+        self,
+        feature_store: Any,
+        db_engine: AsyncEngine,
+        redis_client: redis.Redis,
+        definitions: Optional[List[Dict[str, Any]]] = None,
+        chunk_size: int = 5000,
+        ttl: int = 2 * 24 * 3600,
+        lock_timeout: int = 3600
+    ):
+        self.feature_store = feature_store
+        self.db_engine = db_engine
+        self.redis = redis_client
+        self.definitions = parse_definitions(DEFAULT_FEATURE_DEFINITIONS if definitions is None else definitions)
+        self.chunk_size = max(1, chunk_size)
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def feature_names(self) -> List[str]:
+        return [definition['name'] for definition in self.definitions]
+
+    def _groups(self, feature_names: Optional[List[str]]) -> List[Tuple[_DefinitionGroup, bool]]:
+        """Definition groups to compute, each with whether it is complete"""
+        unknown = set(feature_names or []) - set(self.feature_names)
+        if unknown:
+            raise ValueError(f"Unknown features: {', '.join(sorted(unknown))}")
+
+        by_key: Dict[Tuple, List[Dict[str, Any]]] = {}
+        for definition in self.definitions:
+            by_key.setdefault(_DefinitionGroup.key_of(definition), []).append(definition)
+
+        groups = []
+        for definitions in by_key.values():
+            selected = [d for d in definitions if not feature_names or d['name'] in feature_names]
+            if selected:
+                # The watermark is that of the full group even when computing part of it
+                group = _DefinitionGroup(definitions)
+                if len(selected) < len(definitions):
+                    partial = _DefinitionGroup(selected)
+                    partial.watermark_key = group.watermark_key
+                    group = partial
+                groups.append((group, len(selected) == len(definitions)))
+        return groups
+
+    async def run(
+        self,
+        feature_names: Optional[List[str]] = None,
+        entity_ids: Optional[List[str]] = None,
+        incremental: bool = True
+    ) -> Dict[str, Any]:
+        """Materialize features and return how many entities were written per definition group
+
+        With ``entity_ids`` only those entities are computed. Otherwise
+        every entity is, or with ``incremental`` only the entities touched
+        since the last complete run; the first incremental run is a full one.
+        """
+        groups = self._groups(feature_names)
+        mode = 'entities' if entity_ids is not None else ('incremental' if incremental else 'full')
+
+        token = str(time.time())
+        if not await self.redis.set(self.LOCK_KEY, token, nx=True, ex=self.lock_timeout):
+            logger.info("Feature materialization is already running elsewhere; skipping")
+            return {'status': 'skipped', 'mode': mode}
+
+        start_time = time.perf_counter()
+        results = []
+        try:
+            for group, complete in groups:
+                results.append({
+                    'entity_column': group.entity.name,
+                    'features': group.feature_names,
+                    'entities': await self._run_group(group, complete, mode, entity_ids)
+                })
+        finally:
+            if await self.redis.get(self.LOCK_KEY) == token:
+                await self.redis.delete(self.LOCK_KEY)
+
+        elapsed = time.perf_counter() - start_time
+        materialization_duration.labels(mode=mode).observe(elapsed)
+        logger.info(f"Materialized features ({mode}) for {sum(r['entities'] for r in results)} entities in {elapsed:.1f}s")
+        return {'status': 'completed', 'mode': mode, 'groups': results}
+
+    async def _run_group(
+        self,
+        group: _DefinitionGroup,
+        complete: bool,
+        mode: str,
+        entity_ids: Optional[List[str]]
+    ) -> int:
+        now = datetime.utcnow()
+        watermark = None
+        if mode == 'incremental':
+            stored = await self.redis.get(group.watermark_key)
+            watermark = datetime.fromisoformat(stored) if stored else None
+
+        n_entities = 0
+        async with self.db_engine.connect() as conn:
+            async for ids in self._entity_chunks(conn, group, now, watermark, entity_ids):
+                rows = {row[0]: row for row in (await conn.execute(group.aggregate_query(ids, now))).all()}
+                await self.feature_store.store_features_bulk(
+                    {entity_id: group.features(rows.get(entity_id)) for entity_id in ids}, self.ttl
+                )
+                n_entities += len(ids)
+                materialized_entities.labels(mode=mode).inc(len(ids))
+
+        # A later incremental run may only skip what this run fully covered
+        if complete and entity_ids is None:
+            await self.redis.set(group.watermark_key, now.isoformat())
+        return n_entities
+
+    async def _entity_chunks(
+        self,
+        conn: Any,
+        group: _DefinitionGroup,
+        now: datetime,
+        watermark: Optional[datetime],
+        entity_ids: Optional[List[str]]
+    ) -> AsyncIterator[List[str]]:
+        if entity_ids is not None:
+            # Explicit ids are checked against the table, so an id of another entity type writes nothing
+            for i in range(0, len(entity_ids), self.chunk_size):
+                query = group.entity_query(None, self.chunk_size, now, entity_ids=entity_ids[i:i + self.chunk_size])
+                ids = [row[0] for row in (await conn.execute(query)).all()]
+                if ids:
+                    yield ids
+            return
+
+        # Entities whose rows all left the windows are zeroed until their old values would have expired
+        stale_for = timedelta(seconds=self.ttl) if self.ttl and self.ttl > 0 else None
+        after = None
+        while True:
+            query = group.entity_query(after, self.chunk_size, now, watermark, stale_for=stale_for)
+            ids = [row[0] for row in (await conn.execute(query)).all()]
+            if not ids:
+                return
+            yield ids
+            after = ids[-1]
+
+    def start(self, interval: float) -> None:
+        """Run incremental materialization every ``interval`` seconds"""
+        if interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._schedule(interval))
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _schedule(self, interval: float) -> None:
+        while True:
+            try:
+                await self.run(incremental=True)
+            except Exception as e:
+                logger.error(f"Scheduled feature materialization failed: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,134 @@
+"""Backfill the hash feature layout from the string-per-feature layout
+
+Run from the ml-service directory before switching FEATURE_STORE_LAYOUT
+to ``hash``:
+
+    python -m src.feature_migration --redis-url redis://localhost:6379 \
+        --feature-groups '{"spend": ["spend_7d", "spend_30d"]}'
+
+Each entity's hash gets the longest remaining TTL of its old keys, and no
+TTL at all if any of them had none, so no feature expires earlier than it
+would have under the old layout. Needs Redis 7 for ``EXPIRE ... GT``.
+"""
+import argparse
+import asyncio
+import json
+from typing import Dict, Any, Optional, List
+import redis.asyncio as redis
+import logging
+
+from .feature_layouts import HashFeatureLayout
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate_string_to_hash(
+    redis_client: redis.Redis,
+    layout: HashFeatureLayout,
+    batch_size: int = 1000,
+    delete_source: bool = False,
+    dry_run: bool = False
+) -> Dict[str, int]:
+    """Copy every ``feature:{entity_id}:{feature_name}`` key into entity hashes"""
+    stats = {'keys': 0, 'entities': 0}
+    batch: List[str] = []
+
+    async for key in redis_client.scan_iter(match="feature:*", count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            await _migrate_batch(redis_client, layout, batch, stats, delete_source, dry_run)
+            batch = []
+
+    if batch:
+        await _migrate_batch(redis_client, layout, batch, stats, delete_source, dry_run)
+
+    logger.info(f"Migrated {stats['keys']} feature keys for {stats['entities']} entities")
+    return stats
+
+
+async def _migrate_batch(
+    redis_client: redis.Redis,
+    layout: HashFeatureLayout,
+    keys: List[str],
+    stats: Dict[str, int],
+    delete_source: bool,
+    dry_run: bool
+) -> None:
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.get(key)
+            pipe.ttl(key)
+        replies = await pipe.execute()
+
+    # Group values by entity; feature names never contain ':' but entity ids may
+    entities: Dict[str, Dict[str, Any]] = {}
+    entity_ttls: Dict[str, int] = {}
+    persistent = set()
+    for i, key in enumerate(keys):
+        value, ttl = replies[2 * i], replies[2 * i + 1]
+        # -2: the key expired between GET and TTL
+        if value is None or ttl == -2:
+            continue
+        entity_id, feature_name = key[len("feature:"):].rsplit(':', 1)
+        entities.setdefault(entity_id, {})[feature_name] = json.loads(value)
+        if ttl == -1:
+            persistent.add(entity_id)
+        else:
+            entity_ttls[entity_id] = max(entity_ttls.get(entity_id, 0), ttl)
+
+    stats['keys'] += sum(len(features) for features in entities.values())
+    stats['entities'] += len(entities)
+    if dry_run or not entities:
+        return
+
+    hashes = [
+        (entity_id, hash_key, feature_names)
+        for entity_id, features in entities.items()
+        for hash_key, feature_names in layout.split_by_key(entity_id, list(features)).items()
+    ]
+    # An entity's keys may span SCAN batches, so its hash can exist already
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for _, hash_key, _ in hashes:
+            pipe.exists(hash_key)
+        existing = await pipe.execute()
+
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for (entity_id, hash_key, feature_names), exists in zip(hashes, existing):
+            features = entities[entity_id]
+            pipe.hset(hash_key, mapping={name: json.dumps(features[name]) for name in feature_names})
+            if entity_id in persistent:
+                pipe.persist(hash_key)
+            else:
+                # GT only ever extends: a persistent hash stays persistent
+                pipe.expire(hash_key, entity_ttls[entity_id], gt=bool(exists))
+        if delete_source:
+            pipe.delete(*keys)
+        await pipe.execute()
+
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--redis-url', default='redis://localhost:6379')
+    parser.add_argument('--feature-groups', default='{}', help="JSON mapping of group name to feature names")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--delete-source', action='store_true', help="Delete old keys once copied")
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args(argv)
+
+    redis_client = redis.from_url(args.redis_url, decode_responses=True)
+    try:
+        stats = await migrate_string_to_hash(
+            redis_client,
+            HashFeatureLayout(json.loads(args.feature_groups)),
+            batch_size=args.batch_size,
+            delete_source=args.delete_source,
+            dry_run=args.dry_run
+        )
+        print(json.dumps(stats))
+    finally:
+        await redis_client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
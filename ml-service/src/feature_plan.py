@@ -0,0 +1,194 @@
+"""Compiled feature-vector plans for model inputs"""
+from typing import Dict, Any, Callable, Optional, List, Tuple
+import numpy as np
+
+
+def _present(value: Any) -> Any:
+    """The value, or None when it is missing; NaN counts as missing"""
+    if isinstance(value, (float, np.floating)) and np.isnan(value):
+        return None
+    return value
+
+
+class FeaturePlan:
+    """Maps feature dicts to a float32 model input, compiled once per model
+
+    The plan fixes the column order from ``feature_names``, keeps a
+    preallocated default vector, and turns categorical encoders into plain
+    lookup tables. A feature that is absent (or None or NaN) takes its default
+    from ``feature_defaults``; without a default it is a missing required
+    feature.
+
+    Models without ``feature_names`` fall back to the sorted keys of each
+    request, as before.
+    """
+
+    dtype = np.float32
+
+    def __init__(self, metadata: Dict[str, Any]):
+        self.feature_names: List[str] = list(metadata.get('feature_names') or [])
+        self.index = {name: i for i, name in enumerate(self.feature_names)}
+        n_features = len(self.feature_names)
+
+        feature_defaults = metadata.get('feature_defaults', {})
+        categorical = set(metadata.get('categorical_features', []))
+        encoders = metadata.get('encoders', {})
+
+        # Categorical encoders become {category: code} tables; encoders that
+        # can't be tabulated are kept and called per value
+        self.lookups: Dict[int, Dict[Any, float]] = {}
+        self.transformers: Dict[int, Any] = {}
+        for name in categorical:
+            j = self.index.get(name)
+            encoder = encoders.get(name)
+            if j is None or not encoder:
+                continue
+            if isinstance(encoder, dict):
+                self.lookups[j] = {category: float(code) for category, code in encoder.items()}
+            elif hasattr(encoder, 'classes_'):
+                self.lookups[j] = {category: float(code) for code, category in enumerate(encoder.classes_)}
+            else:
+                self.transformers[j] = encoder
+
+        self.defaults = np.zeros(n_features, dtype=self.dtype)
+        self.required = np.ones(n_features, dtype=bool)
+        for name, default in feature_defaults.items():
+            j = self.index.get(name)
+            if j is None or default is None:
+                continue
+            self.defaults[j] = self._encode(j, default)
+            self.required[j] = False
+        self.default_values = [
+            None if required else default
+            for default, required in zip(self.defaults.tolist(), self.required)
+        ]
+        self.encoded_columns = sorted(set(self.lookups) | set(self.transformers))
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names)
+
+    def _encode(self, j: int, value: Any) -> Any:
+        table = self.lookups.get(j)
+        if table is not None:
+            if value not in table:
+                raise ValueError(f"Unknown category for feature {self.feature_names[j]}: {value}")
+            return table[value]
+        transformer = self.transformers.get(j)
+        if transformer is not None:
+            return transformer.transform([value])[0]
+        return value
+
+    def build_row(self, features: Dict[str, Any]) -> np.ndarray:
+        """Build a 1-row input matrix; raises ValueError on missing features"""
+        if not self.feature_names:
+            names = sorted(features.keys())
+            return np.array([[features[name] for name in names]], dtype=self.dtype)
+
+        get = features.get
+        values = [_present(get(name)) for name in self.feature_names]
+        for j in self.encoded_columns:
+            if values[j] is not None:
+                values[j] = self._encode(j, values[j])
+        values = [
+            default if value is None else value
+            for value, default in zip(values, self.default_values)
+        ]
+
+        # Required features have None as their default
+        if None in values:
+            raise ValueError(f"Missing required feature: {self.feature_names[values.index(None)]}")
+
+        return np.array([values], dtype=self.dtype)
+
+    def build_matrix(self, rows: List[Dict[str, Any]]) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """Build an input matrix for many feature dicts, filling it column by column
+
+        Returns the matrix and one error message per row (None for valid
+        rows). Rows with errors are left in the matrix and must be dropped
+        by the caller.
+        """
+        n_rows = len(rows)
+        errors: List[Optional[str]] = [None] * n_rows
+
+        if not self.feature_names:
+            built: Dict[int, np.ndarray] = {}
+            for i, features in enumerate(rows):
+                try:
+                    built[i] = self.build_row(features)[0]
+                except (KeyError, ValueError, TypeError) as e:
+                    errors[i] = str(e)
+
+            width = max((len(row) for row in built.values()), default=0)
+            matrix = np.zeros((n_rows, width), dtype=self.dtype)
+            for i, row in built.items():
+                if len(row) != width:
+                    errors[i] = "Inconsistent feature names in batch"
+                    continue
+                matrix[i] = row
+            return matrix, errors
+
+        return self._fill_matrix(n_rows, lambda name: [features.get(name) for features in rows])
+
+    def build_matrix_from_columns(self, columns: Dict[str, List[Any]], n_rows: int) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """Like ``build_matrix`` for column-oriented input such as an Arrow table
+
+        Columns that are absent count as missing for every row.
+        """
+        if not self.feature_names:
+            names = sorted(columns)
+            return self.build_matrix([
+                {name: columns[name][i] for name in names} for i in range(n_rows)
+            ])
+        missing = [None] * n_rows
+        return self._fill_matrix(n_rows, lambda name: columns.get(name, missing))
+
+    def _fill_matrix(self, n_rows: int, column_values: Callable[[str], List[Any]]) -> Tuple[np.ndarray, List[Optional[str]]]:
+        errors: List[Optional[str]] = [None] * n_rows
+        matrix = np.empty((n_rows, self.n_features), dtype=self.dtype)
+        for j, name in enumerate(self.feature_names):
+            raw = values = column_values(name)
+            table = self.lookups.get(j)
+            if table is not None:
+                values = [None if _present(v) is None else table.get(v, np.inf) for v in values]
+            elif j in self.transformers:
+                values = [None if _present(v) is None else self._safe_transform(j, v) for v in values]
+
+            # numpy turns None into NaN, which marks the value as missing
+            try:
+                column = np.array(values, dtype=np.float64)
+            except (TypeError, ValueError):
+                column = np.array([self._to_float(v) for v in values], dtype=np.float64)
+                for i in np.flatnonzero(column == -np.inf):
+                    errors[i] = errors[i] or f"Invalid value for feature {name}: {values[i]!r}"
+
+            missing = np.isnan(column)
+            if missing.any():
+                if self.required[j]:
+                    for i in np.flatnonzero(missing):
+                        errors[i] = errors[i] or f"Missing required feature: {name}"
+                column[missing] = self.defaults[j]
+
+            unknown = np.isposinf(column) if table is not None or j in self.transformers else None
+            if unknown is not None and unknown.any():
+                for i in np.flatnonzero(unknown):
+                    errors[i] = errors[i] or f"Unknown category for feature {name}: {raw[i]!r}"
+
+            matrix[:, j] = column
+
+        return matrix, errors
+
+    def _safe_transform(self, j: int, value: Any) -> float:
+        try:
+            return self.transformers[j].transform([value])[0]
+        except Exception:
+            return np.inf
+
+    @staticmethod
+    def _to_float(value: Any) -> float:
+        if value is None:
+            return np.nan
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return -np.inf
@@ -1,23 +1,94 @@
 """Feature store for ML features"""
-import json
-from typing import Dict, Any, Optional, List
+import asyncio
+import time
+from typing import Dict, Any, Optional, List, Sequence, Tuple
 import redis.asyncio as redis
 from sqlalchemy.ext.asyncio import AsyncEngine
+from prometheus_client import Histogram
 import logging
 
+from .feature_cache import FeatureCache, INVALIDATION_CHANNEL
+from .feature_history import FeatureHistory
+from .feature_layouts import make_layout
+from .feature_materialization import FeatureMaterializer
+
 logger = logging.getLogger(__name__)
 
+feature_keys_per_call = Histogram(
+    'feature_store_keys_per_call',
+    'Feature keys read or written per feature store round trip',
+    ['operation'],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000)
+)
+feature_call_latency = Histogram(
+    'feature_store_call_duration_seconds',
+    'Feature store round trip latency',
+    ['operation']
+)
+
 
 class FeatureStore:
     """Feature store for managing and serving features"""
 
-    def __init__(self, redis_client: redis.Redis, db_engine: AsyncEngine):
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        db_engine: AsyncEngine,
+        layout: str = 'string',
+        feature_groups: Optional[Dict[str, List[str]]] = None,
+        cache_ttls: Optional[Dict[str, float]] = None,
+        cache_max_bytes: int = 64 * 1024 * 1024,
+        feature_definitions: Optional[List[Dict[str, Any]]] = None,
+        materialize_chunk_size: int = 5000,
+        materialize_ttl: int = 2 * 24 * 3600,
+        materialize_interval: float = 0.0,
+        history_path: Optional[str] = None,
+        minio_client: Any = None,
+        history_flush_rows: int = 100000,
+        history_flush_interval: float = 60.0
+    ):
         self.redis = redis_client
         self.db_engine = db_engine
+        self.layout = make_layout(layout, feature_groups)
+
+        # L1 cache only for the feature groups that opt in with a TTL
+        self.cache: Optional[FeatureCache] = None
+        if cache_ttls:
+            self.cache = FeatureCache(cache_ttls, feature_groups or {}, cache_max_bytes)
+
+        self.materializer = FeatureMaterializer(
+            self, db_engine, redis_client,
+            definitions=feature_definitions,
+            chunk_size=materialize_chunk_size,
+            ttl=materialize_ttl
+        )
+        self.materialize_interval = materialize_interval
+
+        # Offline history of every stored value, for point-in-time training sets
+        self.history: Optional[FeatureHistory] = None
+        if history_path:
+            self.history = FeatureHistory(
+                history_path, minio_client,
+                flush_rows=history_flush_rows,
+                flush_interval=history_flush_interval
+            )
 
     async def initialize(self) -> None:
         """Initialize feature store"""
-        logger.info("Feature store initialized")
+        if self.cache:
+            await self.cache.start_listener(self.redis)
+        if self.history:
+            await self.history.start()
+        self.materializer.start(self.materialize_interval)
+        logger.info(f"Feature store initialized with {self.layout.name} layout")
+
+    async def close(self) -> None:
+        """Stop background tasks"""
+        await self.materializer.close()
+        if self.history:
+            await self.history.close()
+        if self.cache:
+            await self.cache.stop_listener()
 
     async def get_features(
         self,
@@ -25,19 +96,44 @@ class FeatureStore:
         entity_id: str
     ) -> Dict[str, Any]:
         """Get features for an entity"""
-        features = {}
-
         if not feature_names:
-            return features
+            return {}
 
-        # Get features from Redis cache
-        for feature_name in feature_names:
-            key = f"feature:{entity_id}:{feature_name}"
-            value = await self.redis.get(key)
-            if value:
-                features[feature_name] = json.loads(value)
+        return (await self.get_features_bulk([(entity_id, feature_names)]))[0]
 
-        return features
+    async def get_features_bulk(
+        self,
+        lookups: Sequence[Tuple[Optional[str], Optional[List[str]]]]
+    ) -> List[Dict[str, Any]]:
+        """Get features for many (entity_id, feature_names) lookups in one round trip
+
+        Returns one feature dict per lookup, in order. Features that are not
+        stored are left out of the entity's dict.
+        """
+        cached: List[Dict[str, Any]] = [{} for _ in lookups]
+        if self.cache:
+            generation = self.cache.generation
+            remaining = []
+            for i, (entity_id, feature_names) in enumerate(lookups):
+                cached[i], misses = self.cache.get(entity_id, feature_names or [])
+                remaining.append((entity_id, misses))
+            lookups = remaining
+
+        n_keys = sum(len(feature_names or []) for _, feature_names in lookups)
+        if not n_keys:
+            return cached
+
+        start_time = time.perf_counter()
+        results = await self.layout.read(self.redis, lookups)
+        feature_call_latency.labels(operation='get').observe(time.perf_counter() - start_time)
+        feature_keys_per_call.labels(operation='get').observe(n_keys)
+
+        if self.cache:
+            for (entity_id, _), fetched, hits in zip(lookups, results, cached):
+                self.cache.put(entity_id, fetched, generation)
+                fetched.update(hits)
+
+        return results
 
     async def store_features(
         self,
@@ -46,38 +142,93 @@ class FeatureStore:
         ttl: int = 3600
     ) -> None:
         """Store features for an entity"""
-        for feature_name, value in features.items():
-            key = f"feature:{entity_id}:{feature_name}"
-            await self.redis.set(key, json.dumps(value), ex=ttl)
+        await self.store_features_bulk({entity_id: features}, ttl)
+
+    async def store_features_bulk(
+        self,
+        entity_features: Dict[str, Dict[str, Any]],
+        ttl: int = 3600
+    ) -> None:
+        """Store features for many entities in one pipelined round trip"""
+        n_keys = sum(len(features) for features in entity_features.values())
+        if not n_keys:
+            return
+
+        changed = {entity_id: list(features) for entity_id, features in entity_features.items()}
+
+        start_time = time.perf_counter()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for entity_id, features in entity_features.items():
+                self.layout.write(pipe, entity_id, features, ttl)
+            message = self._invalidation_message(changed)
+            if message:
+                pipe.publish(INVALIDATION_CHANNEL, message)
+            await pipe.execute()
+        self._invalidate_local(changed)
+        if self.history:
+            self.history.record(entity_features)
+        feature_call_latency.labels(operation='store').observe(time.perf_counter() - start_time)
+        feature_keys_per_call.labels(operation='store').observe(n_keys)
 
     async def compute_features(
         self,
-        entity_id: str,
-        feature_names: List[str]
+        entity_id: Optional[str] = None,
+        feature_names: Optional[List[str]] = None,
+        incremental: bool = True
     ) -> Dict[str, Any]:
-        """Compute features for an entity"""
-        # Placeholder for feature computation logic
-        computed_features = {}
+        """Compute and store features for one entity, or for every entity that needs it"""
+        return await self.materializer.run(
+            feature_names, [entity_id] if entity_id else None, incremental
+        )
 
-        for feature_name in feature_names:
-            # Add computation logic here
-            computed_features[feature_name] = 0.0
-
-        # Store computed features
-        await self.store_features(entity_id, computed_features)
-
-        return computed_features
+    async def get_historical_features(
+        self,
+        entity_df: Any,
+        feature_names: List[str],
+        entity_column: str = 'entity_id',
+        timestamp_column: str = 'event_timestamp',
+        max_age: Optional[float] = None
+    ) -> Any:
+        """Point-in-time features for a DataFrame of entities and label timestamps
+
+        Each row gets the values its entity had at its timestamp, read from
+        the offline history rather than the latest values in Redis.
+        """
+        if not self.history:
+            raise ValueError("Feature history is not configured")
+        await self.history.flush()
+        return await asyncio.to_thread(
+            self.history.get_historical_features,
+            entity_df, feature_names, entity_column, timestamp_column, max_age
+        )
 
     async def delete_features(self, entity_id: str, feature_names: Optional[List[str]] = None) -> None:
         """Delete features for an entity"""
-        if feature_names:
-            keys = [f"feature:{entity_id}:{name}" for name in feature_names]
-        else:
-            # Delete all features for entity
-            pattern = f"feature:{entity_id}:*"
-            keys = []
-            async for key in self.redis.scan_iter(match=pattern):
-                keys.append(key)
-
-        if keys:
-            await self.redis.delete(*keys)
+        await self.layout.delete(self.redis, entity_id, feature_names)
+        message = self._invalidation_message({entity_id: feature_names})
+        if message:
+            await self.redis.publish(INVALIDATION_CHANNEL, message)
+        self._invalidate_local({entity_id: feature_names})
+
+    def _invalidate_local(self, entities: Dict[str, Optional[List[str]]]) -> None:
+        """Drop changed features from this worker's cache"""
+        if self.cache:
+            for entity_id, feature_names in entities.items():
+                self.cache.invalidate(entity_id, feature_names)
+
+    def _invalidation_message(self, entities: Dict[str, Optional[List[str]]]) -> Optional[str]:
+        """Build the pub/sub message announcing changed features to other workers
+
+        Returns None when the cache is disabled or none of the features can
+        be cached anywhere.
+        """
+        if not self.cache:
+            return None
+
+        entities = {
+            entity_id: feature_names for entity_id, feature_names in entities.items()
+            if feature_names is None or any(self.cache.is_cacheable(n) for n in feature_names)
+        }
+        if not entities:
+            return None
+        return self.cache.invalidation_message(entities)
@@ -0,0 +1,119 @@
+"""Executors that keep blocking model inference off the asyncio event loop"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import numpy as np
+from prometheus_client import Histogram
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_MODES = ('inline', 'thread', 'process')
+
+inference_queue_wait = Histogram(
+    'ml_inference_queue_wait_seconds',
+    'Time an inference call waited for a concurrency slot and a worker',
+    ['model_name', 'mode'],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+# Models loaded inside a process-pool worker, keyed by (model_id, model_path)
+_worker_models: Dict[Tuple[str, str], Any] = {}
+
+
+def process_infer(model_id: str, model_path: str, metadata: Dict, feature_matrix: np.ndarray) -> List[Dict[str, Any]]:
+    """Run inference inside a process-pool worker, loading the model on first use"""
+    from .backends import load_model_artifact, infer_batch
+
+    key = (model_id, model_path)
+    model = _worker_models.get(key)
+    if model is None:
+        # Drop stale copies of the same model loaded from an older artifact
+        for stale in [k for k in _worker_models if k[0] == model_id]:
+            del _worker_models[stale]
+        model = load_model_artifact(
+            model_path, metadata.get('framework', 'sklearn'), mmap=metadata.get('mmap', False)
+        )
+        _worker_models[key] = model
+
+    return infer_batch(model, metadata, feature_matrix)
+
+
+def _timed_call(fn: Callable, *args: Any) -> Tuple[float, Any]:
+    """Call ``fn`` and report the wall-clock time at which it started"""
+    return time.time(), fn(*args)
+
+
+class InferenceExecutor:
+    """Runs model inference in a thread or process pool with per-model limits
+
+    Each model picks its mode through ``execution_mode`` in its metadata:
+    ``thread`` for frameworks that release the GIL (numpy-backed sklearn,
+    TensorFlow, PyTorch), ``process`` for pure-Python models, or ``inline``
+    to run on the event loop. ``max_concurrency`` in the metadata caps how
+    many calls for that model may run at once.
+    """
+
+    def __init__(
+        self,
+        thread_workers: int = 4,
+        process_workers: int = 2,
+        default_mode: str = 'thread',
+        default_max_concurrency: int = 4
+    ):
+        if default_mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {default_mode}")
+
+        self.default_mode = default_mode
+        self.default_max_concurrency = default_max_concurrency
+        self.process_workers = process_workers
+        self.thread_pool = ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix='inference')
+        self.process_pool: Optional[ProcessPoolExecutor] = None
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+
+    def configure_model(self, model_id: str, metadata: Dict[str, Any]) -> None:
+        """Set up the concurrency cap for a newly loaded model"""
+        mode = metadata.get('execution_mode', self.default_mode)
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode for model {model_id}: {mode}")
+
+        max_concurrency = int(metadata.get('max_concurrency', self.default_max_concurrency))
+        self._limits[model_id] = asyncio.Semaphore(max(1, max_concurrency))
+
+    def remove_model(self, model_id: str) -> None:
+        self._limits.pop(model_id, None)
+
+    async def run(self, model_id: str, mode: str, fn: Callable, *args: Any) -> Any:
+        """Run ``fn(*args)`` for a model in the pool selected by ``mode``"""
+        limit = self._limits.get(model_id)
+        if limit is None:
+            limit = self._limits[model_id] = asyncio.Semaphore(max(1, self.default_max_concurrency))
+
+        enqueued_at = time.time()
+        async with limit:
+            if mode == 'inline':
+                started_at, result = _timed_call(fn, *args)
+            else:
+                pool = self._get_process_pool() if mode == 'process' else self.thread_pool
+                loop = asyncio.get_running_loop()
+                started_at, result = await loop.run_in_executor(pool, _timed_call, fn, *args)
+
+        inference_queue_wait.labels(model_name=model_id, mode=mode).observe(max(0.0, started_at - enqueued_at))
+        return result
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self.process_pool is None:
+            # Spawn rather than fork: the parent runs an event loop and thread pools
+            self.process_pool = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self.process_pool
+
+    def shutdown(self) -> None:
+        self.thread_pool.shutdown(wait=False, cancel_futures=True)
+        if self.process_pool:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+            self.process_pool = None
@@ -1,16 +1,19 @@
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import asyncpg
 import redis.asyncio as redis
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from sqlalchemy import select
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from fastapi.responses import Response
 from opentelemetry import trace
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 import logging
 import os
 import json
+import asyncio
+import time
 from typing import Optional, List, Dict, Any
 import numpy as np
 from datetime import datetime
@@ -19,11 +22,25 @@ from .models import MLModel, Prediction
 from .services import ModelService, PredictionService, TrainingService
 from .schemas import (
     ModelCreateRequest, ModelResponse, PredictionRequest, 
-    PredictionResponse, TrainingRequest, ModelMetrics
+    PredictionResponse, TrainingRequest, ModelMetrics, ScoringJobRequest
 )
 from .ml_engine import MLEngine
+from .inference_executor import InferenceExecutor
 from .feature_store import FeatureStore
 from .model_registry import ModelRegistry
+from .prediction_logger import PredictionLogger
+from .prediction_cache import PredictionCache
+from .worker_memory import update_worker_memory
+from .bulk_scoring import BulkScoringService
+from .training import TrainingExecutor
+from .online_learning import OnlineLearningService
+from .wire_formats import (
+    read_arrow_requests, read_body, render, render_arrow, request_body, response_type, wants_encoded
+)
+from .streaming import (
+    ARROW_STREAM, ArrowEncoder, NdjsonEncoder, RequestStreamingResponse,
+    build_requests, iter_arrow_rows, iter_chunks, iter_ndjson_rows
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -37,10 +54,140 @@ MINIO_URL = os.getenv('MINIO_URL', 'localhost:9000')
 MINIO_ACCESS_KEY = os.getenv('MINIO_ACCESS_KEY', 'minio_admin')
 MINIO_SECRET_KEY = os.getenv('MINIO_SECRET_KEY', 'minio_pass')
 
+# Micro-batching of concurrent /predict calls (max size <= 1 disables it)
+ML_BATCH_MAX_SIZE = int(os.getenv('ML_BATCH_MAX_SIZE', '32'))
+ML_BATCH_MAX_WAIT_MS = float(os.getenv('ML_BATCH_MAX_WAIT_MS', '2'))
+
+# Inference executor: thread pool for GIL-releasing frameworks, process pool
+# for pure-Python models. Models override the mode and concurrency cap with
+# 'execution_mode' and 'max_concurrency' in their metadata.
+ML_INFERENCE_THREADS = int(os.getenv('ML_INFERENCE_THREADS', '4'))
+ML_INFERENCE_PROCESSES = int(os.getenv('ML_INFERENCE_PROCESSES', '2'))
+ML_DEFAULT_EXECUTION_MODE = os.getenv('ML_DEFAULT_EXECUTION_MODE', 'thread')
+ML_MODEL_MAX_CONCURRENCY = int(os.getenv('ML_MODEL_MAX_CONCURRENCY', '4'))
+
+# Local on-disk cache of model artifacts downloaded from MinIO
+ML_ARTIFACT_CACHE_DIR = os.getenv('ML_ARTIFACT_CACHE_DIR', '/tmp/ml-artifacts')
+ML_ARTIFACT_CACHE_MAX_BYTES = int(os.getenv('ML_ARTIFACT_CACHE_MAX_BYTES', str(10 * 1024 ** 3)))
+
+# Memory budget for resident models; least-recently-used idle models are
+# evicted past it and reloaded on their next request
+ML_MODEL_CACHE_MAX_BYTES = int(os.getenv('ML_MODEL_CACHE_MAX_BYTES', str(4 * 1024 ** 3)))
+
+# Parallel model loads during startup warm-up
+ML_WARMUP_CONCURRENCY = int(os.getenv('ML_WARMUP_CONCURRENCY', '4'))
+
+# Feature store Redis layout ('string' or 'hash') and feature groups as
+# JSON, e.g. {"spend": ["spend_7d", "spend_30d"]}
+FEATURE_STORE_LAYOUT = os.getenv('FEATURE_STORE_LAYOUT', 'string')
+FEATURE_GROUPS = json.loads(os.getenv('FEATURE_GROUPS', '{}'))
+
+# In-process feature cache: TTL in seconds per feature group as JSON, e.g.
+# {"venue_profile": 60}. Groups not listed always read from Redis.
+FEATURE_CACHE_TTLS = json.loads(os.getenv('FEATURE_CACHE_TTLS', '{}'))
+FEATURE_CACHE_MAX_BYTES = int(os.getenv('FEATURE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Materialized aggregate features as a JSON list of definitions, e.g.
+# [{"name": "spend_7d", "aggregation": "sum", "column": "amount", "window": "7d"}]
+# over the "Transaction" table by "userId" unless set otherwise; unset uses
+# the built-in spend/visit definitions. FEATURE_MATERIALIZE_INTERVAL > 0
+# runs an incremental materialization every that many seconds.
+FEATURE_DEFINITIONS = json.loads(os.getenv('FEATURE_DEFINITIONS', 'null'))
+FEATURE_MATERIALIZE_CHUNK_SIZE = int(os.getenv('FEATURE_MATERIALIZE_CHUNK_SIZE', '5000'))
+FEATURE_MATERIALIZE_TTL = int(os.getenv('FEATURE_MATERIALIZE_TTL', str(2 * 24 * 3600)))
+FEATURE_MATERIALIZE_INTERVAL = float(os.getenv('FEATURE_MATERIALIZE_INTERVAL', '0'))
+
+# Offline feature history: every stored feature value is appended to
+# hourly-partitioned Parquet under FEATURE_HISTORY_PATH (bucket/prefix in
+# MinIO, or a local directory starting with /) for point-in-time training
+# sets. Empty disables it.
+FEATURE_HISTORY_PATH = os.getenv('FEATURE_HISTORY_PATH', 'ml-features/history')
+FEATURE_HISTORY_FLUSH_ROWS = int(os.getenv('FEATURE_HISTORY_FLUSH_ROWS', '100000'))
+FEATURE_HISTORY_FLUSH_INTERVAL = float(os.getenv('FEATURE_HISTORY_FLUSH_INTERVAL', '60'))
+
+# Per-model latency/confidence histograms are kept in memory and added
+# into minute/hour/day rollups in Redis every ML_METRICS_FLUSH_INTERVAL seconds
+ML_METRICS_FLUSH_INTERVAL = float(os.getenv('ML_METRICS_FLUSH_INTERVAL', '5'))
+
+# Prediction result cache for repeated feature vectors. TTL in seconds; 0
+# disables it unless a model sets 'prediction_cache_ttl' in its metadata.
+# ML_PREDICTION_CACHE_REDIS shares cached results between replicas.
+ML_PREDICTION_CACHE_TTL = float(os.getenv('ML_PREDICTION_CACHE_TTL', '0'))
+ML_PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv('ML_PREDICTION_CACHE_MAX_ENTRIES', '100000'))
+ML_PREDICTION_CACHE_REDIS = os.getenv('ML_PREDICTION_CACHE_REDIS', 'false').lower() == 'true'
+
+# Convert sklearn/PyTorch models to ONNX at load time and serve them with
+# ONNX Runtime when the outputs match; models opt out with 'onnx_export': false
+ML_ONNX_AUTO_EXPORT = os.getenv('ML_ONNX_AUTO_EXPORT', 'true').lower() == 'true'
+
+# Memory-map model weights so uvicorn workers share one copy through the
+# page cache (joblib/pickle re-dumped for mmap_mode='r', torch mmap=True).
+# Per model: 'mmap' in metadata. Mapped models are not exported to ONNX.
+ML_MODEL_MMAP = os.getenv('ML_MODEL_MMAP', 'false').lower() == 'true'
+
+# Write-behind prediction log: rows are flushed in bulk by count or interval.
+# When the buffer is full, 'block' applies backpressure to requests and
+# 'sample' keeps a random sample. Models with 'audit_logging' in their
+# metadata are committed on the request path instead.
+ML_PREDICTION_LOG_FLUSH_ROWS = int(os.getenv('ML_PREDICTION_LOG_FLUSH_ROWS', '500'))
+ML_PREDICTION_LOG_FLUSH_INTERVAL_MS = float(os.getenv('ML_PREDICTION_LOG_FLUSH_INTERVAL_MS', '1000'))
+ML_PREDICTION_LOG_MAX_BUFFER = int(os.getenv('ML_PREDICTION_LOG_MAX_BUFFER', '10000'))
+ML_PREDICTION_LOG_OVERFLOW = os.getenv('ML_PREDICTION_LOG_OVERFLOW', 'block')
+
+# Rows scored per chunk by /batch-predict/stream; one chunk is in flight
+# at a time, which bounds the endpoint's memory
+ML_STREAM_CHUNK_ROWS = int(os.getenv('ML_STREAM_CHUNK_ROWS', '1000'))
+
+# JSON prediction responses normally go through FastAPI's response model,
+# which dumps, re-validates and re-serializes them. When false they are
+# written straight from the service's objects with orjson. MessagePack and
+# Arrow responses are always written directly.
+ML_VALIDATE_RESPONSES = os.getenv('ML_VALIDATE_RESPONSES', 'true').lower() == 'true'
+
+# Bulk scoring jobs: each running job gets its own pool of
+# ML_SCORING_WORKERS processes that load the model once; jobs beyond
+# ML_SCORING_MAX_JOBS wait. Inputs are staged and outputs written under
+# ML_SCORING_WORK_DIR before upload.
+ML_SCORING_WORKERS = int(os.getenv('ML_SCORING_WORKERS', '2'))
+ML_SCORING_CHUNK_ROWS = int(os.getenv('ML_SCORING_CHUNK_ROWS', '50000'))
+ML_SCORING_MAX_JOBS = int(os.getenv('ML_SCORING_MAX_JOBS', '1'))
+ML_SCORING_WORK_DIR = os.getenv('ML_SCORING_WORK_DIR', '/tmp/ml-scoring')
+
+# Training jobs are queued in the database and run in worker processes.
+# At most ML_TRAINING_MAX_JOBS run per node, each at ML_TRAINING_NICE
+# priority with ML_TRAINING_THREADS native threads, so inference keeps
+# its CPU. Jobs whose node stops heartbeating for ML_TRAINING_STALE_AFTER
+# seconds are queued again. Hyperparameter searches run their trials in
+# up to ML_TRAINING_SEARCH_WORKERS single-threaded processes (by default
+# as many as ML_TRAINING_THREADS, the same CPU budget), each holding its
+# own copy of the search's max_rows sample.
+ML_TRAINING_MAX_JOBS = int(os.getenv('ML_TRAINING_MAX_JOBS', '1'))
+ML_TRAINING_THREADS = int(os.getenv('ML_TRAINING_THREADS', '2'))
+ML_TRAINING_NICE = int(os.getenv('ML_TRAINING_NICE', '10'))
+ML_TRAINING_CHUNK_ROWS = int(os.getenv('ML_TRAINING_CHUNK_ROWS', '50000'))
+ML_TRAINING_WORK_DIR = os.getenv('ML_TRAINING_WORK_DIR', '/tmp/ml-training')
+ML_TRAINING_POLL_INTERVAL = float(os.getenv('ML_TRAINING_POLL_INTERVAL', '2'))
+ML_TRAINING_STALE_AFTER = float(os.getenv('ML_TRAINING_STALE_AFTER', '300'))
+ML_TRAINING_SEARCH_WORKERS = int(os.getenv('ML_TRAINING_SEARCH_WORKERS', str(ML_TRAINING_THREADS)))
+
+# Online learning updates partial_fit models from labeled feedback events
+# read from Kafka (ML_FEEDBACK_SOURCE=kafka) or an NDJSON file (file), in
+# micro-batches of up to ML_ONLINE_BATCH_SIZE events. The updated copy is
+# checkpointed and swapped in for serving every
+# ML_ONLINE_CHECKPOINT_INTERVAL seconds or ML_ONLINE_CHECKPOINT_ROWS events.
+ML_FEEDBACK_SOURCE = os.getenv('ML_FEEDBACK_SOURCE', 'kafka')
+ML_FEEDBACK_TOPIC = os.getenv('ML_FEEDBACK_TOPIC', 'ml-feedback')
+ML_FEEDBACK_FILE = os.getenv('ML_FEEDBACK_FILE', '/tmp/ml-feedback.ndjson')
+ML_ONLINE_BATCH_SIZE = int(os.getenv('ML_ONLINE_BATCH_SIZE', '500'))
+ML_ONLINE_BATCH_WAIT_MS = float(os.getenv('ML_ONLINE_BATCH_WAIT_MS', '1000'))
+ML_ONLINE_CHECKPOINT_INTERVAL = float(os.getenv('ML_ONLINE_CHECKPOINT_INTERVAL', '60'))
+ML_ONLINE_CHECKPOINT_ROWS = int(os.getenv('ML_ONLINE_CHECKPOINT_ROWS', '10000'))
+ML_ONLINE_WORK_DIR = os.getenv('ML_ONLINE_WORK_DIR', '/tmp/ml-online')
+
 # Real metrics
 request_count = Counter('ml_requests_total', 'Total ML requests', ['method', 'endpoint', 'status'])
 prediction_latency = Histogram('ml_prediction_duration_seconds', 'ML prediction latency', ['model_name'])
-training_duration = Histogram('ml_training_duration_seconds', 'ML training duration', ['model_type'])
+time_to_ready = Gauge('ml_time_to_ready_seconds', 'Time from startup until all active models were warmed up')
 
 # Real database engine
 engine = create_async_engine(
@@ -62,11 +209,47 @@ redis_client: Optional[redis.Redis] = None
 ml_engine: Optional[MLEngine] = None
 feature_store: Optional[FeatureStore] = None
 model_registry: Optional[ModelRegistry] = None
+prediction_logger: Optional[PredictionLogger] = None
+bulk_scoring: Optional[BulkScoringService] = None
+training_executor: Optional[TrainingExecutor] = None
+online_learning: Optional[OnlineLearningService] = None
+warmup_task: Optional[asyncio.Task] = None
+service_ready = False
+
+async def warm_up_models(started_at: float):
+    """Load every active model with bounded parallelism, then mark the service ready"""
+    global service_ready
+    
+    active_models: List[MLModel] = []
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(MLModel).where(MLModel.is_active == True))
+            active_models = list(result.scalars().all())
+    except Exception as e:
+        # Models can still be loaded through /activate
+        logger.error(f"Failed to list active models for warm-up: {e}")
+    
+    limit = asyncio.Semaphore(ML_WARMUP_CONCURRENCY)
+    
+    async def warm_up(model: MLModel):
+        async with limit:
+            try:
+                await ml_engine.warm_up(model.id, model.artifacts_path)
+            except Exception as e:
+                logger.error(f"Failed to warm up model {model.id}: {e}")
+    
+    await asyncio.gather(*[warm_up(model) for model in active_models])
+    
+    service_ready = True
+    elapsed = time.perf_counter() - started_at
+    time_to_ready.set(elapsed)
+    logger.info(f"Warmed up {len(active_models)} active models in {elapsed:.1f}s")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup - connect to real services
-    global redis_client, ml_engine, feature_store, model_registry
+    global redis_client, ml_engine, feature_store, model_registry, prediction_logger, bulk_scoring, training_executor, online_learning, warmup_task
+    started_at = time.perf_counter()
     
     # Connect to Redis
     redis_client = redis.from_url(REDIS_URL, decode_responses=True)
@@ -74,11 +257,47 @@ async def lifespan(app: FastAPI):
     logger.info("Connected to Redis")
     
     # Initialize ML components
-    ml_engine = MLEngine(redis_client, MINIO_URL, MINIO_ACCESS_KEY, MINIO_SECRET_KEY)
+    ml_engine = MLEngine(
+        redis_client, MINIO_URL, MINIO_ACCESS_KEY, MINIO_SECRET_KEY,
+        batch_max_size=ML_BATCH_MAX_SIZE,
+        batch_max_wait_ms=ML_BATCH_MAX_WAIT_MS,
+        executor=InferenceExecutor(
+            thread_workers=ML_INFERENCE_THREADS,
+            process_workers=ML_INFERENCE_PROCESSES,
+            default_mode=ML_DEFAULT_EXECUTION_MODE,
+            default_max_concurrency=ML_MODEL_MAX_CONCURRENCY
+        ),
+        artifact_cache_dir=ML_ARTIFACT_CACHE_DIR,
+        artifact_cache_max_bytes=ML_ARTIFACT_CACHE_MAX_BYTES,
+        model_cache_max_bytes=ML_MODEL_CACHE_MAX_BYTES,
+        metrics_flush_interval=ML_METRICS_FLUSH_INTERVAL,
+        prediction_cache=PredictionCache(
+            redis_client,
+            max_entries=ML_PREDICTION_CACHE_MAX_ENTRIES,
+            default_ttl=ML_PREDICTION_CACHE_TTL,
+            use_redis=ML_PREDICTION_CACHE_REDIS
+        ),
+        onnx_auto_export=ML_ONNX_AUTO_EXPORT,
+        mmap_models=ML_MODEL_MMAP
+    )
     if ml_engine:
         await ml_engine.initialize()
 
-    feature_store = FeatureStore(redis_client, engine)
+    feature_store = FeatureStore(
+        redis_client, engine,
+        layout=FEATURE_STORE_LAYOUT,
+        feature_groups=FEATURE_GROUPS,
+        cache_ttls=FEATURE_CACHE_TTLS,
+        cache_max_bytes=FEATURE_CACHE_MAX_BYTES,
+        feature_definitions=FEATURE_DEFINITIONS,
+        materialize_chunk_size=FEATURE_MATERIALIZE_CHUNK_SIZE,
+        materialize_ttl=FEATURE_MATERIALIZE_TTL,
+        materialize_interval=FEATURE_MATERIALIZE_INTERVAL,
+        history_path=FEATURE_HISTORY_PATH,
+        minio_client=ml_engine.minio_client,
+        history_flush_rows=FEATURE_HISTORY_FLUSH_ROWS,
+        history_flush_interval=FEATURE_HISTORY_FLUSH_INTERVAL
+    )
     if feature_store:
         await feature_store.initialize()
 
@@ -86,11 +305,70 @@ async def lifespan(app: FastAPI):
     if model_registry:
         await model_registry.initialize()
     
+    prediction_logger = PredictionLogger(
+        engine,
+        flush_rows=ML_PREDICTION_LOG_FLUSH_ROWS,
+        flush_interval_ms=ML_PREDICTION_LOG_FLUSH_INTERVAL_MS,
+        max_buffer_rows=ML_PREDICTION_LOG_MAX_BUFFER,
+        overflow=ML_PREDICTION_LOG_OVERFLOW
+    )
+    prediction_logger.start()
+    
+    bulk_scoring = BulkScoringService(
+        ml_engine, redis_client, ml_engine.minio_client,
+        workers=ML_SCORING_WORKERS,
+        chunk_rows=ML_SCORING_CHUNK_ROWS,
+        work_dir=ML_SCORING_WORK_DIR,
+        max_jobs=ML_SCORING_MAX_JOBS
+    )
+    
+    training_executor = TrainingExecutor(
+        AsyncSessionLocal, ml_engine.minio_client, redis_client, model_registry,
+        max_jobs=ML_TRAINING_MAX_JOBS,
+        threads=ML_TRAINING_THREADS,
+        nice=ML_TRAINING_NICE,
+        chunk_rows=ML_TRAINING_CHUNK_ROWS,
+        work_dir=ML_TRAINING_WORK_DIR,
+        poll_interval=ML_TRAINING_POLL_INTERVAL,
+        stale_after=ML_TRAINING_STALE_AFTER,
+        search_workers=ML_TRAINING_SEARCH_WORKERS,
+        feature_history=feature_store.history
+    )
+    training_executor.start()
+    
+    online_learning = OnlineLearningService(
+        ml_engine, redis_client, ml_engine.minio_client,
+        source=ML_FEEDBACK_SOURCE,
+        kafka_servers=','.join(KAFKA_SERVERS),
+        topic=ML_FEEDBACK_TOPIC,
+        feedback_file=ML_FEEDBACK_FILE,
+        batch_size=ML_ONLINE_BATCH_SIZE,
+        batch_wait_ms=ML_ONLINE_BATCH_WAIT_MS,
+        checkpoint_interval=ML_ONLINE_CHECKPOINT_INTERVAL,
+        checkpoint_rows=ML_ONLINE_CHECKPOINT_ROWS,
+        work_dir=ML_ONLINE_WORK_DIR
+    )
+    await online_learning.resume()
+    
     logger.info("ML Service initialized successfully")
     
+    # Warm up active models in the background; /ready reports when done
+    warmup_task = asyncio.create_task(warm_up_models(started_at))
+    
     yield
     
     # Shutdown - cleanup
+    if not warmup_task.done():
+        warmup_task.cancel()
+    # Flush buffered predictions before the database engine goes away
+    await prediction_logger.close()
+    bulk_scoring.close()
+    # Running training jobs go back to the queue
+    await training_executor.close()
+    # Online models checkpoint what they learned since the last swap
+    await online_learning.close()
+    await feature_store.close()
+    await ml_engine.close()
     await redis_client.close()
     await engine.dispose()
     logger.info("ML Service shutdown complete")
@@ -127,10 +405,10 @@ def get_model_service(db: AsyncSession = Depends(get_db)) -> ModelService:
     return ModelService(db, ml_engine, model_registry)
 
 def get_prediction_service(db: AsyncSession = Depends(get_db)) -> PredictionService:
-    return PredictionService(db, ml_engine, feature_store, redis_client)
+    return PredictionService(db, ml_engine, feature_store, redis_client, prediction_logger)
 
 def get_training_service(db: AsyncSession = Depends(get_db)) -> TrainingService:
-    return TrainingService(db, ml_engine, model_registry, feature_store)
+    return TrainingService(db, ml_engine, model_registry, feature_store, training_executor)
 
 # Real health check with service verification
 @app.get("/health")
@@ -167,9 +445,17 @@ async def health_check():
     
     return health_status
 
+# Readiness gate: green once startup warm-up has finished
+@app.get("/ready")
+async def readiness_check():
+    if not service_ready:
+        raise HTTPException(status_code=503, detail="Warming up models")
+    return {"status": "ready", "loaded_models": len(await ml_engine.get_loaded_models())}
+
 # Metrics endpoint
 @app.get("/metrics")
 async def metrics():
+    update_worker_memory()
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 # Model management endpoints
@@ -227,13 +513,49 @@ async def activate_model(
         background_tasks.add_task(ml_engine.load_model, model.id, model.artifacts_path)
     return {"status": "activated", "model_id": model_id}
 
+@app.post("/models/{model_id}/online-learning")
+async def start_online_learning(
+    model_id: str,
+    service: ModelService = Depends(get_model_service)
+):
+    """Start updating a model from the feedback stream with partial_fit"""
+    model = await service.get_model(model_id)
+    if not model:
+        raise HTTPException(status_code=404, detail="Model not found")
+    try:
+        return await online_learning.start(model.id, model.name, model.artifacts_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/models/{model_id}/online-learning")
+async def get_online_learning(model_id: str):
+    """Get online learning progress and model staleness"""
+    status = online_learning.status(model_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Online learning is not running for this model")
+    return status
+
+@app.delete("/models/{model_id}/online-learning")
+async def stop_online_learning(model_id: str):
+    """Stop online learning, swapping in what was learned since the last checkpoint"""
+    status = await online_learning.stop(model_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Online learning is not running for this model")
+    return status
+
 # Prediction endpoints
-@app.post("/predict", response_model=PredictionResponse)
+@app.post("/predict", response_model=PredictionResponse, openapi_extra=request_body(PredictionRequest))
 async def predict(
-    request: PredictionRequest,
+    http_request: Request,
     service: PredictionService = Depends(get_prediction_service)
 ):
-    """Make a prediction using the specified model"""
+    """Make a prediction using the specified model
+
+    The body may be JSON or MessagePack; the response uses the encoding
+    the Accept header asks for.
+    """
+    request = await read_body(http_request, PredictionRequest)
+    media_type = response_type(http_request)
     start_time = datetime.utcnow()
     
     try:
@@ -260,6 +582,8 @@ async def predict(
         prediction_latency.labels(model_name=request.model_id).observe(latency)
         request_count.labels(method="POST", endpoint="/predict", status="success").inc()
         
+        if wants_encoded(media_type, ML_VALIDATE_RESPONSES):
+            return render(result, media_type)
         return result
         
     except Exception as e:
@@ -267,52 +591,118 @@ async def predict(
         logger.error(f"Prediction failed: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.post("/batch-predict")
+@app.post("/batch-predict", openapi_extra=request_body(List[PredictionRequest], arrow=True))
 async def batch_predict(
-    requests: List[PredictionRequest],
+    http_request: Request,
     service: PredictionService = Depends(get_prediction_service)
 ):
-    """Make batch predictions"""
-    results = []
+    """Make batch predictions
+
+    The body may be a JSON or MessagePack list of requests, or an Arrow IPC
+    stream with model_id, request_id, entity_id, feature_ids and feature
+    columns. Results are returned as JSON, MessagePack or, when asked for,
+    an Arrow IPC stream with one row per request.
+    """
+    if http_request.headers.get('content-type', '').startswith(ARROW_STREAM):
+        requests = read_arrow_requests(await http_request.body())
+    else:
+        requests = await read_body(http_request, List[PredictionRequest])
+    media_type = response_type(http_request, arrow=True)
     
-    for request in requests:
-        try:
-            result = await predict(request, service)
-            results.append(result)
-        except Exception as e:
-            results.append({
-                "request_id": request.request_id,
-                "error": str(e),
-                "status": "failed"
-            })
+    results = await service.predict_batch(requests)
+    
+    for result in results:
+        if isinstance(result, PredictionResponse):
+            prediction_latency.labels(model_name=result.model_id).observe(result.latency_ms / 1000)
+            request_count.labels(method="POST", endpoint="/batch-predict", status="success").inc()
+        else:
+            request_count.labels(method="POST", endpoint="/batch-predict", status="error").inc()
     
-    return {"predictions": results, "total": len(requests)}
+    if media_type == ARROW_STREAM:
+        return render_arrow(requests, results)
+    content = {"predictions": results, "total": len(requests)}
+    if wants_encoded(media_type, ML_VALIDATE_RESPONSES):
+        return render(content, media_type)
+    return content
+
+@app.post("/batch-predict/stream")
+async def batch_predict_stream(
+    request: Request,
+    model_id: Optional[str] = None,
+    chunk_size: int = ML_STREAM_CHUNK_ROWS
+):
+    """Score a stream of requests in fixed-size chunks, streaming results back
+
+    The body is NDJSON (one PredictionRequest per line) or an Arrow IPC
+    stream whose columns are model_id, request_id, entity_id, feature_ids
+    and the features. ``model_id`` applies to rows that don't name one.
+    Results come back in request order as NDJSON, or as an Arrow IPC
+    stream when the Accept header asks for one. Rows that don't validate
+    come back as failed results; only a body that can't be decoded ends
+    the stream early. Clients must read the response while they are still
+    sending.
+    """
+    arrow_in = request.headers.get('content-type', '').startswith(ARROW_STREAM)
+    encoder = ArrowEncoder() if ARROW_STREAM in request.headers.get('accept', '') else NdjsonEncoder()
+    rows = iter_arrow_rows(request.stream()) if arrow_in else iter_ndjson_rows(request.stream())
+    chunk_size = max(1, chunk_size)
+    
+    async def score():
+        # The stream outlives the request handler, so it owns its session
+        async with AsyncSessionLocal() as db:
+            service = PredictionService(db, ml_engine, feature_store, redis_client, prediction_logger)
+            try:
+                async for chunk in iter_chunks(rows, chunk_size):
+                    # Rows that don't validate fail on their own; the rest are scored
+                    requests, results = build_requests(chunk, model_id, arrow_in)
+                    valid = [i for i, request in enumerate(requests) if request is not None]
+                    if valid:
+                        scored = await service.predict_batch([requests[i] for i in valid])
+                        for i, result in zip(valid, scored):
+                            results[i] = result
+                    
+                    for result in results:
+                        if isinstance(result, PredictionResponse):
+                            prediction_latency.labels(model_name=result.model_id).observe(result.latency_ms / 1000)
+                            request_count.labels(method="POST", endpoint="/batch-predict/stream", status="success").inc()
+                        else:
+                            request_count.labels(method="POST", endpoint="/batch-predict/stream", status="error").inc()
+                    
+                    yield encoder.encode(requests, results)
+            except Exception as e:
+                # Headers are already sent; report the failure in-band and stop
+                logger.error(f"Streaming batch prediction failed: {e}")
+                request_count.labels(method="POST", endpoint="/batch-predict/stream", status="error").inc()
+                yield encoder.error(str(e))
+                return
+            yield encoder.close()
+    
+    return RequestStreamingResponse(score(), media_type=encoder.media_type)
 
 # Training endpoints
 @app.post("/train")
 async def train_model(
     request: TrainingRequest,
-    background_tasks: BackgroundTasks,
     service: TrainingService = Depends(get_training_service)
 ):
-    """Train a new model"""
+    """Train a new model
+
+    The job is queued and runs in a worker process; poll
+    /training-jobs/{job_id} for progress and the resulting model_id.
+    With ``search``, hyperparameters are tuned first and the model is
+    trained with the best trial's parameters. With ``point_in_time``,
+    feature store features are joined onto each row as they were at the
+    row's timestamp.
+    """
     try:
-        # Start training in background
         training_job = await service.start_training(request)
         
-        # Add background task to monitor training
-        background_tasks.add_task(
-            service.monitor_training,
-            training_job.id
-        )
-        
         request_count.labels(method="POST", endpoint="/train", status="success").inc()
         
         return {
             "job_id": training_job.id,
-            "status": "started",
-            "model_type": request.model_type,
-            "estimated_duration": training_job.estimated_duration
+            "status": training_job.status,
+            "model_type": request.model_type
         }
         
     except Exception as e:
@@ -331,6 +721,53 @@ async def get_training_status(
         raise HTTPException(status_code=404, detail="Training job not found")
     return job
 
+@app.post("/training-jobs/{job_id}/cancel")
+async def cancel_training(
+    job_id: str,
+    service: TrainingService = Depends(get_training_service)
+):
+    """Cancel a training job; a running job stops at its next chunk"""
+    job = await service.cancel_training(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return job
+
+# Bulk scoring endpoints
+@app.post("/scoring-jobs")
+async def start_scoring_job(
+    request: ScoringJobRequest,
+    background_tasks: BackgroundTasks,
+    service: ModelService = Depends(get_model_service)
+):
+    """Score a Parquet/CSV dataset offline and write the predictions as Parquet"""
+    model = await service.get_model(request.model_id)
+    if not model:
+        raise HTTPException(status_code=404, detail="Model not found")
+    
+    try:
+        job_id = await bulk_scoring.create_job(request)
+    except ValueError as e:
+        request_count.labels(method="POST", endpoint="/scoring-jobs", status="error").inc()
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    background_tasks.add_task(bulk_scoring.run_job, job_id, request, model.artifacts_path)
+    request_count.labels(method="POST", endpoint="/scoring-jobs", status="success").inc()
+    
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "model_id": request.model_id,
+        "output_path": request.output_path
+    }
+
+@app.get("/scoring-jobs/{job_id}")
+async def get_scoring_job(job_id: str):
+    """Get bulk scoring job status and progress"""
+    job = await bulk_scoring.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scoring job not found")
+    return job
+
 # Model metrics and monitoring
 @app.get("/models/{model_id}/metrics", response_model=ModelMetrics)
 async def get_model_metrics(
@@ -339,7 +776,10 @@ async def get_model_metrics(
     service: ModelService = Depends(get_model_service)
 ):
     """Get model performance metrics"""
-    metrics = await service.get_model_metrics(model_id, time_range)
+    try:
+        metrics = await service.get_model_metrics(model_id, time_range)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not metrics:
         raise HTTPException(status_code=404, detail="Metrics not found")
     return metrics
@@ -347,22 +787,32 @@ async def get_model_metrics(
 # Feature store endpoints
 @app.post("/features/compute")
 async def compute_features(
-    entity_id: str,
-    feature_names: List[str],
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    entity_id: Optional[str] = None,
+    feature_names: Optional[List[str]] = None,
+    incremental: bool = True
 ):
-    """Compute and store features for an entity"""
-    if feature_store:
-        background_tasks.add_task(
-            feature_store.compute_features,
-            entity_id,
-            feature_names
-        )
+    """Compute and store features for an entity, or materialize them for all entities
+
+    Without entity_id every entity is computed, or with incremental only
+    those touched since the last run.
+    """
+    unknown = set(feature_names or []) - set(feature_store.materializer.feature_names)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown features: {', '.join(sorted(unknown))}")
+    
+    background_tasks.add_task(
+        feature_store.compute_features,
+        entity_id,
+        feature_names,
+        incremental
+    )
     
     return {
         "status": "computing",
         "entity_id": entity_id,
-        "features": feature_names
+        "features": feature_names or feature_store.materializer.feature_names,
+        "incremental": incremental
     }
 
 @app.get("/features/{entity_id}")
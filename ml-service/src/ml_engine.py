@@ -1,25 +1,52 @@
 import asyncio
-import pickle
 import json
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+import os
 import numpy as np
-import pandas as pd
 from datetime import datetime
 import redis.asyncio as redis
 from minio import Minio
-import tensorflow as tf
-import torch
-import joblib
-from sklearn.base import BaseEstimator
 import logging
 
+from .artifact_cache import ArtifactCache
+from .backends import load_model_artifact, infer_batch
+from .backends.onnx_export import EXPORTABLE_FRAMEWORKS, convert_to_onnx
+from .batching import MicroBatcher
+from .feature_plan import FeaturePlan
+from .model_cache import ModelCache
+from .prediction_cache import PredictionCache
+from .model_metrics import ModelMetricsRecorder, DEFAULT_ROLLUPS, parse_time_range
+from .inference_executor import InferenceExecutor, process_infer
+
 logger = logging.getLogger(__name__)
 
+
+def _path_size(path: str) -> int:
+    """Size of a file, or of everything under a directory (e.g. a SavedModel)"""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
 class MLEngine:
     """Real ML engine for model loading, inference, and management"""
     
     def __init__(self, redis_client: redis.Redis, minio_url: str, 
-                 minio_access_key: str, minio_secret_key: str):
+                 minio_access_key: str, minio_secret_key: str,
+                 batch_max_size: int = 32, batch_max_wait_ms: float = 2.0,
+                 executor: Optional[InferenceExecutor] = None,
+                 artifact_cache_dir: str = '/tmp/ml-artifacts',
+                 artifact_cache_max_bytes: int = 10 * 1024 ** 3,
+                 model_cache_max_bytes: int = 4 * 1024 ** 3,
+                 metrics_flush_interval: float = 5.0,
+                 metrics_rollups: Tuple[Tuple[str, int, int], ...] = DEFAULT_ROLLUPS,
+                 prediction_cache: Optional[PredictionCache] = None,
+                 onnx_auto_export: bool = True,
+                 mmap_models: bool = False):
         self.redis = redis_client
         self.minio_client = Minio(
             minio_url,
@@ -27,8 +54,26 @@ class MLEngine:
             secret_key=minio_secret_key,
             secure=False
         )
-        self.loaded_models: Dict[str, Any] = {}
+        self.loaded_models = ModelCache(model_cache_max_bytes, on_evict=self._on_model_evicted)
+        self.model_sources: Dict[str, str] = {}
         self.model_metadata: Dict[str, Dict] = {}
+        self.model_paths: Dict[str, str] = {}
+        self.feature_plans: Dict[str, FeaturePlan] = {}
+        self.artifact_cache = ArtifactCache(
+            self.minio_client, artifact_cache_dir, artifact_cache_max_bytes
+        )
+        self.executor = executor or InferenceExecutor()
+        self.batch_max_size = batch_max_size
+        self.batch_max_wait_ms = batch_max_wait_ms
+        self._batchers: Dict[str, MicroBatcher] = {}
+        self.metrics = ModelMetricsRecorder(
+            redis_client,
+            flush_interval=metrics_flush_interval,
+            rollups=metrics_rollups
+        )
+        self.prediction_cache = prediction_cache
+        self.onnx_auto_export = onnx_auto_export
+        self.mmap_models = mmap_models
         
     async def initialize(self):
         """Initialize ML engine and create necessary buckets"""
@@ -40,15 +85,46 @@ class MLEngine:
         if not self.minio_client.bucket_exists("ml-artifacts"):
             self.minio_client.make_bucket("ml-artifacts")
             logger.info("Created ML artifacts bucket")
+        
+        self.metrics.start()
+    
+    async def close(self):
+        """Flush recorded metrics and stop the inference pools"""
+        await self.metrics.close()
+        self.executor.shutdown()
     
     async def load_model(self, model_id: str, model_path: str):
         """Load a model from storage into memory"""
+        # Remember where the model lives so it can be reloaded after eviction
+        self.model_sources[model_id] = model_path
+        
+        # (Re-)activation must not serve results cached for an earlier model
+        if self.prediction_cache:
+            await self.prediction_cache.invalidate(model_id)
+        
+        if model_id in self.loaded_models:
+            logger.info(f"Model {model_id} already loaded")
+            return
+        
+        await self._ensure_loaded(model_id)
+    
+    async def _ensure_loaded(self, model_id: str) -> Any:
+        """Get a resident model, reloading it on demand if it was evicted"""
+        model = self.loaded_models.get(model_id)
+        if model is not None:
+            return model
+        
+        model_path = self.model_sources.get(model_id)
+        if model_path is None:
+            raise ValueError(f"Model {model_id} not loaded")
+        
+        return await self.loaded_models.get_or_load(
+            model_id, lambda: self._load_from_storage(model_id, model_path)
+        )
+    
+    async def _load_from_storage(self, model_id: str, model_path: str) -> Tuple[Any, int]:
+        """Download and deserialize a model; returns the model and its size in bytes"""
         try:
-            # Check if already loaded
-            if model_id in self.loaded_models:
-                logger.info(f"Model {model_id} already loaded")
-                return
-
             # Get model metadata from Redis
             metadata_str = await self.redis.get(f"model:metadata:{model_id}")
             metadata = {}
@@ -56,23 +132,38 @@ class MLEngine:
                 metadata = json.loads(metadata_str)
                 self.model_metadata[model_id] = metadata
 
-            # Download model from MinIO
-            model_data = self._download_model(model_path)
+            # Download model from MinIO, or reuse the locally cached copy
+            model_data = await self.artifact_cache.fetch(model_path)
+            self.artifact_cache.pin(model_data)
 
             # Load based on framework
             framework = metadata.get('framework', 'sklearn')
             
-            if framework == 'tensorflow':
-                model = tf.keras.models.load_model(model_data)
-            elif framework == 'pytorch':
-                model = torch.load(model_data)
-            elif framework == 'sklearn':
-                model = joblib.load(model_data)
-            else:
-                with open(model_data, 'rb') as f:
-                    model = pickle.load(f)
+            # Memory-mapped weights are shared with other worker processes
+            # through the page cache; an ONNX session would hold a private copy
+            use_mmap = bool(metadata.get('mmap', self.mmap_models))
+            if use_mmap:
+                metadata = {**metadata, 'mmap': True}
+                self.model_metadata[model_id] = metadata
+            model = await asyncio.to_thread(load_model_artifact, model_data, framework, use_mmap)
             
-            self.loaded_models[model_id] = model
+            # Serve sklearn/PyTorch models through ONNX Runtime when the export matches
+            if (metadata.get('onnx_export', self.onnx_auto_export) and not use_mmap
+                    and framework in EXPORTABLE_FRAMEWORKS):
+                onnx_path = await asyncio.to_thread(convert_to_onnx, model, framework, metadata, model_data)
+                if onnx_path:
+                    model = await asyncio.to_thread(load_model_artifact, onnx_path, 'onnx')
+                    metadata = {**metadata, 'framework': 'onnx', 'source_framework': framework}
+                    self.model_metadata[model_id] = metadata
+                    model_data = onnx_path
+                    framework = 'onnx'
+                    logger.info(f"Serving model {model_id} with ONNX Runtime")
+            
+            self.model_paths[model_id] = model_data
+            self.feature_plans[model_id] = FeaturePlan(metadata)
+            self.executor.configure_model(model_id, metadata)
+            if self.prediction_cache:
+                await self.prediction_cache.sync_generation(model_id)
             
             # Cache model info in Redis
             await self.redis.set(
@@ -87,161 +178,233 @@ class MLEngine:
             
             logger.info(f"Successfully loaded model {model_id}")
             
+            # Models may declare their in-memory size; otherwise use the artifact size
+            return model, int(metadata.get('memory_bytes') or _path_size(model_data))
+            
         except Exception as e:
             logger.error(f"Failed to load model {model_id}: {e}")
             raise
     
+    async def warm_up(self, model_id: str, model_path: str) -> None:
+        """Load a model and run one synthetic inference to trigger lazy initialization
+
+        Graph compilation, JIT and lazily allocated buffers happen on the
+        first call, so warming up keeps that cost off the first real request.
+        """
+        await self.load_model(model_id, model_path)
+        
+        plan = self._feature_plan(model_id)
+        if not plan.n_features:
+            logger.info(f"Model {model_id} declares no feature_names; skipping warm-up inference")
+            return
+        
+        # The plan's default vector (zeros where no default is set) is a valid input row
+        try:
+            await self._predict_matrix(model_id, plan.defaults.reshape(1, -1))
+        except Exception as e:
+            logger.warning(f"Warm-up inference failed for model {model_id}: {e}")
+    
+    async def serving_artifact(self, model_id: str, model_path: str) -> Tuple[str, Dict[str, Any]]:
+        """Local artifact path and metadata the model is served from, loading it if needed
+
+        Lets other processes (e.g. bulk scoring workers) load the same
+        artifact, including its ONNX export, without downloading it again.
+        """
+        self.model_sources.setdefault(model_id, model_path)
+        await self._ensure_loaded(model_id)
+        return self.model_paths[model_id], dict(self.model_metadata.get(model_id, {}))
+
+    async def swap_model(
+        self,
+        model_id: str,
+        model: Any,
+        local_path: str,
+        model_path: str,
+        metadata: Dict[str, Any]
+    ) -> None:
+        """Replace a model with a new version of itself, e.g. an online-learning checkpoint
+
+        ``model`` was saved to ``local_path`` and uploaded to ``model_path``,
+        which the model is reloaded from after an eviction; it must not be
+        modified afterwards. Requests already running finish on the old
+        object and later ones get the new one.
+        """
+        await self.redis.set(f"model:metadata:{model_id}", json.dumps(metadata))
+
+        # Nothing below yields, so no request sees a mix of old and new state
+        previous_path = self.model_paths.get(model_id)
+        if previous_path:
+            self.artifact_cache.unpin(previous_path)
+        self.model_sources[model_id] = model_path
+        self.model_metadata[model_id] = metadata
+        self.model_paths[model_id] = local_path
+        self.feature_plans[model_id] = FeaturePlan(metadata)
+        self.loaded_models.put(model_id, model, int(metadata.get('memory_bytes') or _path_size(local_path)))
+
+        if self.prediction_cache:
+            await self.prediction_cache.invalidate(model_id)
+        logger.info(f"Swapped in version {metadata.get('version')} of model {model_id}")
+
+    def _on_model_evicted(self, model_id: str) -> None:
+        """Release resources of a model dropped by the model cache"""
+        model_data = self.model_paths.pop(model_id, None)
+        if model_data:
+            self.artifact_cache.unpin(model_data)
+    
     async def predict(self, model_id: str, features: Dict[str, Any]) -> Dict[str, Any]:
         """Make prediction using loaded model"""
-        if model_id not in self.loaded_models:
-            raise ValueError(f"Model {model_id} not loaded")
+        await self._ensure_loaded(model_id)
         
-        model = self.loaded_models[model_id]
         metadata = self.model_metadata.get(model_id, {})
         
         # Prepare features
-        feature_vector = self._prepare_features(features, metadata)
+        feature_vector = self._feature_plan(model_id).build_row(features)
         
-        # Make prediction based on model type
         framework = metadata.get('framework', 'sklearn')
         
         start_time = datetime.utcnow()
         
-        probabilities = None
-        predicted_class = None
-        confidence = None
-        prediction_value = None
-
-        if framework == 'tensorflow':
-            prediction = model.predict(feature_vector)
-            if metadata.get('task') == 'classification':
-                probabilities = prediction[0].tolist()
-                predicted_class = int(np.argmax(prediction[0]))
-                confidence = float(np.max(prediction[0]))
-            else:
-                prediction_value = float(prediction[0][0])
-                
-        elif framework == 'pytorch':
-            model.eval()
-            with torch.no_grad():
-                input_tensor = torch.FloatTensor(feature_vector)
-                output = model(input_tensor)
-                if metadata.get('task') == 'classification':
-                    probabilities = torch.softmax(output, dim=1)[0].tolist()
-                    predicted_class = int(torch.argmax(output[0]))
-                    confidence = float(torch.max(torch.softmax(output, dim=1)[0]))
-                    prediction_value = None
-                else:
-                    probabilities = None
-                    predicted_class = None
-                    confidence = None
-                    prediction_value = float(output[0])
-                    
-        else:  # sklearn and others
-            prediction = model.predict(feature_vector)
-            if hasattr(model, 'predict_proba'):
-                proba = model.predict_proba(feature_vector)
-                probabilities = proba[0].tolist()
-                predicted_class = int(prediction[0])
-                confidence = float(np.max(proba[0]))
-                prediction_value = None
+        # Repeated feature vectors can be answered from the prediction cache
+        cache_key = None
+        cached = None
+        cache_ttl = self.prediction_cache.ttl_for(metadata) if self.prediction_cache else 0
+        if cache_ttl > 0:
+            cache_key = self.prediction_cache.key(model_id, self._model_version(model_id), feature_vector)
+            cached = await self.prediction_cache.get(model_id, cache_key)
+        
+        if cached is not None:
+            prediction = cached['prediction']
+        else:
+            # Concurrent single-row requests are coalesced into one framework call
+            batcher = self._get_batcher(model_id)
+            if batcher:
+                prediction = await batcher.submit(feature_vector[0])
             else:
-                probabilities = None
-                predicted_class = None
-                confidence = None
-                prediction_value = float(prediction[0])
+                prediction = (await self._predict_matrix(model_id, feature_vector))[0]
         
         latency_ms = (datetime.utcnow() - start_time).total_seconds() * 1000
         
-        # Store prediction in Redis for monitoring
-        await self._store_prediction_metrics(model_id, latency_ms, confidence)
+        if cache_key and cached is None:
+            await self.prediction_cache.put(
+                cache_key, {'prediction': prediction, 'latency_ms': latency_ms}, cache_ttl
+            )
+        
+        # Record metrics in memory; they are flushed to Redis periodically
+        self.metrics.record(model_id, latency_ms, prediction['confidence'])
         
         return {
             'model_id': model_id,
-            'prediction': {
-                'class': predicted_class,
-                'value': prediction_value,
-                'probabilities': probabilities,
-                'confidence': confidence
-            },
+            'prediction': prediction,
             'metadata': {
                 'model_version': metadata.get('version', '1.0'),
                 'framework': framework,
                 'latency_ms': latency_ms,
+                'cached': cached is not None,
                 'timestamp': datetime.utcnow().isoformat()
             }
         }
     
-    def _prepare_features(self, features: Dict[str, Any], metadata: Dict) -> np.ndarray:
-        """Prepare features for model input"""
-        feature_names = metadata.get('feature_names', sorted(features.keys()))
-        feature_vector = []
+    async def predict_batch(self, model_id: str, feature_rows: List[Dict[str, Any]]) -> List[Any]:
+        """Make predictions for many feature dicts with a single framework call
+
+        Returns one entry per input row, in order: a prediction dict shaped
+        like ``predict``'s result, or the ``ValueError`` raised while
+        preparing that row's features.
+        """
+        await self._ensure_loaded(model_id)
         
-        for name in feature_names:
-            if name not in features:
-                # Use default value or raise error
-                default = metadata.get('feature_defaults', {}).get(name)
-                if default is None:
-                    raise ValueError(f"Missing required feature: {name}")
-                value = default
-            else:
-                value = features[name]
-            
-            # Handle categorical features
-            if name in metadata.get('categorical_features', []):
-                # One-hot encode or use embedding
-                encoder = metadata.get('encoders', {}).get(name)
-                if encoder:
-                    value = encoder.transform([value])[0]
-            
-            feature_vector.append(value)
+        metadata = self.model_metadata.get(model_id, {})
+        framework = metadata.get('framework', 'sklearn')
         
-        return np.array([feature_vector])
-    
-    def _download_model(self, model_path: str) -> str:
-        """Download model from MinIO"""
-        local_path = f"/tmp/{model_path.split('/')[-1]}"
-        bucket, object_name = model_path.split('/', 1)
+        results: List[Any] = [None] * len(feature_rows)
+        feature_matrix, errors = self._feature_plan(model_id).build_matrix(feature_rows)
+        valid_rows = [i for i, error in enumerate(errors) if error is None]
+        for i, error in enumerate(errors):
+            if error is not None:
+                results[i] = ValueError(error)
         
-        self.minio_client.fget_object(
-            bucket,
-            object_name,
-            local_path
-        )
+        if not valid_rows:
+            return results
+        if len(valid_rows) < len(feature_rows):
+            feature_matrix = feature_matrix[valid_rows]
+        
+        start_time = datetime.utcnow()
+        predictions = await self._predict_matrix(model_id, feature_matrix)
+        latency_ms = (datetime.utcnow() - start_time).total_seconds() * 1000 / len(valid_rows)
+        
+        self.metrics.record_batch(model_id, latency_ms, [p['confidence'] for p in predictions])
         
-        return local_path
-    
-    async def _store_prediction_metrics(self, model_id: str, latency_ms: float, 
-                                      confidence: Optional[float]):
-        """Store prediction metrics in Redis"""
         timestamp = datetime.utcnow().isoformat()
+        for i, prediction in zip(valid_rows, predictions):
+            results[i] = {
+                'model_id': model_id,
+                'prediction': prediction,
+                'metadata': {
+                    'model_version': metadata.get('version', '1.0'),
+                    'framework': framework,
+                    'latency_ms': latency_ms,
+                    'timestamp': timestamp
+                }
+            }
         
-        # Store in sorted set for time-series queries
-        await self.redis.zadd(
-            f"model:metrics:latency:{model_id}",
-            {f"{timestamp}:{latency_ms}": datetime.utcnow().timestamp()}
-        )
+        return results
+    
+    def _get_batcher(self, model_id: str) -> Optional[MicroBatcher]:
+        """Get or create the micro-batching queue for a model"""
+        if self.batch_max_size <= 1:
+            return None
         
-        if confidence is not None:
-            await self.redis.zadd(
-                f"model:metrics:confidence:{model_id}",
-                {f"{timestamp}:{confidence}": datetime.utcnow().timestamp()}
+        batcher = self._batchers.get(model_id)
+        if batcher is None:
+            batcher = MicroBatcher(
+                model_id,
+                lambda matrix: self._predict_matrix(model_id, matrix),
+                max_batch_size=self.batch_max_size,
+                max_wait_ms=self.batch_max_wait_ms
             )
+            self._batchers[model_id] = batcher
+        return batcher
+    
+    async def _predict_matrix(self, model_id: str, feature_matrix: np.ndarray) -> List[Dict[str, Any]]:
+        """Run one framework call over a feature matrix, one result per row"""
+        model = await self._ensure_loaded(model_id)
+        metadata = self.model_metadata.get(model_id, {})
+        mode = metadata.get('execution_mode', self.executor.default_mode)
         
-        # Increment prediction counter (redis.hincrby returns int, not awaitable)
-        self.redis.hincrby(f"model:stats:{model_id}", "predictions", 1)  # type: ignore
-
-        # Update last prediction time (redis.hset returns int, not awaitable)
-        self.redis.hset(  # type: ignore
-            f"model:stats:{model_id}",
-            "last_prediction",
-            timestamp
-        )
+        with self.loaded_models.in_use(model_id):
+            if mode == 'process':
+                # Worker processes load their own copy of the model from disk
+                return await self.executor.run(
+                    model_id, mode, process_infer,
+                    model_id, self.model_paths[model_id], metadata, feature_matrix
+                )
+            return await self.executor.run(model_id, mode, infer_batch, model, metadata, feature_matrix)
+    
+    def _model_version(self, model_id: str) -> str:
+        """Version and artifact ETag of the loaded model, for cache keys"""
+        version = self.model_metadata.get(model_id, {}).get('version', '1.0')
+        model_data = self.model_paths.get(model_id, '')
+        return f"{version}@{os.path.basename(os.path.dirname(model_data))}"
+    
+    def _feature_plan(self, model_id: str) -> FeaturePlan:
+        """Get the compiled feature plan for a model"""
+        plan = self.feature_plans.get(model_id)
+        if plan is None:
+            plan = self.feature_plans[model_id] = FeaturePlan(self.model_metadata.get(model_id, {}))
+        return plan
     
     async def unload_model(self, model_id: str):
         """Unload model from memory"""
-        if model_id in self.loaded_models:
-            del self.loaded_models[model_id]
+        batcher = self._batchers.pop(model_id, None)
+        if batcher:
+            await batcher.close()
+        known = self.model_sources.pop(model_id, None) is not None
+        if self.prediction_cache:
+            await self.prediction_cache.invalidate(model_id)
+        if self.loaded_models.remove(model_id) or known:
+            self._on_model_evicted(model_id)
+            self.executor.remove_model(model_id)
+            self.feature_plans.pop(model_id, None)
             if model_id in self.model_metadata:
                 del self.model_metadata[model_id]
             await self.redis.delete(f"model:loaded:{model_id}")
@@ -251,23 +414,18 @@ class MLEngine:
         """Get list of currently loaded models"""
         return list(self.loaded_models.keys())
     
-    async def get_model_stats(self, model_id: str) -> Dict[str, Any]:
-        """Get model statistics"""
+    async def get_model_stats(self, model_id: str, time_range: str = '1h') -> Dict[str, Any]:
+        """Get model statistics over a time range such as ``1h``, ``24h`` or ``7d``"""
         stats = await self.redis.hgetall(f"model:stats:{model_id}")  # type: ignore
-        
-        # Get recent latencies
-        recent_latencies = await self.redis.zrevrange(
-            f"model:metrics:latency:{model_id}",
-            0, 99,  # Last 100 predictions
-            withscores=False
-        )
-        
-        latencies = [float(l.split(':')[1]) for l in recent_latencies]
+        summary = await self.metrics.summary(model_id, parse_time_range(time_range))
         
         return {
-            'total_predictions': int(stats.get('predictions', 0)),
+            'total_predictions': summary['count'],
+            'lifetime_predictions': int(stats.get('predictions', 0)),
             'last_prediction': stats.get('last_prediction'),
-            'average_latency_ms': np.mean(latencies) if latencies else 0,
-            'p95_latency_ms': np.percentile(latencies, 95) if latencies else 0,
-            'p99_latency_ms': np.percentile(latencies, 99) if latencies else 0
-        }
\ No newline at end of file
+            'average_latency_ms': summary['average_latency_ms'],
+            'p50_latency_ms': summary['p50_latency_ms'],
+            'p95_latency_ms': summary['p95_latency_ms'],
+            'p99_latency_ms': summary['p99_latency_ms'],
+            'average_confidence': summary['average_confidence']
+        }
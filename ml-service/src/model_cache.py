@@ -0,0 +1,139 @@
+"""Memory-budgeted cache of loaded models"""
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Awaitable, Callable, Iterator, List, Optional, Tuple
+from prometheus_client import Counter, Gauge, Histogram
+import logging
+
+logger = logging.getLogger(__name__)
+
+model_resident_bytes = Gauge('ml_model_resident_bytes', 'Estimated memory held by loaded models')
+model_evictions = Counter('ml_model_evictions_total', 'Models evicted from memory to stay within budget')
+model_loads = Counter('ml_model_loads_total', 'Model loads from storage')
+model_load_wait = Histogram(
+    'ml_model_load_wait_seconds',
+    'Time callers waited for a model to be loaded',
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+
+
+class ModelCache:
+    """LRU cache of loaded models bounded by an estimated memory budget
+
+    Each model is stored with its size in bytes. When the total exceeds
+    ``max_bytes`` the least-recently-used model that is not currently
+    serving a request is evicted and ``on_evict`` is called with its id.
+    Concurrent loads of the same model share a single load.
+    """
+
+    def __init__(self, max_bytes: int, on_evict: Optional[Callable[[str], None]] = None):
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.resident_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._in_use: Dict[str, int] = {}
+        self._loads: Dict[str, asyncio.Future] = {}
+
+    def __contains__(self, model_id: str) -> bool:
+        return model_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def keys(self) -> List[str]:
+        return list(self._entries.keys())
+
+    def get(self, model_id: str) -> Optional[Any]:
+        """Get a resident model and mark it as recently used"""
+        entry = self._entries.get(model_id)
+        if entry is None:
+            return None
+        self._entries.move_to_end(model_id)
+        return entry[0]
+
+    def size_of(self, model_id: str) -> int:
+        entry = self._entries.get(model_id)
+        return entry[1] if entry else 0
+
+    async def get_or_load(self, model_id: str, loader: Callable[[], Awaitable[Tuple[Any, int]]]) -> Any:
+        """Return a resident model, loading it with ``loader`` at most once at a time
+
+        ``loader`` returns ``(model, size_bytes)``.
+        """
+        model = self.get(model_id)
+        if model is not None:
+            return model
+
+        start_time = time.perf_counter()
+        try:
+            pending = self._loads.get(model_id)
+            if pending is not None:
+                return await asyncio.shield(pending)
+
+            future = asyncio.get_running_loop().create_future()
+            self._loads[model_id] = future
+            try:
+                model, size = await loader()
+                model_loads.inc()
+                self.put(model_id, model, size)
+                future.set_result(model)
+                return model
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # Don't leave an unretrieved exception if nobody else was waiting
+                future.exception()
+                raise
+            finally:
+                del self._loads[model_id]
+        finally:
+            model_load_wait.observe(time.perf_counter() - start_time)
+
+    def put(self, model_id: str, model: Any, size: int) -> None:
+        """Add a model and evict others if the budget is exceeded"""
+        self.remove(model_id)
+        self._entries[model_id] = (model, size)
+        self.resident_bytes += size
+        self._evict()
+        model_resident_bytes.set(self.resident_bytes)
+
+    def remove(self, model_id: str) -> bool:
+        entry = self._entries.pop(model_id, None)
+        if entry is None:
+            return False
+        self.resident_bytes -= entry[1]
+        model_resident_bytes.set(self.resident_bytes)
+        return True
+
+    @contextmanager
+    def in_use(self, model_id: str) -> Iterator[None]:
+        """Protect a model from eviction while a request is using it"""
+        self._in_use[model_id] = self._in_use.get(model_id, 0) + 1
+        try:
+            yield
+        finally:
+            self._in_use[model_id] -= 1
+            if not self._in_use[model_id]:
+                del self._in_use[model_id]
+
+    def _evict(self) -> None:
+        for model_id in list(self._entries.keys()):
+            if self.resident_bytes <= self.max_bytes:
+                return
+            # The newest model and models serving requests stay resident
+            if model_id in self._in_use or model_id == next(reversed(self._entries)):
+                continue
+            self.remove(model_id)
+            model_evictions.inc()
+            logger.info(f"Evicted model {model_id} to stay within the model memory budget")
+            if self.on_evict:
+                self.on_evict(model_id)
+
+        if self.resident_bytes > self.max_bytes:
+            logger.warning(
+                f"Loaded models use {self.resident_bytes} bytes, over the {self.max_bytes} byte budget"
+            )
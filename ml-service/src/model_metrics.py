@@ -0,0 +1,324 @@
+"""In-process prediction metrics flushed to Redis in time buckets"""
+import asyncio
+from abc import ABC, abstractmethod
+import math
+import re
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+import redis.asyncio as redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rollup granularities as (name, bucket seconds, retention seconds), finest first
+DEFAULT_ROLLUPS = (
+    ('minute', 60, 2 * 24 * 3600),
+    ('hour', 3600, 31 * 24 * 3600),
+    ('day', 24 * 3600, 400 * 24 * 3600),
+)
+
+TIME_RANGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 24 * 3600, 'w': 7 * 24 * 3600}
+
+
+def parse_time_range(time_range: str) -> int:
+    """Parse a time range such as ``15m``, ``24h`` or ``7d`` into seconds"""
+    match = re.fullmatch(r'\s*(\d+)\s*([smhdw])\s*', time_range or '')
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Invalid time range: {time_range!r}")
+    return int(match.group(1)) * TIME_RANGE_UNITS[match.group(2)]
+
+
+class BucketHistogram(ABC):
+    """Mergeable histogram of value counts by bucket index
+
+    Subclasses map values to integer bucket indexes. Recording a value is a
+    little arithmetic and a dict increment; two histograms merge by adding
+    their counts, which is also how they are combined in Redis.
+    """
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+
+    @abstractmethod
+    def bucket_of(self, value: float) -> int:
+        """Bucket index a value falls in"""
+
+    @abstractmethod
+    def value_of(self, index: int) -> float:
+        """Representative value of a bucket"""
+
+    def add(self, value: float, n: int = 1) -> None:
+        index = self.bucket_of(value)
+        self.counts[index] = self.counts.get(index, 0) + n
+        self.count += n
+        self.total += value * n
+
+    def merge(self, other: "BucketHistogram") -> None:
+        for index, n in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + n
+        self.count += other.count
+        self.total += other.total
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile from the bucket a rank falls in"""
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                return self.value_of(index)
+        return self.value_of(max(self.counts))
+
+
+class LogBucketHistogram(BucketHistogram):
+    """Log-scale buckets with a bounded relative error, for latencies
+
+    Bucket ``i`` covers ``[growth**i, growth**(i+1))``; the default growth
+    of 1.02 keeps quantile estimates within about 1% of the true value.
+    Values at or below ``min_value`` share one bucket.
+    """
+
+    def __init__(self, growth: float = 1.02, min_value: float = 0.001):
+        super().__init__()
+        self.growth = growth
+        self.log_growth = math.log(growth)
+        self.min_value = min_value
+        self.zero_index = math.floor(math.log(min_value) / self.log_growth)
+
+    def bucket_of(self, value: float) -> int:
+        if value <= self.min_value:
+            return self.zero_index
+        return math.floor(math.log(value) / self.log_growth)
+
+    def value_of(self, index: int) -> float:
+        if index <= self.zero_index:
+            return 0.0
+        # Geometric midpoint of the bucket
+        return self.growth ** (index + 0.5)
+
+
+class LinearBucketHistogram(BucketHistogram):
+    """Fixed-width buckets over ``[0, 1]``, for confidences"""
+
+    def __init__(self, width: float = 0.01):
+        super().__init__()
+        self.width = width
+        self.max_index = int(round(1 / width))
+
+    def bucket_of(self, value: float) -> int:
+        return min(max(int(value / self.width), 0), self.max_index)
+
+    def value_of(self, index: int) -> float:
+        return min((index + 0.5) * self.width, 1.0)
+
+
+class MetricsWindow:
+    """Latency and confidence histograms for one model since the last flush"""
+
+    def __init__(self):
+        self.latency = LogBucketHistogram()
+        self.confidence = LinearBucketHistogram()
+        self.last_prediction = 0.0
+
+    def merge(self, other: "MetricsWindow") -> None:
+        self.latency.merge(other.latency)
+        self.confidence.merge(other.confidence)
+        self.last_prediction = max(self.last_prediction, other.last_prediction)
+
+
+class ModelMetricsRecorder:
+    """Records per-model prediction metrics in memory and flushes them to Redis
+
+    Every ``flush_interval`` seconds the histograms collected since the
+    last flush are added into one Redis hash per model, rollup granularity
+    and time bucket, ``model:metrics:{model_id}:{granularity}:{bucket_start}``,
+    with HINCRBY so several replicas merge into the same buckets. Each
+    granularity has its own retention, keeping Redis memory bounded.
+    Queries over a time range merge the few coarse buckets that fit inside
+    it and fill the edges with finer ones.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        flush_interval: float = 5.0,
+        rollups: Tuple[Tuple[str, int, int], ...] = DEFAULT_ROLLUPS
+    ):
+        self.redis = redis_client
+        self.flush_interval = flush_interval
+        self.rollups = sorted(rollups, key=lambda rollup: rollup[1])
+        self._windows: Dict[str, MetricsWindow] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    def record(self, model_id: str, latency_ms: float, confidence: Optional[float]) -> None:
+        """Record one prediction"""
+        window = self._windows.get(model_id)
+        if window is None:
+            window = self._windows[model_id] = MetricsWindow()
+        window.latency.add(latency_ms)
+        if confidence is not None:
+            window.confidence.add(confidence)
+        window.last_prediction = time.time()
+
+    def record_batch(self, model_id: str, latency_ms: float, confidences: List[Optional[float]]) -> None:
+        """Record a batch of predictions that share one per-row latency"""
+        window = self._windows.get(model_id)
+        if window is None:
+            window = self._windows[model_id] = MetricsWindow()
+        window.latency.add(latency_ms, len(confidences))
+        for confidence in confidences:
+            if confidence is not None:
+                window.confidence.add(confidence)
+        window.last_prediction = time.time()
+
+    def start(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the flush loop and write what has been recorded"""
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Add the current windows into their Redis time buckets"""
+        if not self._windows:
+            return
+
+        windows, self._windows = self._windows, {}
+        now = int(time.time())
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for model_id, window in windows.items():
+                    self._write_window(pipe, model_id, window, now)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to flush model metrics: {e}")
+            # Keep the counts for the next flush
+            for model_id, window in windows.items():
+                current = self._windows.get(model_id)
+                if current is None:
+                    self._windows[model_id] = window
+                else:
+                    current.merge(window)
+
+    def _write_window(self, pipe: Any, model_id: str, window: MetricsWindow, now: int) -> None:
+        for granularity, bucket_seconds, retention_seconds in self.rollups:
+            key = self._bucket_key(model_id, granularity, now // bucket_seconds * bucket_seconds)
+            for index, n in window.latency.counts.items():
+                pipe.hincrby(key, f"l{index}", n)
+            for index, n in window.confidence.counts.items():
+                pipe.hincrby(key, f"c{index}", n)
+            pipe.hincrby(key, "count", window.latency.count)
+            pipe.hincrbyfloat(key, "latency_sum", window.latency.total)
+            if window.confidence.count:
+                pipe.hincrby(key, "confidence_count", window.confidence.count)
+                pipe.hincrbyfloat(key, "confidence_sum", window.confidence.total)
+            pipe.expire(key, retention_seconds)
+
+        stats_key = f"model:stats:{model_id}"
+        pipe.hincrby(stats_key, "predictions", window.latency.count)
+        pipe.hset(stats_key, "last_prediction", datetime.utcfromtimestamp(window.last_prediction).isoformat())
+
+    @staticmethod
+    def _bucket_key(model_id: str, granularity: str, bucket_start: int) -> str:
+        return f"model:metrics:{model_id}:{granularity}:{bucket_start}"
+
+    def plan_buckets(self, start: int, end: int) -> List[Tuple[str, int]]:
+        """Cover ``[start, end)`` with as few rollup buckets as possible
+
+        Walks forward from ``start`` taking the coarsest bucket that is
+        aligned with the cursor and ends by ``end``. Granularities whose
+        retention no longer covers the cursor are skipped; if no retained
+        bucket is aligned, the finest retained bucket containing the cursor
+        is used, so the range may be widened by less than one bucket.
+        """
+        now = int(time.time())
+        finest_seconds = self.rollups[0][1]
+        end = -(-end // finest_seconds) * finest_seconds
+        cursor = start // finest_seconds * finest_seconds
+        buckets: List[Tuple[str, int]] = []
+
+        while cursor < end:
+            retained = [rollup for rollup in self.rollups if now - cursor < rollup[2]]
+            if not retained:
+                # Older than every retention; skip ahead to the coarsest bucket boundary
+                bucket_seconds = self.rollups[-1][1]
+                cursor = (cursor // bucket_seconds + 1) * bucket_seconds
+                continue
+
+            chosen = None
+            for granularity, bucket_seconds, _ in reversed(retained):
+                if cursor % bucket_seconds == 0 and cursor + bucket_seconds <= end:
+                    chosen = (granularity, bucket_seconds, cursor)
+                    break
+            if chosen is None:
+                granularity, bucket_seconds, _ = retained[0]
+                chosen = (granularity, bucket_seconds, cursor // bucket_seconds * bucket_seconds)
+
+            granularity, bucket_seconds, bucket_start = chosen
+            buckets.append((granularity, bucket_start))
+            cursor = bucket_start + bucket_seconds
+
+        return buckets
+
+    async def read(self, model_id: str, window_seconds: int) -> MetricsWindow:
+        """Merge the stored rollup buckets covering the last ``window_seconds``"""
+        now = int(time.time())
+        buckets = self.plan_buckets(now - window_seconds, now + 1)
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for granularity, bucket_start in buckets:
+                pipe.hgetall(self._bucket_key(model_id, granularity, bucket_start))
+            stored = await pipe.execute()
+
+        merged = MetricsWindow()
+        for fields in stored:
+            merged.merge(self._parse_bucket(fields))
+        return merged
+
+    async def summary(self, model_id: str, window_seconds: int) -> Dict[str, Any]:
+        """Count, latency mean and quantiles, and mean confidence over a time range"""
+        window = await self.read(model_id, window_seconds)
+        return {
+            'count': window.latency.count,
+            'average_latency_ms': window.latency.mean(),
+            'p50_latency_ms': window.latency.quantile(0.50),
+            'p95_latency_ms': window.latency.quantile(0.95),
+            'p99_latency_ms': window.latency.quantile(0.99),
+            'average_confidence': window.confidence.mean() if window.confidence.count else None
+        }
+
+    @staticmethod
+    def _parse_bucket(fields: Dict[str, str]) -> MetricsWindow:
+        window = MetricsWindow()
+        for field, value in fields.items():
+            if field[0] == 'l' and field != 'latency_sum':
+                window.latency.counts[int(field[1:])] = int(value)
+            elif field[0] == 'c' and field[1:].isdigit():
+                window.confidence.counts[int(field[1:])] = int(value)
+        window.latency.count = int(fields.get('count', 0))
+        window.latency.total = float(fields.get('latency_sum', 0))
+        window.confidence.count = int(fields.get('confidence_count', 0))
+        window.confidence.total = float(fields.get('confidence_sum', 0))
+        return window
@@ -36,3 +36,30 @@ class Prediction(Base):
     confidence: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     latency_ms: Mapped[float] = mapped_column(Float, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class TrainingJob(Base):
+    """Training job database model, also the durable job queue"""
+    __tablename__ = "training_jobs"
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    model_name: Mapped[str] = mapped_column(String, nullable=False)
+    model_type: Mapped[str] = mapped_column(String, nullable=False)
+    framework: Mapped[str] = mapped_column(String, nullable=False)
+    # queued, running, completed, failed or cancelled
+    status: Mapped[str] = mapped_column(String, nullable=False, default='queued', index=True)
+    stage: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    progress: Mapped[float] = mapped_column(Float, default=0.0)
+    training_data_path: Mapped[str] = mapped_column(String, nullable=False)
+    validation_data_path: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    hyperparameters: Mapped[Dict[str, Any]] = mapped_column(JSON, default={})
+    options: Mapped[Dict[str, Any]] = mapped_column(JSON, default={})
+    metrics: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON, nullable=True)
+    model_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    node: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, default=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
@@ -0,0 +1,501 @@
+"""Incremental learning of served models from a labeled feedback stream"""
+import asyncio
+import copy
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import numpy as np
+import redis.asyncio as redis
+from minio import Minio
+from prometheus_client import Counter, Gauge, Histogram
+import logging
+
+from .backends import load_model_artifact
+from .feature_plan import FeaturePlan
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_SOURCES = ('kafka', 'file')
+
+# Redis hash of models with online learning on: model_id -> {model_path, model_name}
+LEARNERS_KEY = 'online:learners'
+
+online_updates = Counter('ml_online_updates_total', 'Feedback events applied to online models', ['model_id'])
+online_update_duration = Histogram(
+    'ml_online_update_duration_seconds',
+    'partial_fit time per feedback micro-batch',
+    ['model_id'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+online_events_skipped = Counter(
+    'ml_online_events_skipped_total',
+    'Feedback events not learned from by reason (malformed, unlabeled, invalid_features, update_failed)',
+    ['model_id', 'reason']
+)
+online_checkpoints = Counter('ml_online_checkpoints_total', 'Online model checkpoints swapped in for serving', ['model_id'])
+online_pending_events = Gauge(
+    'ml_online_pending_events',
+    'Feedback events learned by the shadow model but not yet served',
+    ['model_id']
+)
+online_model_staleness = Gauge(
+    'ml_online_model_staleness_seconds',
+    'Age of the oldest feedback event learned but not yet served',
+    ['model_id']
+)
+
+
+class FileFeedbackSource:
+    """Reads feedback events from a local NDJSON file, following it as it grows
+
+    The position is the byte offset after the last line read. It is saved
+    with each checkpoint, so after a restart reading resumes with the first
+    event the checkpoint hasn't learned.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offset = 0
+
+    async def start(self, position: Any = None) -> None:
+        self._offset = int(position or 0)
+
+    async def poll(self, max_records: int, timeout: float) -> List[Optional[Dict[str, Any]]]:
+        """Up to ``max_records`` events, waiting ``timeout`` seconds if there are none"""
+        events = await asyncio.to_thread(self._read, max_records)
+        if not events:
+            await asyncio.sleep(timeout)
+        return events
+
+    def _read(self, max_records: int) -> List[Optional[Dict[str, Any]]]:
+        events: List[Optional[Dict[str, Any]]] = []
+        if not os.path.exists(self.path):
+            return events
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            while len(events) < max_records:
+                line = f.readline()
+                # A line without its newline is still being written
+                if not line.endswith(b'\n'):
+                    break
+                self._offset += len(line)
+                if line.strip():
+                    events.append(_parse_event(line))
+        return events
+
+    def position(self) -> Any:
+        return self._offset
+
+    async def commit(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class KafkaFeedbackSource:
+    """Consumes feedback events from a Kafka topic
+
+    Offsets are committed only once a checkpoint that has learned the
+    events is being served, so a restart replays at most the events since
+    the last checkpoint.
+    """
+
+    def __init__(self, bootstrap_servers: str, topic: str, group_id: str):
+        self.bootstrap_servers = bootstrap_servers
+        self.topic = topic
+        self.group_id = group_id
+        self._consumer: Any = None
+
+    async def start(self, position: Any = None) -> None:
+        from aiokafka import AIOKafkaConsumer
+
+        self._consumer = AIOKafkaConsumer(
+            self.topic,
+            bootstrap_servers=self.bootstrap_servers,
+            group_id=self.group_id,
+            enable_auto_commit=False,
+            auto_offset_reset='earliest'
+        )
+        await self._consumer.start()
+
+    async def poll(self, max_records: int, timeout: float) -> List[Optional[Dict[str, Any]]]:
+        batches = await self._consumer.getmany(timeout_ms=int(timeout * 1000), max_records=max_records)
+        return [_parse_event(message.value) for messages in batches.values() for message in messages]
+
+    def position(self) -> Any:
+        # Kafka keeps the group's offsets itself
+        return None
+
+    async def commit(self) -> None:
+        await self._consumer.commit()
+
+    async def close(self) -> None:
+        if self._consumer is not None:
+            await self._consumer.stop()
+            self._consumer = None
+
+
+def _parse_event(value: bytes) -> Optional[Dict[str, Any]]:
+    """Decode one feedback event; None if it is malformed"""
+    try:
+        event = json.loads(value)
+    except ValueError:
+        return None
+    return event if isinstance(event, dict) else None
+
+
+class OnlineLearner:
+    """Keeps one model learning from feedback events while it is served
+
+    Events look like ``{"model_id": ..., "features": {...}, "label": ...}``;
+    events for other models are ignored, and clustering models need no
+    label. They are read in micro-batches and applied with ``partial_fit``
+    to a shadow copy of the model, never to the copy serving requests.
+    Every ``checkpoint_interval`` seconds or ``checkpoint_rows`` events the
+    shadow is copied, saved, uploaded to MinIO and swapped into MLEngine,
+    then the source's position is committed.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        model_name: str,
+        ml_engine: Any,
+        redis_client: redis.Redis,
+        minio_client: Minio,
+        source: Any,
+        batch_size: int = 500,
+        batch_wait: float = 1.0,
+        checkpoint_interval: float = 60.0,
+        checkpoint_rows: int = 10000,
+        work_dir: str = '/tmp/ml-online',
+        models_bucket: str = 'ml-models'
+    ):
+        self.model_id = model_id
+        self.model_name = model_name
+        self.ml_engine = ml_engine
+        self.redis = redis_client
+        self.minio_client = minio_client
+        self.source = source
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_rows = checkpoint_rows
+        self.work_dir = os.path.join(work_dir, model_id)
+        self.models_bucket = models_bucket
+        self.shadow: Any = None
+        self.metadata: Dict[str, Any] = {}
+        self.plan: Optional[FeaturePlan] = None
+        self.supervised = True
+        self.rows_learned = 0
+        self.pending_rows = 0
+        self.oldest_pending: Optional[float] = None
+        self.last_checkpoint: Optional[Dict[str, Any]] = None
+        self._checkpointed_at = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    @staticmethod
+    def checkpoint_key(model_id: str) -> str:
+        return f"online:checkpoint:{model_id}"
+
+    async def start(self, model_path: str) -> None:
+        """Load the shadow model, from the latest checkpoint if there is one, and start learning"""
+        metadata_str = await self.redis.get(f"model:metadata:{self.model_id}")
+        self.metadata = json.loads(metadata_str) if metadata_str else {}
+        framework = self.metadata.get('source_framework') or self.metadata.get('framework', 'sklearn')
+        if framework not in ('sklearn', 'pickle'):
+            raise ValueError(f"Online learning is not supported for framework {framework}")
+
+        checkpoint_str = await self.redis.get(self.checkpoint_key(self.model_id))
+        self.last_checkpoint = json.loads(checkpoint_str) if checkpoint_str else None
+        if self.last_checkpoint:
+            model_path = self.last_checkpoint['model_path']
+            self.rows_learned = self.last_checkpoint.get('rows_learned', 0)
+
+        # The served model may be an ONNX export; the shadow is always the original estimator
+        local_path = await self.ml_engine.artifact_cache.fetch(model_path)
+        self.shadow = await asyncio.to_thread(load_model_artifact, local_path, framework)
+        from sklearn.base import ClusterMixin
+
+        if not hasattr(self.shadow, 'partial_fit'):
+            raise ValueError(f"Model {self.model_id} ({type(self.shadow).__name__}) does not support partial_fit")
+        self.supervised = not isinstance(self.shadow, ClusterMixin)
+        self.plan = FeaturePlan(self.metadata)
+
+        if self.last_checkpoint:
+            # Serve the checkpoint this learner resumes from
+            await self.ml_engine.swap_model(
+                self.model_id, copy.deepcopy(self.shadow), local_path, model_path, self.last_checkpoint['metadata']
+            )
+
+        os.makedirs(self.work_dir, exist_ok=True)
+        await self.source.start(self.last_checkpoint.get('position') if self.last_checkpoint else None)
+        self._checkpointed_at = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Online learning started for model {self.model_id}")
+
+    async def stop(self) -> None:
+        """Stop learning, swapping in whatever was learned since the last checkpoint"""
+        if self._task:
+            # Not cancelled: a partial_fit thread would keep changing the shadow
+            # while it is copied, so the loop finishes its batch and exits
+            self._stopping.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.checkpoint()
+        finally:
+            await self.source.close()
+            online_pending_events.labels(model_id=self.model_id).set(0)
+            online_model_staleness.labels(model_id=self.model_id).set(0)
+        logger.info(f"Online learning stopped for model {self.model_id}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'model_id': self.model_id,
+            'running': self._task is not None and not self._task.done(),
+            'rows_learned': self.rows_learned,
+            'pending_rows': self.pending_rows,
+            'staleness_seconds': self._staleness(),
+            'version': (self.last_checkpoint or {}).get('metadata', self.metadata).get('version'),
+            'last_checkpoint_at': (self.last_checkpoint or {}).get('created_at')
+        }
+
+    def _staleness(self) -> float:
+        return round(time.time() - self.oldest_pending, 3) if self.oldest_pending else 0.0
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                events = await self.source.poll(self.batch_size, self.batch_wait)
+                if events:
+                    await self._learn(events)
+                due = time.monotonic() - self._checkpointed_at >= self.checkpoint_interval
+                if self.pending_rows >= self.checkpoint_rows or (self.pending_rows and due):
+                    await self.checkpoint()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Online learning for model {self.model_id} failed: {e}")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.batch_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            online_pending_events.labels(model_id=self.model_id).set(self.pending_rows)
+            online_model_staleness.labels(model_id=self.model_id).set(self._staleness())
+
+    async def _learn(self, events: List[Optional[Dict[str, Any]]]) -> None:
+        """Apply one micro-batch of events to the shadow model"""
+        received_at = time.time()
+        rows: List[Dict[str, Any]] = []
+        labels: List[Any] = []
+        for event in events:
+            if event is None:
+                online_events_skipped.labels(model_id=self.model_id, reason='malformed').inc()
+                continue
+            if event.get('model_id') != self.model_id:
+                continue
+            if self.supervised and event.get('label') is None:
+                online_events_skipped.labels(model_id=self.model_id, reason='unlabeled').inc()
+                continue
+            rows.append(event.get('features') or {})
+            labels.append(event.get('label'))
+        if not rows:
+            return
+
+        matrix, errors = self.plan.build_matrix(rows)
+        valid_rows = [i for i, error in enumerate(errors) if error is None]
+        if len(valid_rows) < len(rows):
+            online_events_skipped.labels(model_id=self.model_id, reason='invalid_features').inc(len(rows) - len(valid_rows))
+            if not valid_rows:
+                return
+            matrix = matrix[valid_rows]
+
+        y = np.asarray([labels[i] for i in valid_rows])
+        start_time = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._partial_fit, matrix, y)
+        except (ValueError, TypeError) as e:
+            # e.g. a class label the model wasn't trained with
+            online_events_skipped.labels(model_id=self.model_id, reason='update_failed').inc(len(valid_rows))
+            logger.warning(f"Skipped a feedback batch of {len(valid_rows)} events for model {self.model_id}: {e}")
+            return
+        online_update_duration.labels(model_id=self.model_id).observe(time.perf_counter() - start_time)
+        online_updates.labels(model_id=self.model_id).inc(len(valid_rows))
+
+        self.rows_learned += len(valid_rows)
+        self.pending_rows += len(valid_rows)
+        if self.oldest_pending is None:
+            self.oldest_pending = received_at
+
+    def _partial_fit(self, matrix: np.ndarray, y: np.ndarray) -> None:
+        # Feature plans build float32; linear models update weights of their own dtype only
+        weights = getattr(self.shadow, 'coef_', getattr(self.shadow, 'cluster_centers_', None))
+        matrix = matrix.astype(getattr(weights, 'dtype', np.float64), copy=False)
+        if self.supervised:
+            self.shadow.partial_fit(matrix, y)
+        else:
+            self.shadow.partial_fit(matrix)
+
+    async def checkpoint(self) -> None:
+        """Save the shadow model and swap a copy of it in for serving"""
+        if not self.pending_rows:
+            self._checkpointed_at = time.monotonic()
+            return
+
+        base_version = str(self.metadata.get('version', '1.0')).split('+online.')[0]
+        version = f"{base_version}+online.{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}"
+        local_path = os.path.join(self.work_dir, f"{version}.joblib")
+        # partial_fit only runs between awaits of this task, so the copy is consistent
+        snapshot = await asyncio.to_thread(self._save_snapshot, local_path)
+
+        object_name = f"{self.model_name}/online/{version}/model.joblib"
+        await asyncio.to_thread(self.minio_client.fput_object, self.models_bucket, object_name, local_path)
+        model_path = f"{self.models_bucket}/{object_name}"
+
+        # The learned weights live in the estimator, so it is served as is rather than exported to ONNX
+        metadata = {
+            **self.metadata,
+            'framework': self.metadata.get('source_framework') or self.metadata.get('framework', 'sklearn'),
+            'version': version,
+            'onnx_export': False,
+            'online_rows_learned': self.rows_learned
+        }
+        metadata.pop('source_framework', None)
+        await self.ml_engine.swap_model(self.model_id, snapshot, local_path, model_path, metadata)
+
+        self.last_checkpoint = {
+            'model_path': model_path,
+            'metadata': metadata,
+            'position': self.source.position(),
+            'rows_learned': self.rows_learned,
+            'created_at': datetime.utcnow().isoformat()
+        }
+        await self.redis.set(self.checkpoint_key(self.model_id), json.dumps(self.last_checkpoint))
+        await self.source.commit()
+
+        self.pending_rows = 0
+        self.oldest_pending = None
+        self._checkpointed_at = time.monotonic()
+        online_checkpoints.labels(model_id=self.model_id).inc()
+        await asyncio.to_thread(self._prune_snapshots, local_path)
+        logger.info(f"Checkpointed online model {self.model_id} as version {version}")
+
+    def _save_snapshot(self, local_path: str) -> Any:
+        import joblib
+
+        snapshot = copy.deepcopy(self.shadow)
+        tmp_path = f"{local_path}.part"
+        joblib.dump(snapshot, tmp_path)
+        os.replace(tmp_path, local_path)
+        return snapshot
+
+    def _prune_snapshots(self, current_path: str, keep: int = 2) -> None:
+        """Delete old local snapshots; the previous one may still be read by inference workers"""
+        paths = sorted(
+            (os.path.join(self.work_dir, name) for name in os.listdir(self.work_dir) if name.endswith('.joblib')),
+            key=os.path.getmtime
+        )
+        for path in paths[:-keep]:
+            if path != current_path:
+                os.remove(path)
+
+
+class OnlineLearningService:
+    """Starts, stops and reports the online learners of this process
+
+    Which models learn online is kept in Redis, so learners resume after a
+    restart. Run learning in a single service process: each learner swaps
+    its checkpoints into its own process's MLEngine, and other processes
+    pick a checkpoint up when they next load the model.
+    """
+
+    def __init__(
+        self,
+        ml_engine: Any,
+        redis_client: redis.Redis,
+        minio_client: Minio,
+        source: str = 'kafka',
+        kafka_servers: str = 'localhost:9092',
+        topic: str = 'ml-feedback',
+        feedback_file: str = '/tmp/ml-feedback.ndjson',
+        batch_size: int = 500,
+        batch_wait_ms: float = 1000.0,
+        checkpoint_interval: float = 60.0,
+        checkpoint_rows: int = 10000,
+        work_dir: str = '/tmp/ml-online'
+    ):
+        if source not in FEEDBACK_SOURCES:
+            raise ValueError(f"Unknown feedback source: {source}")
+        self.ml_engine = ml_engine
+        self.redis = redis_client
+        self.minio_client = minio_client
+        self.source = source
+        self.kafka_servers = kafka_servers
+        self.topic = topic
+        self.feedback_file = feedback_file
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = max(0.0, batch_wait_ms) / 1000.0
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_rows = max(1, checkpoint_rows)
+        self.work_dir = work_dir
+        self.learners: Dict[str, OnlineLearner] = {}
+
+    def _source(self, model_id: str) -> Any:
+        if self.source == 'file':
+            return FileFeedbackSource(self.feedback_file)
+        return KafkaFeedbackSource(self.kafka_servers, self.topic, group_id=f"ml-online-{model_id}")
+
+    async def start(self, model_id: str, model_name: str, model_path: str) -> Dict[str, Any]:
+        """Start learning online for a model; a no-op if it already is"""
+        learner = self.learners.get(model_id)
+        if learner is None:
+            learner = OnlineLearner(
+                model_id, model_name, self.ml_engine, self.redis, self.minio_client, self._source(model_id),
+                batch_size=self.batch_size,
+                batch_wait=self.batch_wait,
+                checkpoint_interval=self.checkpoint_interval,
+                checkpoint_rows=self.checkpoint_rows,
+                work_dir=self.work_dir
+            )
+            await learner.start(model_path)
+            self.learners[model_id] = learner
+            await self.redis.hset(LEARNERS_KEY, model_id, json.dumps({'model_name': model_name, 'model_path': model_path}))  # type: ignore
+        return learner.status()
+
+    async def stop(self, model_id: str) -> Optional[Dict[str, Any]]:
+        await self.redis.hdel(LEARNERS_KEY, model_id)  # type: ignore
+        learner = self.learners.pop(model_id, None)
+        if learner is None:
+            return None
+        await learner.stop()
+        return learner.status()
+
+    def status(self, model_id: str) -> Optional[Dict[str, Any]]:
+        learner = self.learners.get(model_id)
+        return learner.status() if learner else None
+
+    async def resume(self) -> None:
+        """Restart the learners that were running before a restart"""
+        learners: Dict[str, str] = await self.redis.hgetall(LEARNERS_KEY)  # type: ignore
+        for model_id, value in learners.items():
+            config = json.loads(value)
+            try:
+                await self.start(model_id, config['model_name'], config['model_path'])
+            except Exception as e:
+                logger.error(f"Failed to resume online learning for model {model_id}: {e}")
+
+    async def close(self) -> None:
+        """Stop every learner, checkpointing what it has learned; they resume on the next start"""
+        for learner in list(self.learners.values()):
+            try:
+                await learner.stop()
+            except Exception as e:
+                logger.error(f"Failed to stop online learning for model {learner.model_id}: {e}")
+        self.learners.clear()
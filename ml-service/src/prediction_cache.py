@@ -0,0 +1,137 @@
+"""Cache of prediction results keyed by model version and feature vector"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import numpy as np
+import redis.asyncio as redis
+from prometheus_client import Counter
+import logging
+
+logger = logging.getLogger(__name__)
+
+prediction_cache_requests = Counter(
+    'ml_prediction_cache_requests_total',
+    'Prediction cache lookups by result (local_hit, redis_hit, miss)',
+    ['model_name', 'result']
+)
+prediction_cache_saved_seconds = Counter(
+    'ml_prediction_cache_saved_seconds_total',
+    'Inference time saved by prediction cache hits',
+    ['model_name']
+)
+
+
+class PredictionCache:
+    """Two-tier cache of prediction results for repeated feature vectors
+
+    Keys combine the model id, its version and artifact, a per-model
+    generation and a BLAKE2b hash of the prepared float32 feature row, so
+    a result is only reused for exactly the same model input. Entries live
+    in a local LRU and, when ``use_redis`` is set, in Redis so replicas
+    share hits. The TTL comes from ``prediction_cache_ttl`` in the model's
+    metadata, falling back to ``default_ttl``; a TTL of 0 disables caching
+    for the model.
+
+    ``invalidate`` bumps the model's generation, which orphans all of its
+    entries. With the Redis tier the generation is shared, and other
+    replicas pick it up the next time they load the model; until then
+    their stale entries are bounded by the TTL.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        max_entries: int = 100000,
+        default_ttl: float = 0.0,
+        use_redis: bool = False
+    ):
+        self.redis = redis_client
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.use_redis = use_redis and redis_client is not None
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+
+    def ttl_for(self, metadata: Dict[str, Any]) -> float:
+        return float(metadata.get('prediction_cache_ttl', self.default_ttl) or 0)
+
+    def key(self, model_id: str, version: str, row: np.ndarray) -> str:
+        digest = hashlib.blake2b(np.ascontiguousarray(row).tobytes(), digest_size=16).hexdigest()
+        return f"prediction:cache:{model_id}:{version}:{self._generations.get(model_id, 0)}:{digest}"
+
+    async def get(self, model_id: str, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached entry: ``{'prediction': ..., 'latency_ms': ...}``"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._record_hit(model_id, 'local_hit', entry[1])
+                return entry[1]
+            del self._entries[key]
+
+        if self.use_redis:
+            try:
+                cached = await self.redis.get(key)
+            except Exception as e:
+                logger.warning(f"Prediction cache read failed: {e}")
+                cached = None
+            if cached:
+                value = json.loads(cached)
+                remaining = value.pop('expires_at', 0) - time.time()
+                if remaining > 0:
+                    self._put_local(key, value, remaining)
+                self._record_hit(model_id, 'redis_hit', value)
+                return value
+
+        prediction_cache_requests.labels(model_name=model_id, result='miss').inc()
+        return None
+
+    async def put(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        self._put_local(key, value, ttl)
+        if self.use_redis:
+            try:
+                payload = json.dumps({**value, 'expires_at': time.time() + ttl})
+                await self.redis.set(key, payload, px=max(1, int(ttl * 1000)))
+            except Exception as e:
+                logger.warning(f"Prediction cache write failed: {e}")
+
+    async def invalidate(self, model_id: str) -> None:
+        """Drop every cached result of a model by moving it to a new generation"""
+        prefix = f"prediction:cache:{model_id}:"
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+        if self.use_redis:
+            try:
+                self._generations[model_id] = int(
+                    await self.redis.incr(f"prediction:cache:generation:{model_id}")
+                )
+                return
+            except Exception as e:
+                logger.warning(f"Failed to bump shared prediction cache generation for {model_id}: {e}")
+        self._generations[model_id] = self._generations.get(model_id, 0) + 1
+
+    async def sync_generation(self, model_id: str) -> None:
+        """Adopt the shared generation of a model, e.g. after loading it"""
+        if not self.use_redis:
+            return
+        try:
+            generation = await self.redis.get(f"prediction:cache:generation:{model_id}")
+        except Exception as e:
+            logger.warning(f"Failed to read prediction cache generation for {model_id}: {e}")
+            return
+        if generation is not None:
+            self._generations[model_id] = int(generation)
+
+    def _put_local(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _record_hit(model_id: str, result: str, value: Dict[str, Any]) -> None:
+        prediction_cache_requests.labels(model_name=model_id, result=result).inc()
+        prediction_cache_saved_seconds.labels(model_name=model_id).inc(value.get('latency_ms', 0) / 1000)
@@ -0,0 +1,197 @@
+"""Write-behind logging of predictions to Postgres"""
+import asyncio
+import json
+import random
+import time
+from typing import Dict, Any, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from prometheus_client import Counter, Gauge, Histogram
+import logging
+
+from .models import Prediction
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('block', 'sample')
+
+PREDICTION_COLUMNS = (
+    'id', 'model_id', 'request_id', 'features', 'prediction', 'confidence', 'latency_ms', 'created_at'
+)
+JSON_COLUMNS = ('features', 'prediction')
+
+prediction_log_buffered = Gauge('ml_prediction_log_buffered', 'Prediction rows waiting to be written')
+prediction_log_dropped = Counter('ml_prediction_log_dropped_total', 'Prediction rows not logged because the buffer was full')
+prediction_log_failures = Counter('ml_prediction_log_flush_failures_total', 'Failed prediction log flushes')
+prediction_log_blocked = Histogram(
+    'ml_prediction_log_blocked_seconds',
+    'Time a request waited for space in the prediction log buffer',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+prediction_log_flush_rows = Histogram(
+    'ml_prediction_log_flush_rows',
+    'Rows written per prediction log flush',
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+)
+prediction_log_flush_duration = Histogram(
+    'ml_prediction_log_flush_duration_seconds',
+    'Prediction log flush time',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+
+class PredictionLogger:
+    """Buffers prediction rows in memory and writes them in bulk
+
+    Rows are flushed when ``flush_rows`` are waiting or every
+    ``flush_interval_ms``, using asyncpg's binary COPY when the engine runs
+    on asyncpg and a multi-row INSERT otherwise. When ``max_buffer_rows``
+    are waiting, ``overflow='block'`` makes callers wait for the next flush
+    and ``overflow='sample'`` keeps a uniform random sample of the rows
+    (reservoir sampling) so memory stays bounded under sustained overload.
+    """
+
+    def __init__(
+        self,
+        db_engine: AsyncEngine,
+        flush_rows: int = 500,
+        flush_interval_ms: float = 1000.0,
+        max_buffer_rows: int = 10000,
+        overflow: str = 'block'
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown prediction log overflow policy: {overflow}")
+
+        self.db_engine = db_engine
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = max(0.0, flush_interval_ms) / 1000.0
+        self.max_buffer_rows = max(self.flush_rows, max_buffer_rows)
+        self.overflow = overflow
+        self._buffer: List[Dict[str, Any]] = []
+        # Rows offered since the buffer filled up, for reservoir sampling
+        self._offered_while_full = 0
+        self._flush_requested = asyncio.Event()
+        self._space_available = asyncio.Event()
+        self._space_available.set()
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._use_copy: Optional[bool] = None
+
+    def start(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the flusher and write every buffered row"""
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+
+        await self.flush()
+        if self._buffer:
+            logger.error(f"Dropping {len(self._buffer)} prediction rows that could not be written at shutdown")
+            prediction_log_dropped.inc(len(self._buffer))
+            self._buffer = []
+            prediction_log_buffered.set(0)
+
+    async def log(self, row: Dict[str, Any]) -> None:
+        """Queue one prediction row"""
+        await self.log_many([row])
+
+    async def log_many(self, rows: List[Dict[str, Any]]) -> None:
+        """Queue prediction rows, waiting or sampling if the buffer is full"""
+        for row in rows:
+            if len(self._buffer) >= self.max_buffer_rows:
+                if self.overflow == 'sample':
+                    self._sample(row)
+                    continue
+                await self._wait_for_space()
+            self._buffer.append(row)
+
+        prediction_log_buffered.set(len(self._buffer))
+        if len(self._buffer) >= self.flush_rows:
+            self._flush_requested.set()
+
+    def _sample(self, row: Dict[str, Any]) -> None:
+        """Replace a random buffered row so the buffer stays a uniform sample"""
+        self._offered_while_full += 1
+        self._flush_requested.set()
+        seen = self.max_buffer_rows + self._offered_while_full
+        slot = random.randrange(seen)
+        if slot < self.max_buffer_rows:
+            self._buffer[slot] = row
+        prediction_log_dropped.inc()
+
+    async def _wait_for_space(self) -> None:
+        start_time = time.perf_counter()
+        while len(self._buffer) >= self.max_buffer_rows:
+            self._space_available.clear()
+            self._flush_requested.set()
+            await self._space_available.wait()
+        prediction_log_blocked.observe(time.perf_counter() - start_time)
+
+    async def _run(self) -> None:
+        """Flush loop; wakes on a full batch or after the flush interval"""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write all buffered rows"""
+        async with self._flush_lock:
+            while self._buffer:
+                rows = self._buffer[:self.max_buffer_rows]
+                del self._buffer[:len(rows)]
+                self._offered_while_full = 0
+                prediction_log_buffered.set(len(self._buffer))
+                self._space_available.set()
+
+                start_time = time.perf_counter()
+                try:
+                    await self._write(rows)
+                except Exception as e:
+                    prediction_log_failures.inc()
+                    logger.error(f"Failed to write {len(rows)} prediction rows: {e}")
+                    self._requeue(rows)
+                    return
+
+                prediction_log_flush_duration.observe(time.perf_counter() - start_time)
+                prediction_log_flush_rows.observe(len(rows))
+
+    def _requeue(self, rows: List[Dict[str, Any]]) -> None:
+        """Put rows from a failed flush back, keeping the buffer within its cap"""
+        room = max(0, self.max_buffer_rows - len(self._buffer))
+        if len(rows) > room:
+            prediction_log_dropped.inc(len(rows) - room)
+        self._buffer[:0] = rows[:room]
+        prediction_log_buffered.set(len(self._buffer))
+
+    async def _write(self, rows: List[Dict[str, Any]]) -> None:
+        async with self.db_engine.connect() as conn:
+            if self._use_copy is None:
+                self._use_copy = self.db_engine.dialect.driver == 'asyncpg'
+
+            if self._use_copy:
+                raw = await conn.get_raw_connection()
+                records = [
+                    tuple(
+                        json.dumps(row.get(column)) if column in JSON_COLUMNS else row.get(column)
+                        for column in PREDICTION_COLUMNS
+                    )
+                    for row in rows
+                ]
+                await raw.driver_connection.copy_records_to_table(
+                    Prediction.__tablename__, records=records, columns=list(PREDICTION_COLUMNS)
+                )
+                return
+
+            await conn.execute(insert(Prediction), rows)
+            await conn.commit()
@@ -50,6 +50,43 @@ class PredictionResponse(BaseModel):
     timestamp: datetime
 
 
+class HyperparameterSearch(BaseModel):
+    """Hyperparameter search settings for a training job
+
+    ``space`` maps each hyperparameter to a list of choices, or to a range
+    such as ``{"type": "float", "low": 0.0001, "high": 10, "log": true}``
+    (types are int, float and categorical). The search stops after
+    ``n_trials`` trials or ``timeout_seconds``, whichever comes first.
+
+    Every search worker process loads its own copy of the dataset, so
+    more than one worker needs ``max_rows`` to bound that memory; without
+    it the search runs in a single process.
+    """
+    space: Dict[str, Any]
+    n_trials: Optional[int] = 20
+    timeout_seconds: Optional[float] = None
+    workers: Optional[int] = None
+    cv_folds: int = 3
+    metric: Optional[str] = None
+    pruner: str = "median"
+    max_rows: Optional[int] = None
+
+
+class PointInTimeFeatures(BaseModel):
+    """Feature store features to join onto a training dataset
+
+    Each row gets the values its ``entity_column`` entity had at the row's
+    ``timestamp_column``, from the offline feature history. Values older
+    than ``max_age_seconds`` at that time are left empty. Without
+    ``feature_columns``, training uses every dataset column except the
+    label and these two, plus the joined features.
+    """
+    feature_names: List[str]
+    entity_column: str = "entity_id"
+    timestamp_column: str = "event_timestamp"
+    max_age_seconds: Optional[float] = None
+
+
 class TrainingRequest(BaseModel):
     """Request schema for training jobs"""
     model_type: str
@@ -58,6 +95,28 @@ class TrainingRequest(BaseModel):
     validation_data_path: Optional[str] = None
     hyperparameters: Optional[Dict[str, Any]] = {}
     framework: str = "sklearn"
+    label_column: str = "label"
+    feature_columns: Optional[List[str]] = None
+    input_format: Optional[str] = None
+    chunk_rows: Optional[int] = None
+    epochs: int = 1
+    search: Optional[HyperparameterSearch] = None
+    point_in_time: Optional[PointInTimeFeatures] = None
+
+
+class ScoringJobRequest(BaseModel):
+    """Request schema for bulk scoring jobs
+
+    Paths are ``bucket/object`` in MinIO, or local paths when they start
+    with ``/`` or ``file://``.
+    """
+    model_id: str
+    input_path: str
+    output_path: str
+    input_format: Optional[str] = None
+    id_columns: Optional[List[str]] = []
+    partition_by: Optional[List[str]] = []
+    chunk_rows: Optional[int] = None
 
 
 class ModelMetrics(BaseModel):
@@ -65,6 +124,7 @@ class ModelMetrics(BaseModel):
     model_id: str
     total_predictions: int
     average_latency_ms: float
+    p50_latency_ms: Optional[float] = None
     p95_latency_ms: float
     p99_latency_ms: float
     average_confidence: Optional[float] = None
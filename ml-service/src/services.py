@@ -1,15 +1,16 @@
 """Service layer for ML operations"""
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert, update
 import uuid
 from datetime import datetime
 
-from .models import MLModel, Prediction
+from .models import MLModel, Prediction, TrainingJob
 from .schemas import (
     ModelCreateRequest, ModelResponse, PredictionRequest,
     PredictionResponse, TrainingRequest, ModelMetrics
 )
+from .training import validate_search, validate_training_request
 
 
 class ModelService:
@@ -69,13 +70,15 @@ class ModelService:
     async def get_model_metrics(self, model_id: str, time_range: str) -> Optional[ModelMetrics]:
         """Get model metrics"""
         if self.ml_engine:
-            stats = await self.ml_engine.get_model_stats(model_id)
+            stats = await self.ml_engine.get_model_stats(model_id, time_range)
             return ModelMetrics(
                 model_id=model_id,
                 total_predictions=stats.get('total_predictions', 0),
                 average_latency_ms=stats.get('average_latency_ms', 0),
+                p50_latency_ms=stats.get('p50_latency_ms', 0),
                 p95_latency_ms=stats.get('p95_latency_ms', 0),
                 p99_latency_ms=stats.get('p99_latency_ms', 0),
+                average_confidence=stats.get('average_confidence'),
                 time_range=time_range
             )
         return None
@@ -96,11 +99,38 @@ class ModelService:
 class PredictionService:
     """Service for predictions"""
 
-    def __init__(self, db: AsyncSession, ml_engine: Any = None, feature_store: Any = None, redis_client: Any = None):
+    def __init__(
+        self,
+        db: AsyncSession,
+        ml_engine: Any = None,
+        feature_store: Any = None,
+        redis_client: Any = None,
+        prediction_logger: Any = None
+    ):
         self.db = db
         self.ml_engine = ml_engine
         self.feature_store = feature_store
         self.redis = redis_client
+        self.prediction_logger = prediction_logger
+
+    def _audited(self, model_id: str) -> bool:
+        """Models with 'audit_logging' in their metadata log predictions synchronously"""
+        if self.prediction_logger is None:
+            return True
+        metadata = self.ml_engine.model_metadata.get(model_id, {}) if self.ml_engine else {}
+        return bool(metadata.get('audit_logging', False))
+
+    async def _log_predictions(self, rows: List[Dict[str, Any]]) -> None:
+        """Write prediction rows, committing audited models before returning"""
+        audited, buffered = [], []
+        for row in rows:
+            (audited if self._audited(row['model_id']) else buffered).append(row)
+
+        if buffered:
+            await self.prediction_logger.log_many(buffered)
+        if audited:
+            await self.db.execute(insert(Prediction), audited)
+            await self.db.commit()
 
     async def predict(self, model_id: str, features: Dict[str, Any], request_id: Optional[str] = None) -> PredictionResponse:
         """Make a prediction"""
@@ -111,55 +141,197 @@ class PredictionService:
 
         latency_ms = (datetime.utcnow() - start_time).total_seconds() * 1000
 
-        # Store prediction in database
-        prediction = Prediction(
-            id=str(uuid.uuid4()),
-            model_id=model_id,
-            request_id=request_id,
-            features=features,
-            prediction=result['prediction'],
-            confidence=result['prediction'].get('confidence'),
-            latency_ms=latency_ms
-        )
-        self.db.add(prediction)
-        await self.db.commit()
+        # Store prediction, buffered unless the model is audited
+        prediction = {
+            'id': str(uuid.uuid4()),
+            'model_id': model_id,
+            'request_id': request_id,
+            'features': features,
+            'prediction': result['prediction'],
+            'confidence': result['prediction'].get('confidence'),
+            'latency_ms': latency_ms,
+            'created_at': datetime.utcnow()
+        }
+        await self._log_predictions([prediction])
 
         return PredictionResponse(
-            prediction_id=prediction.id,
+            prediction_id=prediction['id'],
             model_id=model_id,
             prediction=result['prediction'],
             confidence=result['prediction'].get('confidence'),
             latency_ms=latency_ms,
-            timestamp=prediction.created_at
+            timestamp=prediction['created_at']
         )
 
+    async def predict_batch(self, requests: List[PredictionRequest]) -> List[Union[PredictionResponse, Dict[str, Any]]]:
+        """Make predictions for many requests, one inference call per model
+
+        Features for all requests are fetched up front, requests are grouped
+        by model, and every successful prediction is logged in a single
+        bulk write. Rows that fail (e.g. missing features) are reported
+        individually without failing the rest of the batch.
+        """
+        results: List[Any] = [None] * len(requests)
+
+        # Fetch features for every request in one round trip
+        stored_features: List[Dict[str, Any]] = [{} for _ in requests]
+        if self.feature_store:
+            stored_features = await self.feature_store.get_features_bulk([
+                (request.entity_id, request.feature_ids) for request in requests
+            ])
+        all_features = [
+            {**stored, **request.features}
+            for stored, request in zip(stored_features, requests)
+        ]
+
+        # Group request indices by model
+        by_model: Dict[str, List[int]] = {}
+        for i, request in enumerate(requests):
+            by_model.setdefault(request.model_id, []).append(i)
+
+        prediction_rows = []
+        created_at = datetime.utcnow()
+        for model_id, indices in by_model.items():
+            try:
+                model_results = await self.ml_engine.predict_batch(
+                    model_id, [all_features[i] for i in indices]
+                )
+            except Exception as e:
+                model_results = [e] * len(indices)
+
+            for i, result in zip(indices, model_results):
+                request = requests[i]
+                if isinstance(result, Exception):
+                    results[i] = {
+                        "request_id": request.request_id,
+                        "error": str(result),
+                        "status": "failed"
+                    }
+                    continue
+
+                latency_ms = result['metadata']['latency_ms']
+                prediction_id = str(uuid.uuid4())
+                prediction_rows.append({
+                    'id': prediction_id,
+                    'model_id': model_id,
+                    'request_id': request.request_id,
+                    'features': all_features[i],
+                    'prediction': result['prediction'],
+                    'confidence': result['prediction'].get('confidence'),
+                    'latency_ms': latency_ms,
+                    'created_at': created_at
+                })
+                results[i] = PredictionResponse(
+                    prediction_id=prediction_id,
+                    model_id=model_id,
+                    prediction=result['prediction'],
+                    confidence=result['prediction'].get('confidence'),
+                    latency_ms=latency_ms,
+                    timestamp=created_at
+                )
+
+        # Store all predictions in one bulk write
+        if prediction_rows:
+            await self._log_predictions(prediction_rows)
+
+        return results
+
 
 class TrainingService:
     """Service for model training"""
 
-    def __init__(self, db: AsyncSession, ml_engine: Any = None, model_registry: Any = None, feature_store: Any = None):
+    def __init__(
+        self,
+        db: AsyncSession,
+        ml_engine: Any = None,
+        model_registry: Any = None,
+        feature_store: Any = None,
+        training_executor: Any = None
+    ):
         self.db = db
         self.ml_engine = ml_engine
         self.model_registry = model_registry
         self.feature_store = feature_store
+        self.training_executor = training_executor
 
-    async def start_training(self, request: TrainingRequest) -> Any:
-        """Start a training job"""
-        job = type('TrainingJob', (), {
-            'id': str(uuid.uuid4()),
-            'status': 'started',
-            'estimated_duration': 300
-        })()
-        return job
+    async def start_training(self, request: TrainingRequest) -> TrainingJob:
+        """Queue a training job; a training executor on some node picks it up"""
+        validate_training_request(request.model_type, request.framework)
+        if request.chunk_rows is not None and request.chunk_rows <= 0:
+            raise ValueError("chunk_rows must be positive")
+        if request.search:
+            validate_search(request.search.model_dump())
+        if request.point_in_time:
+            if not (self.feature_store and self.feature_store.history):
+                raise ValueError("Feature history is not configured")
+            if not request.point_in_time.feature_names:
+                raise ValueError("point_in_time needs at least one feature name")
 
-    async def monitor_training(self, job_id: str) -> None:
-        """Monitor a training job"""
-        pass
+        job = TrainingJob(
+            id=str(uuid.uuid4()),
+            model_name=request.model_name,
+            model_type=request.model_type,
+            framework=request.framework,
+            status='queued',
+            progress=0.0,
+            training_data_path=request.training_data_path,
+            validation_data_path=request.validation_data_path,
+            hyperparameters=request.hyperparameters or {},
+            options={
+                'label_column': request.label_column,
+                'feature_columns': request.feature_columns,
+                'input_format': request.input_format,
+                'chunk_rows': request.chunk_rows,
+                'epochs': request.epochs,
+                'search': request.search.model_dump() if request.search else None,
+                'point_in_time': request.point_in_time.model_dump() if request.point_in_time else None
+            }
+        )
+        self.db.add(job)
+        await self.db.commit()
+
+        if self.training_executor:
+            self.training_executor.wake()
+        return job
 
     async def get_training_job(self, job_id: str) -> Optional[Dict[str, Any]]:
         """Get training job status"""
+        job = await self.db.get(TrainingJob, job_id)
+        return self._job_status(job) if job else None
+
+    async def cancel_training(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job, or ask the node running it to stop"""
+        result = await self.db.execute(
+            update(TrainingJob)
+            .where(TrainingJob.id == job_id, TrainingJob.status == 'queued')
+            .values(status='cancelled', finished_at=datetime.utcnow())
+        )
+        if not result.rowcount:
+            await self.db.execute(
+                update(TrainingJob)
+                .where(TrainingJob.id == job_id, TrainingJob.status == 'running')
+                .values(cancel_requested=True)
+            )
+        await self.db.commit()
+
+        job = await self.db.get(TrainingJob, job_id, populate_existing=True)
+        return self._job_status(job) if job else None
+
+    @staticmethod
+    def _job_status(job: TrainingJob) -> Dict[str, Any]:
         return {
-            'job_id': job_id,
-            'status': 'completed',
-            'progress': 100
+            'job_id': job.id,
+            'status': job.status,
+            'stage': job.stage,
+            'progress': job.progress,
+            'model_name': job.model_name,
+            'model_type': job.model_type,
+            'framework': job.framework,
+            'model_id': job.model_id,
+            'metrics': job.metrics,
+            'error': job.error,
+            'cancel_requested': job.cancel_requested,
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at
         }
@@ -0,0 +1,239 @@
+"""Streaming batch scoring over NDJSON and Arrow IPC request bodies"""
+import io
+import json
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+from pydantic import ValidationError
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+import logging
+
+from .schemas import PredictionRequest, PredictionResponse
+
+logger = logging.getLogger(__name__)
+
+NDJSON = 'application/x-ndjson'
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+
+# Columns of an Arrow request that are not features
+ARROW_REQUEST_COLUMNS = ('model_id', 'request_id', 'entity_id', 'feature_ids')
+
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes], max_line_bytes: int = 1024 * 1024) -> AsyncIterator[Dict[str, Any]]:
+    """Parse newline-delimited JSON objects from a byte stream"""
+    pending = b''
+    async for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        if len(pending) > max_line_bytes:
+            raise ValueError(f"NDJSON line longer than {max_line_bytes} bytes")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if pending.strip():
+        yield json.loads(pending)
+
+
+async def iter_arrow_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """Decode an Arrow IPC stream incrementally, yielding one dict per row
+
+    Messages are parsed as soon as their bytes have arrived, so only the
+    record batch being decoded is held in memory. A failed parse means the
+    message is incomplete; parsing is retried once the buffer has doubled,
+    which keeps the total work linear in the stream size.
+    """
+    import pyarrow as pa
+
+    parts: List[bytes] = []
+    size = 0
+    retry_at = 0
+    schema = None
+
+    async def messages(final: bool) -> AsyncIterator[Any]:
+        nonlocal parts, size, retry_at
+        if size < retry_at and not final:
+            return
+        data = b''.join(parts)
+        reader = pa.BufferReader(data)
+        while True:
+            position = reader.tell()
+            try:
+                message = pa.ipc.read_message(reader)
+            except EOFError:
+                parts, size, retry_at = [], 0, 0
+                return
+            except (pa.ArrowInvalid, OSError):
+                # Short metadata or body: wait for more bytes
+                if final:
+                    raise ValueError("Truncated Arrow IPC stream")
+                rest = data[position:]
+                parts, size, retry_at = [rest], len(rest), 2 * len(rest)
+                return
+            yield message
+
+    async def batches(final: bool) -> AsyncIterator[Any]:
+        nonlocal schema
+        async for message in messages(final):
+            if message.type == 'schema':
+                schema = pa.ipc.read_schema(message)
+            elif message.type == 'record batch':
+                if schema is None:
+                    raise ValueError("Arrow record batch before schema")
+                yield pa.ipc.read_record_batch(message, schema)
+            else:
+                raise ValueError(f"Unsupported Arrow IPC message: {message.type}")
+
+    async for chunk in chunks:
+        parts.append(chunk)
+        size += len(chunk)
+        async for batch in batches(final=False):
+            for row in batch.to_pylist():
+                yield row
+    async for batch in batches(final=True):
+        for row in batch.to_pylist():
+            yield row
+
+
+def row_to_request(row: Dict[str, Any], default_model_id: Optional[str], arrow: bool) -> PredictionRequest:
+    """Build a PredictionRequest; Arrow rows carry their features as plain columns"""
+    if not isinstance(row, dict):
+        raise ValueError(f"Expected a request object, got {type(row).__name__}")
+    if arrow:
+        features = {name: value for name, value in row.items() if name not in ARROW_REQUEST_COLUMNS}
+        row = {name: row[name] for name in ARROW_REQUEST_COLUMNS if row.get(name) is not None}
+        row['features'] = features
+    if default_model_id and not row.get('model_id'):
+        row = {**row, 'model_id': default_model_id}
+    row.setdefault('features', {})
+    return PredictionRequest.model_validate(row)
+
+
+def build_requests(
+    rows: List[Any],
+    default_model_id: Optional[str],
+    arrow: bool
+) -> Tuple[List[Optional[PredictionRequest]], List[Optional[Dict[str, Any]]]]:
+    """Build one request per row, with a failed result in place of rows that don't validate"""
+    requests: List[Optional[PredictionRequest]] = []
+    failures: List[Optional[Dict[str, Any]]] = []
+    for row in rows:
+        try:
+            requests.append(row_to_request(row, default_model_id, arrow))
+            failures.append(None)
+        except (ValidationError, ValueError) as e:
+            request_id = row.get('request_id') if isinstance(row, dict) else None
+            requests.append(None)
+            failures.append({
+                "request_id": request_id if isinstance(request_id, str) else None,
+                "error": str(e),
+                "status": "failed"
+            })
+    return requests, failures
+
+
+async def iter_chunks(rows: AsyncIterator[Dict[str, Any]], chunk_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class NdjsonEncoder:
+    """Encodes results as one JSON object per line"""
+
+    media_type = NDJSON
+
+    def encode(self, requests: List[Optional[PredictionRequest]], results: List[Any]) -> bytes:
+        lines = [
+            json.dumps({'request_id': request.request_id, **result.model_dump(mode='json')})
+            if isinstance(result, PredictionResponse) else json.dumps(result)
+            for request, result in zip(requests, results)
+        ]
+        return ('\n'.join(lines) + '\n').encode()
+
+    def error(self, message: str) -> bytes:
+        return (json.dumps({'error': message, 'status': 'aborted'}) + '\n').encode()
+
+    def close(self) -> bytes:
+        return b''
+
+
+class ArrowEncoder:
+    """Encodes results as record batches of one Arrow IPC stream"""
+
+    media_type = ARROW_STREAM
+
+    def __init__(self):
+        import pyarrow as pa
+
+        self.pa = pa
+        self.schema = pa.schema([
+            ('request_id', pa.string()),
+            ('model_id', pa.string()),
+            ('prediction_id', pa.string()),
+            ('class', pa.int64()),
+            ('value', pa.float64()),
+            ('confidence', pa.float64()),
+            ('probabilities', pa.list_(pa.float64())),
+            ('latency_ms', pa.float64()),
+            ('error', pa.string()),
+        ])
+        self.sink = io.BytesIO()
+        self.writer = pa.ipc.new_stream(self.sink, self.schema)
+
+    def _drain(self) -> bytes:
+        data = self.sink.getvalue()
+        self.sink.seek(0)
+        self.sink.truncate()
+        return data
+
+    def encode(self, requests: List[Optional[PredictionRequest]], results: List[Any]) -> bytes:
+        rows = []
+        for request, result in zip(requests, results):
+            if isinstance(result, PredictionResponse):
+                rows.append({
+                    'request_id': request.request_id,
+                    'model_id': result.model_id,
+                    'prediction_id': result.prediction_id,
+                    'class': result.prediction.get('class'),
+                    'value': result.prediction.get('value'),
+                    'confidence': result.confidence,
+                    'probabilities': result.prediction.get('probabilities'),
+                    'latency_ms': result.latency_ms,
+                })
+            else:
+                rows.append({
+                    'request_id': result.get('request_id'),
+                    'model_id': request.model_id if request is not None else None,
+                    'error': result.get('error')
+                })
+        self.writer.write_batch(self.pa.RecordBatch.from_pylist(rows, schema=self.schema))
+        return self._drain()
+
+    def error(self, message: str) -> bytes:
+        """A final row with only ``error`` set marks an aborted stream"""
+        self.writer.write_batch(self.pa.RecordBatch.from_pylist([{'error': message}], schema=self.schema))
+        return self.close()
+
+    def close(self) -> bytes:
+        self.writer.close()
+        return self._drain()
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """A streaming response that may keep reading the request body while it streams
+
+    StreamingResponse listens for a client disconnect by calling
+    ``receive`` concurrently, which would swallow request body messages
+    still being read by the response generator. This variant only sends;
+    a disconnect surfaces as a failed send or read instead.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
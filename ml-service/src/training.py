@@ -0,0 +1,892 @@
+"""Model training in worker processes, driven by a durable job queue"""
+import asyncio
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import numpy as np
+import redis.asyncio as redis
+from minio import Minio
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+import logging
+
+from .datasets import detect_format, iter_dataset, stage_dataset
+from .models import MLModel, TrainingJob
+
+logger = logging.getLogger(__name__)
+
+# model_type -> scikit-learn estimator ("module:Class"), imported in the worker
+ESTIMATORS: Dict[str, str] = {
+    'logistic_regression': 'sklearn.linear_model:LogisticRegression',
+    'linear_regression': 'sklearn.linear_model:LinearRegression',
+    'ridge': 'sklearn.linear_model:Ridge',
+    'sgd_classifier': 'sklearn.linear_model:SGDClassifier',
+    'sgd_regressor': 'sklearn.linear_model:SGDRegressor',
+    'random_forest': 'sklearn.ensemble:RandomForestClassifier',
+    'random_forest_regressor': 'sklearn.ensemble:RandomForestRegressor',
+    'gradient_boosting': 'sklearn.ensemble:HistGradientBoostingClassifier',
+    'gradient_boosting_regressor': 'sklearn.ensemble:HistGradientBoostingRegressor',
+    'mlp': 'sklearn.neural_network:MLPClassifier',
+    'mlp_regressor': 'sklearn.neural_network:MLPRegressor',
+    'naive_bayes': 'sklearn.naive_bayes:GaussianNB',
+}
+
+TRAINABLE_FRAMEWORKS = ('sklearn',)
+
+# Pruners for hyperparameter search; trials report one step per CV fold
+SEARCH_PRUNERS = ('median', 'asha', 'hyperband', 'none')
+
+# Share of a search job's progress spent on trials; the rest is the final fit
+SEARCH_PROGRESS = 0.8
+
+training_duration = Histogram('ml_training_duration_seconds', 'ML training duration', ['model_type'])
+training_jobs_finished = Counter(
+    'ml_training_jobs_total',
+    'Finished training jobs by status (completed, failed, cancelled)',
+    ['model_type', 'status']
+)
+training_jobs_running = Gauge('ml_training_jobs_running', 'Training jobs running on this node')
+
+
+class TrainingCancelled(Exception):
+    """Raised once a training job has been cancelled, in the worker or on the node running it"""
+
+
+class TrainingJobLost(Exception):
+    """Raised when this node no longer owns a job, e.g. it was requeued as stale"""
+
+
+def validate_training_request(model_type: str, framework: str) -> None:
+    if framework not in TRAINABLE_FRAMEWORKS:
+        raise ValueError(f"Training is not supported for framework {framework}")
+    if model_type not in ESTIMATORS:
+        raise ValueError(f"Unknown model_type {model_type}; expected one of {', '.join(sorted(ESTIMATORS))}")
+
+
+def validate_search(search: Dict[str, Any]) -> None:
+    """Check a hyperparameter search before it is queued"""
+    from sklearn.metrics import get_scorer_names
+
+    if not search.get('space'):
+        raise ValueError("search.space must define at least one hyperparameter")
+    for name, dist in search['space'].items():
+        if isinstance(dist, list):
+            if not dist:
+                raise ValueError(f"Hyperparameter {name} has no choices")
+            continue
+        if not isinstance(dist, dict):
+            raise ValueError(f"Hyperparameter {name} must be a list of choices or a range")
+        kind = dist.get('type', 'float')
+        if kind == 'categorical':
+            if not dist.get('choices'):
+                raise ValueError(f"Hyperparameter {name} has no choices")
+        elif kind in ('int', 'float'):
+            if 'low' not in dist or 'high' not in dist or dist['low'] > dist['high']:
+                raise ValueError(f"Hyperparameter {name} needs low <= high")
+        else:
+            raise ValueError(f"Unknown type {kind} for hyperparameter {name}")
+
+    if not search.get('n_trials') and not search.get('timeout_seconds'):
+        raise ValueError("search needs n_trials or timeout_seconds")
+    for field in ('n_trials', 'timeout_seconds', 'workers', 'max_rows'):
+        if search.get(field) is not None and search[field] <= 0:
+            raise ValueError(f"search.{field} must be positive")
+    if (search.get('workers') or 1) > 1 and not search.get('max_rows'):
+        raise ValueError("search.max_rows is required with more than one worker: each loads its own copy of the data")
+    if search['cv_folds'] < 2:
+        raise ValueError("search.cv_folds must be at least 2")
+    if search['pruner'] not in SEARCH_PRUNERS:
+        raise ValueError(f"Unknown pruner {search['pruner']}; expected one of {', '.join(SEARCH_PRUNERS)}")
+    if search.get('metric') and search['metric'] not in get_scorer_names():
+        raise ValueError(f"Unknown metric {search['metric']}")
+
+
+# Worker process side
+
+class _Reporter:
+    """Sends progress to the parent, at most once per ``interval`` seconds per stage
+
+    Every call is also a cancellation point.
+    """
+
+    def __init__(self, events: Any, cancel: Any, interval: float = 1.0):
+        self.events = events
+        self.cancel = cancel
+        self.interval = interval
+        self.stage: Optional[str] = None
+        self.sent_at = 0.0
+
+    def __call__(self, stage: str, progress: float) -> None:
+        if self.cancel.is_set():
+            raise TrainingCancelled()
+        now = time.monotonic()
+        if stage != self.stage or now - self.sent_at >= self.interval:
+            self.events.put(('progress', {'stage': stage, 'progress': progress}))
+            self.stage = stage
+            self.sent_at = now
+
+
+def build_estimator(model_type: str, hyperparameters: Dict[str, Any], threads: int) -> Any:
+    module, name = ESTIMATORS[model_type].split(':')
+    estimator_class = getattr(importlib.import_module(module), name)
+    params = dict(hyperparameters or {})
+    if 'n_jobs' in estimator_class().get_params() and 'n_jobs' not in params:
+        params['n_jobs'] = threads
+    return estimator_class(**params)
+
+
+def _features(table: Any, feature_columns: List[str]) -> np.ndarray:
+    """Feature columns as a float32 matrix; nulls become NaN"""
+    return np.column_stack([
+        table.column(name).to_numpy(zero_copy_only=False).astype(np.float32)
+        for name in feature_columns
+    ])
+
+
+def _labels(table: Any, label_column: str) -> np.ndarray:
+    if label_column not in table.column_names:
+        raise ValueError(f"Label column {label_column} not found")
+    return table.column(label_column).to_numpy(zero_copy_only=False)
+
+
+def load_dataset(
+    spec: Dict[str, Any],
+    report: Callable[[str, float], None],
+    max_rows: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """Load the training dataset as a float32 feature matrix and labels
+
+    Chunks are reduced to their feature and label columns as they are
+    read, so peak memory is about the size of the matrix itself.
+    """
+    label_column = spec['label_column']
+    feature_columns: Optional[List[str]] = spec.get('feature_columns')
+    columns = feature_columns + [label_column] if feature_columns else None
+    X_parts: List[np.ndarray] = []
+    y_parts: List[np.ndarray] = []
+    rows = 0
+    for table, fraction in iter_dataset(spec['training_path'], spec['training_format'], spec['chunk_rows'], columns):
+        if feature_columns is None:
+            feature_columns = [name for name in table.column_names if name != label_column]
+        if max_rows is not None:
+            table = table.slice(0, max_rows - rows)
+        X_parts.append(_features(table, feature_columns))
+        y_parts.append(_labels(table, label_column))
+        rows += table.num_rows
+        report('loading', fraction)
+        if max_rows is not None and rows >= max_rows:
+            break
+    if not rows:
+        raise ValueError("Training dataset is empty")
+    return np.concatenate(X_parts), np.concatenate(y_parts), feature_columns
+
+
+def _collect_classes(path: str, dataset_format: str, chunk_rows: int, label_column: str, report: _Reporter) -> np.ndarray:
+    """All class labels of a dataset, reading only the label column"""
+    classes: set = set()
+    for table, fraction in iter_dataset(path, dataset_format, chunk_rows, [label_column]):
+        classes.update(np.unique(_labels(table, label_column)).tolist())
+        report('scanning labels', 0.1 * fraction)
+    return np.array(sorted(classes))
+
+
+def evaluate(estimator: Any, spec: Dict[str, Any], feature_columns: List[str], classifier: bool, report: _Reporter) -> Dict[str, Any]:
+    """Validation metrics computed chunk by chunk"""
+    label_column = spec['label_column']
+    n = correct = 0
+    sum_y = sum_y2 = sse = 0.0
+    for table, fraction in iter_dataset(
+        spec['validation_path'], spec['validation_format'], spec['chunk_rows'], feature_columns + [label_column]
+    ):
+        y = _labels(table, label_column)
+        predicted = estimator.predict(_features(table, feature_columns))
+        n += len(y)
+        if classifier:
+            correct += int((predicted == y).sum())
+        else:
+            y = y.astype(np.float64)
+            sum_y += float(y.sum())
+            sum_y2 += float((y ** 2).sum())
+            sse += float(((predicted - y) ** 2).sum())
+        report('validating', 0.9 + 0.05 * fraction)
+
+    if not n:
+        return {'validation_rows': 0}
+    if classifier:
+        return {'validation_rows': n, 'accuracy': correct / n}
+    sst = sum_y2 - sum_y ** 2 / n
+    return {
+        'validation_rows': n,
+        'rmse': float(np.sqrt(sse / n)),
+        'r2': 1.0 - sse / sst if sst > 0 else None
+    }
+
+
+def train_model(spec: Dict[str, Any], report: _Reporter) -> Dict[str, Any]:
+    """Train and save a model as described by ``spec``; runs in the worker process
+
+    Estimators with ``partial_fit`` learn chunk by chunk for ``epochs``
+    passes, so memory is bounded by the chunk size. Other estimators need
+    the whole matrix: chunks are reduced to float32 feature columns while
+    loading, then fitted at once.
+    """
+    import joblib
+    from sklearn.base import is_classifier
+
+    path = spec['training_path']
+    dataset_format = spec['training_format']
+    chunk_rows = spec['chunk_rows']
+    label_column = spec['label_column']
+    feature_columns: Optional[List[str]] = spec.get('feature_columns')
+    columns = feature_columns + [label_column] if feature_columns else None
+
+    hyperparameters = dict(spec['hyperparameters'])
+    search = None
+    if spec.get('search'):
+        search = summarize_search(spec)
+        hyperparameters.update(search['best_params'])
+
+    estimator = build_estimator(spec['model_type'], hyperparameters, spec['threads'])
+    classifier = is_classifier(estimator)
+    if search:
+        search['metric'] = search['metric'] or ('accuracy' if classifier else 'r2')
+    rows = 0
+
+    if hasattr(estimator, 'partial_fit'):
+        classes = None
+        if classifier:
+            classes = _collect_classes(path, dataset_format, chunk_rows, label_column, report)
+        epochs = max(1, spec['epochs'])
+        for epoch in range(epochs):
+            for table, fraction in iter_dataset(path, dataset_format, chunk_rows, columns):
+                if feature_columns is None:
+                    feature_columns = [name for name in table.column_names if name != label_column]
+                    columns = feature_columns + [label_column]
+                X, y = _features(table, feature_columns), _labels(table, label_column)
+                if classifier:
+                    estimator.partial_fit(X, y, classes=classes)
+                else:
+                    estimator.partial_fit(X, y)
+                if epoch == 0:
+                    rows += len(y)
+                report('training', 0.1 + 0.8 * (epoch + fraction) / epochs)
+    else:
+        X, y, feature_columns = load_dataset(spec, lambda stage, fraction: report(stage, 0.4 * fraction))
+        rows = len(y)
+        report('fitting', 0.4)
+        estimator.fit(X, y)
+        del X, y
+
+    if not rows:
+        raise ValueError("Training dataset is empty")
+
+    metrics: Dict[str, Any] = {'training_rows': rows}
+    if search:
+        metrics['search'] = search
+    if spec.get('validation_path'):
+        metrics.update(evaluate(estimator, spec, feature_columns, classifier, report))
+
+    report('saving', 0.95)
+    joblib.dump(estimator, spec['output_path'])
+    return {
+        'artifact': spec['output_path'],
+        'feature_names': feature_columns,
+        'hyperparameters': hyperparameters,
+        'task': 'classification' if classifier else 'regression',
+        'metrics': metrics
+    }
+
+
+def _study_storage(spec: Dict[str, Any]) -> Any:
+    """The job's study store, a journal file that all of its search workers append to"""
+    import optuna
+
+    return optuna.storages.JournalStorage(optuna.storages.JournalFileStorage(spec['study_path']))
+
+
+def _pruner(name: str) -> Any:
+    import optuna
+
+    if name == 'median':
+        return optuna.pruners.MedianPruner(n_startup_trials=5)
+    if name == 'asha':
+        return optuna.pruners.SuccessiveHalvingPruner()
+    if name == 'hyperband':
+        return optuna.pruners.HyperbandPruner()
+    return optuna.pruners.NopPruner()
+
+
+def _suggest(trial: Any, name: str, dist: Any) -> Any:
+    if isinstance(dist, list):
+        return trial.suggest_categorical(name, dist)
+    kind = dist.get('type', 'float')
+    if kind == 'categorical':
+        return trial.suggest_categorical(name, dist['choices'])
+    if kind == 'int':
+        return trial.suggest_int(name, dist['low'], dist['high'], step=dist.get('step', 1), log=dist.get('log', False))
+    return trial.suggest_float(name, dist['low'], dist['high'], step=dist.get('step'), log=dist.get('log', False))
+
+
+def search_hyperparameters(spec: Dict[str, Any], report: _Reporter) -> None:
+    """Run hyperparameter search trials until the budget is spent; runs in each search worker
+
+    Workers share the study through its journal file, and each loads the
+    dataset once for all of its trials. Every trial is scored on the same
+    cross-validation folds, reporting the running mean after each fold, so
+    the pruner can stop bad trials before all folds are fitted. Scores are
+    scikit-learn scorers, which are all maximized.
+    """
+    import optuna
+    from optuna.trial import TrialState
+    from sklearn.base import is_classifier
+    from sklearn.metrics import get_scorer
+    from sklearn.model_selection import KFold, StratifiedKFold
+
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    search = spec['search']
+    n_trials = search.get('n_trials')
+    timeout = search.get('timeout_seconds')
+    started_at = time.monotonic()
+
+    X, y, _ = load_dataset(spec, lambda stage, fraction: report(stage, 0.1 * fraction), search.get('max_rows'))
+    classifier = is_classifier(build_estimator(spec['model_type'], spec['hyperparameters'], spec['threads']))
+    splitter = StratifiedKFold if classifier else KFold
+    folds = list(splitter(n_splits=search['cv_folds'], shuffle=True, random_state=0).split(X, y))
+    scorer = get_scorer(search.get('metric') or ('accuracy' if classifier else 'r2'))
+    study = optuna.create_study(
+        study_name=spec['study_name'], storage=_study_storage(spec), direction='maximize',
+        pruner=_pruner(search['pruner']), load_if_exists=True
+    )
+    progress = 0.0
+
+    def objective(trial: Any) -> float:
+        params = dict(spec['hyperparameters'])
+        for name, dist in search['space'].items():
+            params[name] = _suggest(trial, name, dist)
+        scores: List[float] = []
+        for step, (train_index, test_index) in enumerate(folds):
+            report('searching', 0.1 + 0.9 * progress)
+            estimator = build_estimator(spec['model_type'], params, spec['threads'])
+            estimator.fit(X[train_index], y[train_index])
+            scores.append(scorer(estimator, X[test_index], y[test_index]))
+            trial.report(float(np.mean(scores)), step)
+            if trial.should_prune():
+                raise optuna.TrialPruned()
+        return float(np.mean(scores))
+
+    def on_trial_finished(study: Any, trial: Any) -> None:
+        nonlocal progress
+        fractions = []
+        if n_trials:
+            finished = study.get_trials(
+                deepcopy=False, states=(TrialState.COMPLETE, TrialState.PRUNED, TrialState.FAIL)
+            )
+            fractions.append(len(finished) / n_trials)
+        if timeout:
+            fractions.append((time.monotonic() - started_at) / timeout)
+        progress = min(1.0, max(fractions))
+        report('searching', 0.1 + 0.9 * progress)
+
+    callbacks = [on_trial_finished]
+    if n_trials:
+        # n_trials counts across all workers of the study
+        callbacks.append(optuna.study.MaxTrialsCallback(n_trials, states=None))
+    # Invalid hyperparameter combinations fail their trial, not the search
+    study.optimize(objective, n_trials=n_trials, timeout=timeout, callbacks=callbacks, catch=(ValueError, TypeError))
+
+
+def summarize_search(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Best trial and trial counts of a finished search"""
+    import optuna
+    from optuna.trial import TrialState
+
+    study = optuna.load_study(study_name=spec['study_name'], storage=_study_storage(spec))
+    trials = study.get_trials(deepcopy=False)
+    counts = {state: sum(1 for trial in trials if trial.state == state) for state in TrialState}
+    if not counts[TrialState.COMPLETE]:
+        raise ValueError(f"No hyperparameter search trial completed ({counts[TrialState.FAIL]} failed)")
+    best = study.best_trial
+    return {
+        'metric': spec['search'].get('metric'),
+        'best_score': best.value,
+        'best_params': best.params,
+        'best_trial': best.number,
+        'trials_completed': counts[TrialState.COMPLETE],
+        'trials_pruned': counts[TrialState.PRUNED],
+        'trials_failed': counts[TrialState.FAIL]
+    }
+
+
+def _worker_process(work: Callable[[Dict[str, Any], _Reporter], Any], spec: Dict[str, Any], events: Any, cancel: Any) -> None:
+    """Entry point of a training worker; the outcome of ``work`` is sent back on ``events``"""
+    from threadpoolctl import threadpool_limits
+
+    # Serving comes first: run at lower priority with capped native threads
+    try:
+        os.nice(spec['nice'])
+    except OSError:
+        pass
+
+    try:
+        with threadpool_limits(spec['threads']):
+            result = work(spec, _Reporter(events, cancel))
+        events.put(('completed', result))
+    except TrainingCancelled:
+        events.put(('cancelled', None))
+    except Exception as e:
+        events.put(('failed', f"{type(e).__name__}: {e}"))
+
+
+# API process side
+
+class TrainingExecutor:
+    """Runs queued training jobs in worker processes, at most ``max_jobs`` per node
+
+    Jobs are rows of ``training_jobs`` and any replica may claim a queued
+    one, so submitted jobs survive restarts. Each job runs in its own
+    spawned process at lowered priority (``nice``) with BLAS/OpenMP capped
+    at ``threads``, which keeps training off the event loop and leaves CPU
+    for inference. A fresh process per job rather than a long-lived pool
+    means a running job can be stopped, and its memory goes back to the OS
+    when it ends.
+
+    Jobs with a hyperparameter search first run trials in up to
+    ``search_workers`` single-threaded processes sharing a journal-file
+    study, then fit the best parameters on the whole dataset. Each search
+    process loads its own copy of at most ``max_rows`` rows, so searches
+    without ``max_rows`` use one process; size ``search_workers`` like
+    ``threads``, as the CPU left over after inference.
+
+    Jobs with ``point_in_time`` features first get those features joined
+    onto their datasets from the feature history, as of each row's
+    timestamp, into a staged Parquet file that training then reads.
+
+    The node running a job heartbeats it every ``poll_interval`` for as
+    long as the job runs; jobs whose heartbeat is older than
+    ``stale_after`` (their node died) are queued again, and a node that
+    finds it no longer owns a job stops running it. Cancelling a
+    running job asks the worker to stop at its next chunk and terminates it
+    after ``cancel_grace`` seconds. Finished models are uploaded to MinIO,
+    added to ``ml_models`` and registered with the model registry.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        minio_client: Minio,
+        redis_client: redis.Redis,
+        model_registry: Any = None,
+        max_jobs: int = 1,
+        threads: int = 2,
+        nice: int = 10,
+        chunk_rows: int = 50000,
+        work_dir: str = '/tmp/ml-training',
+        poll_interval: float = 2.0,
+        stale_after: float = 300.0,
+        cancel_grace: float = 10.0,
+        models_bucket: str = 'ml-models',
+        search_workers: int = 1,
+        feature_history: Any = None
+    ):
+        self.session_factory = session_factory
+        self.minio_client = minio_client
+        self.redis = redis_client
+        self.model_registry = model_registry
+        self.max_jobs = max_jobs
+        self.threads = threads
+        self.nice = nice
+        self.chunk_rows = chunk_rows
+        self.work_dir = work_dir
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.cancel_grace = cancel_grace
+        self.models_bucket = models_bucket
+        self.search_workers = max(1, search_workers)
+        self.feature_history = feature_history
+        self.node = f"{socket.gethostname()}:{os.getpid()}"
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._poll_loop())
+
+    def wake(self) -> None:
+        """Look for queued jobs now instead of at the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def close(self) -> None:
+        """Stop polling and hand running jobs back to the queue"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        running = list(self._running.values())
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    async def _poll_loop(self) -> None:
+        while True:
+            try:
+                await self._requeue_stale()
+                while len(self._running) < self.max_jobs:
+                    job = await self._claim()
+                    if job is None:
+                        break
+                    self._running[job.id] = asyncio.create_task(self._run(job))
+            except Exception as e:
+                logger.error(f"Training queue poll failed: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self) -> Optional[TrainingJob]:
+        """Take the oldest queued job; the conditional update makes the claim atomic"""
+        async with self.session_factory() as db:
+            candidates = (await db.execute(
+                select(TrainingJob.id)
+                .where(TrainingJob.status == 'queued')
+                .order_by(TrainingJob.created_at)
+                .limit(self.max_jobs + 4)
+            )).scalars().all()
+            for job_id in candidates:
+                now = datetime.utcnow()
+                result = await db.execute(
+                    update(TrainingJob)
+                    .where(TrainingJob.id == job_id, TrainingJob.status == 'queued')
+                    .values(
+                        status='running', node=self.node, stage='starting', progress=0.0,
+                        error=None, started_at=now, heartbeat_at=now
+                    )
+                )
+                await db.commit()
+                if result.rowcount == 1:
+                    return await db.get(TrainingJob, job_id)
+        return None
+
+    async def _requeue_stale(self) -> None:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(TrainingJob)
+                .where(TrainingJob.status == 'running', TrainingJob.heartbeat_at < cutoff)
+                .values(status='queued', node=None, stage=None, progress=0.0)
+            )
+            await db.commit()
+            if result.rowcount:
+                logger.warning(f"Requeued {result.rowcount} training jobs with a stale heartbeat")
+
+    async def _update(self, job: TrainingJob, **values: Any) -> bool:
+        """Update a job this node runs and heartbeat it; returns whether cancellation was requested
+
+        Raises TrainingJobLost when the job is no longer this run's: it was
+        requeued, and perhaps claimed again, by this node or another. A
+        claim sets ``started_at``, so it tells two runs on one node apart.
+        """
+        job_id = job.id
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(TrainingJob)
+                .where(
+                    TrainingJob.id == job_id,
+                    TrainingJob.node == self.node,
+                    TrainingJob.started_at == job.started_at
+                )
+                .values(heartbeat_at=datetime.utcnow(), **values)
+            )
+            await db.commit()
+            if not result.rowcount:
+                raise TrainingJobLost(job_id)
+            cancel_requested = (await db.execute(
+                select(TrainingJob.cancel_requested).where(TrainingJob.id == job_id)
+            )).scalar_one_or_none()
+        return bool(cancel_requested)
+
+    async def _heartbeat(self, job: TrainingJob, run: asyncio.Task, lost: asyncio.Event) -> None:
+        """Heartbeat a job while it runs; stops the run once the job is no longer this run's"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self._update(job)
+            except TrainingJobLost:
+                lost.set()
+                run.cancel()
+                return
+            except Exception as e:
+                logger.error(f"Training job {job.id} heartbeat failed: {e}")
+
+    async def _step(self, job: TrainingJob, **values: Any) -> None:
+        """Move a job on to its next step, unless cancellation was requested"""
+        if await self._update(job, **values):
+            raise TrainingCancelled()
+
+    async def _finish(self, job: TrainingJob, **values: Any) -> None:
+        """Record how a job ended, unless another node has taken it over"""
+        try:
+            await self._update(job, **values)
+        except TrainingJobLost:
+            logger.warning(f"Training job {job.id} was taken over by another run; not recording its outcome here")
+
+    async def _run(self, job: TrainingJob) -> None:
+        # A per-run directory: a requeued job may be claimed again before this run has cleaned up
+        job_dir = os.path.join(self.work_dir, f"{job.id}-{uuid.uuid4().hex[:8]}")
+        started_at = time.perf_counter()
+        training_jobs_running.inc()
+        lost = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(job, asyncio.current_task(), lost))
+        try:
+            options = job.options or {}
+            os.makedirs(job_dir, exist_ok=True)
+            await self._step(job, stage='staging data')
+            spec = {
+                'model_type': job.model_type,
+                'hyperparameters': job.hyperparameters or {},
+                'label_column': options.get('label_column', 'label'),
+                'feature_columns': options.get('feature_columns'),
+                'chunk_rows': options.get('chunk_rows') or self.chunk_rows,
+                'epochs': options.get('epochs', 1),
+                'training_path': await stage_dataset(
+                    self.minio_client, job.training_data_path, os.path.join(job_dir, 'training')
+                ),
+                'training_format': options.get('input_format') or detect_format(job.training_data_path),
+                'output_path': os.path.join(job_dir, 'model.joblib'),
+                'threads': self.threads,
+                'nice': self.nice
+            }
+            if job.validation_data_path:
+                spec['validation_path'] = await stage_dataset(
+                    self.minio_client, job.validation_data_path, os.path.join(job_dir, 'validation')
+                )
+                spec['validation_format'] = options.get('input_format') or detect_format(job.validation_data_path)
+            if options.get('point_in_time'):
+                await self._step(job, stage='joining features')
+                await self._join_features(spec, options['point_in_time'], job_dir)
+
+            status, payload = 'completed', None
+            search = options.get('search')
+            if search:
+                spec.update(search=search, study_path=os.path.join(job_dir, 'study.log'), study_name=job.id)
+                # Each worker holds its own copy of the data; only a bounded sample is copied
+                workers = min(
+                    self.search_workers,
+                    search.get('workers') or self.search_workers,
+                    search.get('n_trials') or self.search_workers
+                ) if search.get('max_rows') else 1
+                logger.info(f"Training job {job.id}: searching hyperparameters in {workers} processes")
+                await self._step(job, stage='searching')
+                # Trials run in parallel processes, so each one gets a single thread
+                status, payload = await self._run_workers(
+                    job, search_hyperparameters, [{**spec, 'threads': 1}] * workers, (0.0, SEARCH_PROGRESS)
+                )
+            if status == 'completed':
+                await self._step(job)
+                logger.info(f"Training job {job.id}: training {job.model_type}")
+                status, payload = await self._run_workers(
+                    job, train_model, [spec], (SEARCH_PROGRESS if search else 0.0, 1.0)
+                )
+            now = datetime.utcnow()
+            if status == 'completed':
+                await self._step(job, stage='registering', progress=95.0)
+                model_id = await self._register(job, payload)
+                await self._finish(
+                    job, status='completed', stage=None, progress=100.0,
+                    metrics=payload['metrics'], model_id=model_id, finished_at=now
+                )
+                training_duration.labels(model_type=job.model_type).observe(time.perf_counter() - started_at)
+                logger.info(f"Training job {job.id} completed as model {model_id}")
+            else:
+                await self._finish(
+                    job, status=status, stage=None, finished_at=now,
+                    error=payload if status == 'failed' else None
+                )
+                logger.info(f"Training job {job.id} {status}{': ' + payload if payload else ''}")
+            training_jobs_finished.labels(model_type=job.model_type, status=status).inc()
+        except TrainingCancelled:
+            logger.info(f"Training job {job.id} cancelled")
+            training_jobs_finished.labels(model_type=job.model_type, status='cancelled').inc()
+            await self._finish(job, status='cancelled', stage=None, finished_at=datetime.utcnow())
+        except TrainingJobLost:
+            logger.warning(f"Training job {job.id} is no longer run by this node; stopping")
+        except asyncio.CancelledError:
+            if lost.is_set():
+                logger.warning(f"Training job {job.id} is no longer run by this node; stopping")
+                return
+            # Shutting down: give the job back to the queue for another node or restart
+            await self._finish(job, status='queued', node=None, stage=None, progress=0.0)
+            raise
+        except Exception as e:
+            logger.error(f"Training job {job.id} failed: {e}")
+            training_jobs_finished.labels(model_type=job.model_type, status='failed').inc()
+            await self._finish(job, status='failed', stage=None, error=str(e), finished_at=datetime.utcnow())
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            training_jobs_running.dec()
+            await asyncio.to_thread(shutil.rmtree, job_dir, True)
+            if self._running.get(job.id) is asyncio.current_task():
+                del self._running[job.id]
+            self.wake()
+
+    async def _join_features(self, spec: Dict[str, Any], point_in_time: Dict[str, Any], job_dir: str) -> None:
+        """Swap the staged datasets for copies with point-in-time features joined on"""
+        if self.feature_history is None:
+            raise ValueError("Feature history is not configured")
+        # Values still buffered would be missing from labels observed just now
+        await self.feature_history.flush()
+
+        feature_names = point_in_time['feature_names']
+        entity_column = point_in_time.get('entity_column', 'entity_id')
+        timestamp_column = point_in_time.get('timestamp_column', 'event_timestamp')
+        for dataset in ('training', 'validation'):
+            if f'{dataset}_path' not in spec:
+                continue
+            output_path = os.path.join(job_dir, f'{dataset}-features.parquet')
+            await asyncio.to_thread(
+                self.feature_history.build_training_set,
+                spec[f'{dataset}_path'], spec[f'{dataset}_format'], output_path, feature_names,
+                entity_column, timestamp_column, point_in_time.get('max_age_seconds'),
+                spec['chunk_rows']
+            )
+            spec[f'{dataset}_path'], spec[f'{dataset}_format'] = output_path, 'parquet'
+
+        feature_columns = spec['feature_columns']
+        if feature_columns is None:
+            # Every column but the label, as without a join, except the join keys
+            import pyarrow.parquet as pq
+
+            excluded = (spec['label_column'], entity_column, timestamp_column)
+            columns = (await asyncio.to_thread(pq.read_schema, spec['training_path'])).names
+            spec['feature_columns'] = [name for name in columns if name not in excluded]
+        else:
+            spec['feature_columns'] = feature_columns + [name for name in feature_names if name not in feature_columns]
+
+    async def _run_workers(
+        self,
+        job: TrainingJob,
+        work: Callable[[Dict[str, Any], _Reporter], Any],
+        specs: List[Dict[str, Any]],
+        progress_range: Tuple[float, float]
+    ) -> Tuple[str, Any]:
+        """Run ``work`` in one worker process per spec until all of them finish"""
+        # Spawn rather than fork: the parent runs an event loop and thread pools
+        context = multiprocessing.get_context('spawn')
+        events = context.Queue()
+        cancel = context.Event()
+        processes = [
+            context.Process(target=_worker_process, args=(work, spec, events, cancel), daemon=True)
+            for spec in specs
+        ]
+        try:
+            for process in processes:
+                process.start()
+            return await self._monitor(job, processes, events, cancel, progress_range)
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                if process.pid is not None:
+                    await asyncio.to_thread(process.join, 5)
+            events.close()
+
+    async def _monitor(
+        self,
+        job: TrainingJob,
+        processes: List[Any],
+        events: Any,
+        cancel: Any,
+        progress_range: Tuple[float, float] = (0.0, 1.0)
+    ) -> Tuple[str, Any]:
+        """Relay worker progress to the job row until every worker reports an outcome
+
+        The first failure or cancellation ends the run; otherwise the outcome
+        is the last worker's. Worker progress is mapped onto ``progress_range``.
+        """
+        low, high = progress_range
+        remaining = len(processes)
+        heartbeat_at = 0.0
+        terminate_at: Optional[float] = None
+        while True:
+            # Counted before waiting: a worker that has exited already flushed its outcome to the queue
+            alive = sum(1 for process in processes if process.is_alive())
+            try:
+                kind, payload = await asyncio.to_thread(events.get, True, 1.0)
+            except queue.Empty:
+                kind, payload = None, None
+                if alive < remaining:
+                    exitcode = next((process.exitcode for process in processes if process.exitcode), None)
+                    return 'failed', f"Training process exited with code {exitcode}"
+
+            if kind == 'completed':
+                remaining -= 1
+                if not remaining:
+                    return kind, payload
+            elif kind is not None and kind != 'progress':
+                return kind, payload
+
+            now = time.monotonic()
+            values = {}
+            if kind == 'progress':
+                values = {
+                    'stage': payload['stage'],
+                    'progress': round(100.0 * (low + (high - low) * payload['progress']), 1)
+                }
+            if values or now - heartbeat_at >= self.poll_interval:
+                heartbeat_at = now
+                if await self._update(job, **values) and terminate_at is None:
+                    cancel.set()
+                    terminate_at = now + self.cancel_grace
+
+            # Workers only see the cancel flag between chunks; a long fit is terminated
+            if terminate_at is not None and now >= terminate_at:
+                return 'cancelled', None
+
+    async def _register(self, job: TrainingJob, result: Dict[str, Any]) -> str:
+        """Upload a trained model and register it; returns the new model id"""
+        version = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        object_name = f"{job.model_name}/{version}/model.joblib"
+        await asyncio.to_thread(self.minio_client.fput_object, self.models_bucket, object_name, result['artifact'])
+
+        metadata = {
+            'framework': job.framework,
+            'version': version,
+            'task': result['task'],
+            'feature_names': result['feature_names'],
+            'hyperparameters': result['hyperparameters'],
+            'metrics': result['metrics'],
+            'training_job_id': job.id
+        }
+        model_id = str(uuid.uuid4())
+        async with self.session_factory() as db:
+            db.add(MLModel(
+                id=model_id,
+                name=job.model_name,
+                version=version,
+                framework=job.framework,
+                model_type=job.model_type,
+                artifacts_path=f"{self.models_bucket}/{object_name}",
+                metadata=metadata,
+                is_active=False
+            ))
+            await db.commit()
+
+        # MLEngine reads a model's metadata from Redis when it loads it
+        await self.redis.set(f"model:metadata:{model_id}", json.dumps(metadata))
+        if self.model_registry:
+            await self.model_registry.register_model(model_id, job.model_name, version, job.framework, metadata)
+        return model_id
@@ -0,0 +1,131 @@
+"""Content-negotiated request and response encodings for prediction endpoints
+
+Bodies are decoded from JSON (with orjson) or MessagePack according to
+Content-Type, and the batch endpoint also accepts an Arrow IPC stream.
+Responses are encoded as requested by the Accept header. Encoded
+responses are serialized straight from the service's objects, which were
+validated when they were built, so they skip FastAPI's response-model
+round trip (dump, re-validate, serialize).
+"""
+from datetime import date, datetime
+from typing import Dict, Any, List
+import numpy as np
+import orjson
+import msgpack
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from .streaming import ARROW_STREAM, ArrowEncoder, row_to_request
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+MSGPACK_TYPES = (MSGPACK, 'application/x-msgpack')
+
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+def _adapter(type_: Any) -> TypeAdapter:
+    adapter = _adapters.get(type_)
+    if adapter is None:
+        adapter = _adapters[type_] = TypeAdapter(type_)
+    return adapter
+
+
+def _default(value: Any) -> Any:
+    """Fallback encoder for values orjson and msgpack don't handle natively"""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, Exception):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _is_msgpack(content_type: str) -> bool:
+    return content_type.split(';')[0].strip() in MSGPACK_TYPES
+
+
+def request_body(type_: Any, arrow: bool = False) -> Dict[str, Any]:
+    """``openapi_extra`` documenting a body that is decoded by ``decode_body``"""
+    schema = _adapter(type_).json_schema()
+    content = {JSON: {'schema': schema}, MSGPACK: {'schema': schema}}
+    if arrow:
+        content[ARROW_STREAM] = {'schema': {'type': 'string', 'format': 'binary'}}
+    return {'requestBody': {'required': True, 'content': content}}
+
+
+def decode_body(body: bytes, content_type: str, type_: Any) -> Any:
+    """Decode and validate a JSON or MessagePack body as ``type_``
+
+    Validation errors are raised as FastAPI's RequestValidationError, so
+    clients get the usual 422 response.
+    """
+    try:
+        if _is_msgpack(content_type):
+            payload = msgpack.unpackb(body, raw=False)
+        else:
+            payload = orjson.loads(body)
+    except (ValueError, msgpack.UnpackException) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed request body: {e}")
+
+    try:
+        return _adapter(type_).validate_python(payload)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, 'loc': ('body', *error['loc'])} for error in e.errors()]
+        )
+
+
+async def read_body(request: Request, type_: Any) -> Any:
+    return decode_body(await request.body(), request.headers.get('content-type', ''), type_)
+
+
+def read_arrow_requests(body: bytes) -> List[Any]:
+    """Decode an Arrow IPC stream of requests; features are plain columns"""
+    import pyarrow as pa
+
+    try:
+        rows = pa.ipc.open_stream(body).read_all().to_pylist()
+        return [row_to_request(row, None, arrow=True) for row in rows]
+    except (pa.ArrowInvalid, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed Arrow stream: {e}")
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+
+def response_type(request: Request, arrow: bool = False) -> str:
+    """Pick the response encoding from the Accept header"""
+    accept = request.headers.get('accept', '')
+    if any(media_type in accept for media_type in MSGPACK_TYPES):
+        return MSGPACK
+    if arrow and ARROW_STREAM in accept:
+        return ARROW_STREAM
+    return JSON
+
+
+def encode(content: Any, media_type: str) -> bytes:
+    if media_type == MSGPACK:
+        return msgpack.packb(content, default=_default, use_bin_type=True)
+    return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def render(content: Any, media_type: str, status_code: int = 200) -> Response:
+    return Response(encode(content, media_type), status_code=status_code, media_type=media_type)
+
+
+def render_arrow(requests: List[Any], results: List[Any]) -> Response:
+    encoder = ArrowEncoder()
+    return Response(encoder.encode(requests, results) + encoder.close(), media_type=ARROW_STREAM)
+
+
+def wants_encoded(media_type: str, validate_responses: bool) -> bool:
+    """Binary formats always bypass the response model; JSON only when validation is off"""
+    return media_type != JSON or not validate_responses
+
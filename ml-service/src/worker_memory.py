@@ -0,0 +1,51 @@
+"""Memory usage of the current worker process"""
+import os
+import resource
+from typing import Dict
+from prometheus_client import Gauge
+
+worker_memory_bytes = Gauge(
+    'ml_worker_memory_bytes',
+    'Memory of this worker process: rss, pss (shared pages split between processes), shared and private',
+    ['pid', 'kind']
+)
+
+# smaps_rollup field -> reported kind
+SMAPS_FIELDS = {
+    'Rss': 'rss',
+    'Pss': 'pss',
+    'Shared_Clean': 'shared_clean',
+    'Shared_Dirty': 'shared_dirty',
+    'Private_Clean': 'private_clean',
+    'Private_Dirty': 'private_dirty',
+}
+
+
+def read_worker_memory(pid: int = 0) -> Dict[str, int]:
+    """Memory of a process in bytes from /proc/<pid>/smaps_rollup
+
+    PSS divides each shared page by the number of processes mapping it, so
+    summing PSS across workers gives their real combined footprint.
+    Without /proc only the peak RSS is available.
+    """
+    path = f"/proc/{pid or 'self'}/smaps_rollup"
+    try:
+        with open(path) as f:
+            lines = f.readlines()
+    except OSError:
+        return {'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+    memory = {}
+    for line in lines:
+        parts = line.split()
+        kind = SMAPS_FIELDS.get(parts[0].rstrip(':')) if parts else None
+        if kind:
+            memory[kind] = int(parts[1]) * 1024
+    return memory
+
+
+def update_worker_memory() -> None:
+    """Refresh the worker memory gauges, e.g. right before a metrics scrape"""
+    pid = str(os.getpid())
+    for kind, value in read_worker_memory().items():
+        worker_memory_bytes.labels(pid=pid, kind=kind).set(value)
@@ -0,0 +1,61 @@
+"""Every caller of a micro-batch must get a result or an error"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.batching import MicroBatcher
+
+
+def _submit_all(run_batch, rows):
+    async def run():
+        batcher = MicroBatcher('model', run_batch, max_batch_size=8, max_wait_ms=20)
+        outcomes = await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(row) for row in rows), return_exceptions=True),
+            timeout=3
+        )
+        await batcher.close()
+        return outcomes
+
+    return asyncio.run(run())
+
+
+def test_rows_of_different_widths_run_as_separate_batches():
+    calls = []
+
+    async def run_batch(matrix):
+        calls.append(matrix.shape)
+        if matrix.shape[1] != 3:
+            raise ValueError("Model expects 3 features")
+        return matrix.sum(axis=1).tolist()
+
+    outcomes = _submit_all(run_batch, [
+        np.array([[1.0, 2.0, 3.0]]),
+        np.array([[1.0, 2.0]]),
+        np.array([[4.0, 5.0, 6.0]]),
+    ])
+
+    assert outcomes[0] == 6.0
+    assert isinstance(outcomes[1], ValueError)
+    assert outcomes[2] == 15.0
+    assert sorted(calls) == [(1, 2), (2, 3)]
+
+
+def test_missing_results_fail_the_remaining_callers():
+    async def run_batch(matrix):
+        return ['first']
+
+    outcomes = _submit_all(run_batch, [np.array([[1.0]]), np.array([[2.0]])])
+
+    assert outcomes[0] == 'first'
+    assert isinstance(outcomes[1], ValueError)
+    assert "1 results for 2 rows" in str(outcomes[1])
+
+
+def test_run_batch_errors_reach_every_caller():
+    async def run_batch(matrix):
+        raise RuntimeError("boom")
+
+    outcomes = _submit_all(run_batch, [np.array([[1.0]]), np.array([[2.0]])])
+
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
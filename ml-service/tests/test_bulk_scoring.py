@@ -0,0 +1,135 @@
+"""Bulk scoring jobs over local Parquet and CSV files"""
+import asyncio
+import glob
+import os
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+pytest.importorskip("sklearn")
+
+import joblib
+from pyarrow import csv
+from sklearn.linear_model import LinearRegression
+
+from src.bulk_scoring import BulkScoringService
+from src.schemas import ScoringJobRequest
+
+DATASET = pa.table({
+    'id': [0, 1, 2, 3, 4, 5],
+    'x1': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+    'x2': [0.5, 1.0, None, 2.0, 2.5, 3.0],
+})
+
+
+class _Engine:
+    """Serves one local model artifact, like MLEngine.serving_artifact"""
+
+    def __init__(self, path):
+        self.path = path
+
+    async def serving_artifact(self, model_id, model_path):
+        return self.path, {'framework': 'sklearn', 'feature_names': ['x1', 'x2']}
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    model = LinearRegression().fit([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]], [0.0, 1.0, 2.0])
+    path = str(tmp_path / 'model.joblib')
+    joblib.dump(model, path)
+    return path
+
+
+def _score(tmp_path, model_path, input_path, chunk_rows):
+    server = fakeredis.FakeServer()
+    request = ScoringJobRequest(
+        model_id='model', input_path=input_path, output_path=str(tmp_path / 'output'),
+        id_columns=['id'], chunk_rows=chunk_rows
+    )
+
+    async def run():
+        service = BulkScoringService(
+            _Engine(model_path), fakeredis.aioredis.FakeRedis(server=server, decode_responses=True), None,
+            workers=2, work_dir=str(tmp_path / 'work')
+        )
+        job_id = await service.create_job(request)
+        assert (await service.get_job(job_id))['status'] == 'queued'
+        await service.run_job(job_id, request, 'unused')
+        return job_id, await service.get_job(job_id)
+
+    job_id, job = asyncio.run(run())
+    return server, job_id, job, sorted(glob.glob(os.path.join(tmp_path / 'output', '*.parquet')))
+
+
+def _read(files):
+    return pa.concat_tables([pq.read_table(path) for path in files])
+
+
+def _assert_scores(output):
+    assert output.column('id').to_pylist() == [0, 1, 2, 3, 4, 5]
+    values = output.column('value').to_pylist()
+    assert values[2] is None
+    assert values[:2] + values[3:] == pytest.approx([2.0, 4.0, 8.0, 10.0, 12.0])
+    errors = output.column('error').to_pylist()
+    assert errors[2] == "Missing required feature: x2"
+    assert errors[:2] + errors[3:] == [None] * 5
+
+
+def test_scores_parquet_row_groups_in_order(tmp_path, model_path):
+    input_path = str(tmp_path / 'input.parquet')
+    pq.write_table(DATASET, input_path, row_group_size=3)
+
+    _, _, job, files = _score(tmp_path, model_path, input_path, chunk_rows=2)
+
+    _assert_scores(_read(files))
+    assert len(files) == 4
+    assert job['status'] == 'completed'
+    assert job['progress'] == 100.0
+    assert (job['rows_done'], job['rows_failed']) == (6, 1)
+    assert (job['chunks_done'], job['chunks_total']) == (2, 2)
+
+
+def test_scores_csv_chunks_in_order(tmp_path, model_path):
+    input_path = str(tmp_path / 'input.csv')
+    csv.write_csv(DATASET, input_path)
+
+    _, _, job, files = _score(tmp_path, model_path, input_path, chunk_rows=2)
+
+    _assert_scores(_read(files))
+    assert len(files) == 3
+    assert job['status'] == 'completed'
+    assert (job['rows_done'], job['rows_failed']) == (6, 1)
+    assert (job['chunks_done'], job['chunks_total']) == (3, 3)
+
+
+def test_failed_job_records_its_error(tmp_path, model_path):
+    _, _, job, files = _score(tmp_path, model_path, str(tmp_path / 'missing.parquet'), chunk_rows=2)
+
+    assert job['status'] == 'failed'
+    assert 'missing.parquet' in job['error']
+    assert job['progress'] is None
+    assert files == []
+
+
+def test_job_status_endpoint(tmp_path, model_path, monkeypatch):
+    main = pytest.importorskip("src.main")
+    from fastapi.testclient import TestClient
+
+    input_path = str(tmp_path / 'input.parquet')
+    pq.write_table(DATASET, input_path, row_group_size=3)
+    server, job_id, _, _ = _score(tmp_path, model_path, input_path, chunk_rows=2)
+
+    # A fresh client: the one used by the job belonged to a closed event loop
+    monkeypatch.setattr(main, 'bulk_scoring', BulkScoringService(
+        None, fakeredis.aioredis.FakeRedis(server=server, decode_responses=True), None
+    ))
+    client = TestClient(main.app)
+
+    job = client.get(f"/scoring-jobs/{job_id}").json()
+    assert job['job_id'] == job_id
+    assert job['status'] == 'completed'
+    assert job['progress'] == 100.0
+    assert (job['rows_done'], job['rows_failed'], job['chunks_done'], job['chunks_total']) == (6, 1, 2, 2)
+    assert client.get("/scoring-jobs/unknown").status_code == 404
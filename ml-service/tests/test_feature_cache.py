@@ -0,0 +1,165 @@
+"""The L1 feature cache must never serve a value that was overwritten"""
+import asyncio
+import types
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from src import feature_cache
+from src.feature_cache import FeatureCache
+from src.feature_store import FeatureStore
+
+GROUPS = {'profile': ['age', 'city'], 'activity': ['clicks']}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(feature_cache, 'time', types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_entries_expire_after_their_group_ttl(clock):
+    cache = FeatureCache({'profile': 60, 'activity': 5}, GROUPS)
+    cache.put('u1', {'age': 30, 'clicks': 7})
+
+    clock.now += 10
+    hits, misses = cache.get('u1', ['age', 'clicks'])
+
+    assert hits == {'age': 30}
+    assert misses == ['clicks']
+
+
+def test_only_groups_with_a_ttl_are_cached(clock):
+    cache = FeatureCache({'profile': 60}, GROUPS)
+    cache.put('u1', {'age': 30, 'clicks': 7, 'unknown': 1})
+
+    hits, misses = cache.get('u1', ['age', 'clicks', 'unknown'])
+
+    assert hits == {'age': 30}
+    assert misses == ['clicks', 'unknown']
+
+
+def test_least_recently_used_entries_are_evicted_first(clock):
+    cache = FeatureCache({'profile': 60}, GROUPS)
+    cache.put('u1', {'age': 1})
+    cache.put('u2', {'age': 2})
+    cache.max_bytes = cache.size_bytes
+    cache.get('u1', ['age'])
+
+    cache.put('u3', {'age': 3})
+
+    assert cache.get('u1', ['age'])[0] == {'age': 1}
+    assert cache.get('u2', ['age'])[0] == {}
+    assert cache.get('u3', ['age'])[0] == {'age': 3}
+    assert cache.size_bytes <= cache.max_bytes
+
+
+def test_stale_generation_is_not_cached(clock):
+    cache = FeatureCache({'profile': 60}, GROUPS)
+    generation = cache.generation
+    cache.invalidate('u1', ['age'])
+
+    cache.put('u1', {'age': 30}, generation)
+
+    assert cache.get('u1', ['age'])[0] == {}
+
+
+def _store(redis_client):
+    return FeatureStore(redis_client, None, feature_groups=GROUPS, cache_ttls={'profile': 60})
+
+
+def test_writes_and_deletes_invalidate_the_local_cache():
+    async def run():
+        store = _store(fakeredis.aioredis.FakeRedis(decode_responses=True))
+        await store.store_features('u1', {'age': 30, 'city': 'Sofia'})
+        assert await store.get_features(['age', 'city'], 'u1') == {'age': 30, 'city': 'Sofia'}
+
+        await store.store_features('u1', {'age': 31})
+        after_write = await store.get_features(['age', 'city'], 'u1')
+
+        await store.delete_features('u1', ['city'])
+        after_delete = await store.get_features(['age', 'city'], 'u1')
+
+        await store.delete_features('u1')
+        return after_write, after_delete, await store.get_features(['age', 'city'], 'u1')
+
+    after_write, after_delete, after_delete_all = asyncio.run(run())
+
+    assert after_write == {'age': 31, 'city': 'Sofia'}
+    assert after_delete == {'age': 31}
+    assert after_delete_all == {}
+
+
+async def _wait_for(condition, timeout=3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+async def _publish_until_dropped(redis_client, cache, entity_id, feature_name, timeout=3.0):
+    """Publish an invalidation until the cache drops the entry
+
+    Subscribing happens in the background, so the first messages may be
+    published before the listener is there to receive them.
+    """
+    message = FeatureCache({}, {}).invalidation_message({entity_id: [feature_name]})
+    deadline = asyncio.get_running_loop().time() + timeout
+    while cache.get(entity_id, [feature_name])[0]:
+        assert asyncio.get_running_loop().time() < deadline
+        await redis_client.publish(feature_cache.INVALIDATION_CHANNEL, message)
+        await asyncio.sleep(0.05)
+
+
+def test_other_workers_drop_entries_published_on_the_channel():
+    async def run():
+        server = fakeredis.FakeServer()
+        writer = _store(fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+        reader = _store(fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+        await reader.cache.start_listener(reader.redis)
+        try:
+            reader.cache.put('u1', {'age': 0})
+            await _publish_until_dropped(writer.redis, reader.cache, 'u1', 'age')
+
+            await writer.store_features('u1', {'age': 30})
+            assert await reader.get_features(['age'], 'u1') == {'age': 30}
+            assert reader.cache.get('u1', ['age'])[0] == {'age': 30}
+
+            await writer.store_features('u1', {'age': 31})
+            await _wait_for(lambda: not reader.cache.get('u1', ['age'])[0])
+            return await reader.get_features(['age'], 'u1')
+        finally:
+            await reader.cache.stop_listener()
+
+    assert asyncio.run(run()) == {'age': 31}
+
+
+def test_listener_reconnect_drops_entries_and_stale_reads():
+    async def run():
+        server = fakeredis.FakeServer()
+        redis_client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        cache = FeatureCache({'profile': 60}, GROUPS)
+        cache.put('u1', {'age': 30})
+        generation = cache.generation
+
+        # Invalidations published while disconnected are lost, so everything goes
+        server.connected = False
+        await cache.start_listener(redis_client)
+        try:
+            await _wait_for(lambda: cache.generation != generation)
+            assert cache.get('u1', ['age'])[0] == {}
+
+            # A read that started before the disconnect must not be cached
+            cache.put('u1', {'age': 30}, generation)
+            assert cache.get('u1', ['age'])[0] == {}
+
+            # Once reconnected, invalidations from other workers apply again
+            server.connected = True
+            cache.put('u1', {'age': 31})
+            await _publish_until_dropped(redis_client, cache, 'u1', 'age')
+        finally:
+            await cache.stop_listener()
+
+    asyncio.run(run())
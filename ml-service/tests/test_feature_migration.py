@@ -0,0 +1,61 @@
+"""Backfilling the hash layout must never shorten a feature's lifetime"""
+import asyncio
+import json
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from src.feature_layouts import HashFeatureLayout
+from src.feature_migration import _migrate_batch, migrate_string_to_hash
+
+
+async def _seed(redis_client, ttls):
+    for feature_name, ttl in ttls.items():
+        key = f"feature:user:1:{feature_name}"
+        await redis_client.set(key, json.dumps(1.5))
+        if ttl is not None:
+            await redis_client.expire(key, ttl)
+
+
+def _migrate_in_batches(ttls, batches):
+    async def run():
+        redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        await _seed(redis_client, ttls)
+        stats = {'keys': 0, 'entities': 0}
+        for batch in batches:
+            keys = [f"feature:user:1:{feature_name}" for feature_name in batch]
+            await _migrate_batch(redis_client, HashFeatureLayout(), keys, stats, False, False)
+        return await redis_client.hgetall("features:user:1"), await redis_client.ttl("features:user:1")
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("batches", [[["long"], ["short"]], [["short"], ["long"]]])
+def test_entity_split_across_batches_keeps_longest_ttl(batches):
+    fields, ttl = _migrate_in_batches({'long': 1000, 'short': 100}, batches)
+
+    assert fields == {'long': '1.5', 'short': '1.5'}
+    assert 900 < ttl <= 1000
+
+
+@pytest.mark.parametrize("batches", [[["expiring"], ["forever"]], [["forever"], ["expiring"]]])
+def test_key_without_ttl_makes_hash_persistent(batches):
+    fields, ttl = _migrate_in_batches({'expiring': 100, 'forever': None}, batches)
+
+    assert set(fields) == {'expiring', 'forever'}
+    assert ttl == -1
+
+
+def test_migrate_with_one_key_per_batch():
+    async def run():
+        redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        await _seed(redis_client, {'a': 50, 'b': 5000, 'c': 500})
+        stats = await migrate_string_to_hash(redis_client, HashFeatureLayout(), batch_size=1, delete_source=True)
+        return stats, await redis_client.ttl("features:user:1"), await redis_client.keys("feature:*")
+
+    stats, ttl, remaining = asyncio.run(run())
+
+    assert stats['keys'] == 3
+    assert 4900 < ttl <= 5000
+    assert remaining == []
@@ -0,0 +1,43 @@
+"""Single-row and batch feature plans must agree on the same input"""
+import math
+
+import pytest
+
+from src.feature_plan import FeaturePlan
+
+
+def _row_outcome(plan, features):
+    try:
+        return plan.build_row(features)[0].tolist(), None
+    except ValueError as e:
+        return None, str(e)
+
+
+def _matrix_outcome(plan, features):
+    matrix, errors = plan.build_matrix([features])
+    return (None if errors[0] else matrix[0].tolist()), errors[0]
+
+
+@pytest.mark.parametrize("features", [
+    {'a': math.nan, 'b': 1.0},
+    {'a': None, 'b': 1.0},
+    {'b': 1.0},
+    {'a': 2.0, 'b': math.nan},
+    {'a': 2.0, 'b': 1.0, 'city': math.nan},
+])
+def test_nan_counts_as_missing_in_both_paths(features):
+    plan = FeaturePlan({
+        'feature_names': ['a', 'b', 'city'],
+        'feature_defaults': {'b': 0.5, 'city': 'sofia'},
+        'categorical_features': ['city'],
+        'encoders': {'city': {'sofia': 0, 'varna': 1}}
+    })
+
+    assert _row_outcome(plan, features) == _matrix_outcome(plan, features)
+
+
+def test_nan_required_feature_is_missing():
+    plan = FeaturePlan({'feature_names': ['a', 'b']})
+
+    with pytest.raises(ValueError, match="Missing required feature: a"):
+        plan.build_row({'a': math.nan, 'b': 1.0})
@@ -0,0 +1,53 @@
+"""A malformed row in a scoring stream fails on its own"""
+import json
+from datetime import datetime
+
+import pytest
+
+from src.schemas import PredictionResponse
+from src.streaming import ArrowEncoder, NdjsonEncoder, build_requests
+
+
+ROWS = [
+    {'request_id': 'a', 'features': {'x': 1.0}},
+    {'request_id': 'b', 'features': 'not a dict'},
+    [1, 2, 3],
+    {'request_id': 'd', 'model_id': 'other', 'features': {'x': 2.0}},
+]
+
+
+def _response(model_id):
+    return PredictionResponse(prediction_id='p', model_id=model_id, prediction={'value': 1.0},
+                              latency_ms=1.0, timestamp=datetime(2024, 1, 1))
+
+
+def test_invalid_rows_become_failed_results():
+    requests, results = build_requests(ROWS, 'default', arrow=False)
+
+    assert [request.model_id if request else None for request in requests] == ['default', None, None, 'other']
+    assert results[0] is None and results[3] is None
+    assert results[1]['request_id'] == 'b' and results[1]['status'] == 'failed'
+    assert results[2]['request_id'] is None and results[2]['status'] == 'failed'
+
+
+def test_missing_model_id_fails_only_that_row():
+    requests, results = build_requests(ROWS[:1] + ROWS[3:], None, arrow=False)
+
+    assert requests[0] is None and results[0]['request_id'] == 'a'
+    assert requests[1].model_id == 'other'
+
+
+def test_encoders_write_failed_rows_in_order():
+    requests, results = build_requests(ROWS, 'default', arrow=False)
+    results[0], results[3] = _response('default'), _response('other')
+
+    lines = [json.loads(line) for line in NdjsonEncoder().encode(requests, results).splitlines()]
+    assert [line['request_id'] for line in lines] == ['a', 'b', None, 'd']
+    assert [line.get('status') for line in lines] == [None, 'failed', 'failed', None]
+
+    pa = pytest.importorskip("pyarrow")
+    encoder = ArrowEncoder()
+    table = pa.ipc.open_stream(encoder.encode(requests, results) + encoder.close()).read_all()
+    assert table.column('request_id').to_pylist() == ['a', 'b', None, 'd']
+    assert table.column('model_id').to_pylist() == ['default', None, None, 'other']
+    assert [error is not None for error in table.column('error').to_pylist()] == [False, True, True, False]